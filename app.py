@@ -1,22 +1,52 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, g, Response, stream_with_context
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
+# 按核心预算设置各框架线程数（需在导入 NumPy / TensorFlow / torch 之前）
+from modules.resource_manager import ResourceManager
+resource_manager = ResourceManager()
+resource_manager.configure_environment()
+
 import numpy as np
 from datetime import datetime
 import json
 import os
 import base64
 import io
+import time
+import hmac
+import functools
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from werkzeug.utils import secure_filename
 import cv2
 from PIL import Image
 
+# 使用本地模型仓库离线加载模型（需在导入分析模块前配置）
+from modules.model_store import ModelStore, configure_offline
+configure_offline(ModelStore())
+
 # 导入分析模块
 from modules.face_emotion import FaceEmotionAnalyzer
 from modules.voice_emotion import VoiceEmotionAnalyzer
-from modules.text_emotion import TextEmotionAnalyzer
+from modules.text_emotion import TextEmotionAnalyzer, IncrementalTextAnalyzer
 from modules.psychological_evaluator import PsychologicalEvaluator
 from modules.risk_assessor import RiskAssessor
+from modules.risk_monitor import StreamingRiskMonitor
+from modules.multimodal_fusion import MultimodalFusion
+from modules.session_store import SessionStore
+from modules.session_persistence import SessionPersistence
+from modules.downsampling import DOWNSAMPLERS
+from modules.report_renderer import ReportManager
+from modules.metrics import metrics
+from modules.profiler import ProfilerManager, PROFILE_MODES
+from modules.inference_workers import create_worker_pools
+from modules.native_executor import NativeExecutor, ExecutorSaturated
+from modules.upload_manager import UploadManager, UploadOffsetError
+from modules.result_codec import ENCODINGS, encode_result, layout as result_layout
+from modules.rate_controller import RateController
+from modules.av_analyzer import AudioVisualAnalyzer
+from modules.moment_index import MomentIndex
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
@@ -29,15 +59,344 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # 确保上传文件夹存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# 初始化分析器
+# 初始化分析器（模型在首次本进程推理时加载，由工作进程服务的模态在本进程内只用于后处理）
 face_analyzer = FaceEmotionAnalyzer()
 voice_analyzer = VoiceEmotionAnalyzer()
 text_analyzer = TextEmotionAnalyzer()
 psych_evaluator = PsychologicalEvaluator()
 risk_assessor = RiskAssessor()
+resource_manager.configure_frameworks()
+multimodal_fusion = MultimodalFusion(face_analyzer.emotion_labels, face_analyzer.intensity_weights)
+report_manager = ReportManager()
+profiler = ProfilerManager()
+
+# 推理工作进程池（JPA_INFERENCE_WORKERS，如 face=2,voice=1,text=1；未配置的模态在本进程内推理）
+inference_pools = create_worker_pools()
+inference_timeout = float(os.environ.get('JPA_INFERENCE_TIMEOUT', 5))
+
+# 阻塞型模型调用交给有界原生线程执行（JPA_NATIVE_THREADS，如 face=2,voice=2,text=16,analysis=2）；
+# 本进程内的面部/语音分析器实例不并发调用，文本并发不低于微批大小，由工作进程服务的模态并发数与进程数一致
+native_executor = NativeExecutor(green=socketio.async_mode == 'eventlet', task_wrapper=profiler.run_attached,
+                                 thread_setup=resource_manager.pin_current_thread,
+                                 limits={modality: pool.workers for modality, pool in inference_pools.items()})
+
+# 分块可续传上传；视频在上传过程中即分析已到达的前段（后台线程）
+upload_manager = UploadManager()
+upload_manager.analyze_frame = lambda frame, upload_id: \
+    _infer_background('face', 'analyze_realtime', frame, upload_id)
+
+# 音画联合分析：一次解复用，画面与音频窗口并行送入面部与语音分析
+av_analyzer = AudioVisualAnalyzer(
+    analyze_frame=lambda frame: _infer_background('face', 'analyze_realtime', frame, None),
+    analyze_audio=lambda samples: _infer_background('voice', 'analyze_samples', samples, None),
+    sample_rate=voice_analyzer.sample_rate
+)
+
+# 批量分析接口每批交给模型的条目数
+bulk_batch_size = int(os.environ.get('JPA_BULK_BATCH_SIZE', 16))
+
+# 各连接协商的 analysis_result 编码（request.sid -> 'json' | 'binary'）
+realtime_encodings = {}
+
+# 实时采集速率控制：按处理延迟与排队深度向各连接下发建议帧率与分辨率（capture_control 事件）
+rate_controller = RateController()
+
+# 存储会话数据（列式存储，空闲超时与内存上限淘汰，持久化到 SQLite）
+sessions = SessionStore(persistence=SessionPersistence())
+
+# 跨会话情绪时刻索引（按通道的区间数组，段文件保存在 JPA_MOMENT_INDEX_DIR）
+moment_index = MomentIndex()
+
+# 采集时读取的队列深度与丢弃计数
+metrics.register_gauge('queue_depth', 'Pending items per internal queue.', lambda: {
+    (('queue', 'text_batcher'),): text_analyzer.batcher.queue_depth(),
+    (('queue', 'session_persistence'),): sessions.persistence.queue_depth(),
+    (('queue', 'report_render'),): sum(
+        1 for job in list(report_manager.jobs.values()) if job.get('status') in ('queued', 'rendering')),
+    **{(('queue', f'{modality}_workers'),): pool.queue_depth() for modality, pool in inference_pools.items()}
+})
+metrics.register_gauge('native_executor_waiting', 'Calls waiting for a native thread per modality.', lambda: {
+    (('modality', modality),): state['waiting'] for modality, state in native_executor.snapshot().items()
+})
+metrics.register_gauge('native_executor_running', 'Calls running on native threads per modality.', lambda: {
+    (('modality', modality),): state['running'] for modality, state in native_executor.snapshot().items()
+})
+metrics.register_gauge('inference_workers_alive', 'Live inference worker processes per modality.', lambda: {
+    (('modality', modality),): pool.snapshot()['alive'] for modality, pool in inference_pools.items()
+})
+metrics.register_gauge('sessions_active', 'Sessions held in memory.', lambda: len(sessions))
+metrics.register_gauge('session_evictions', 'Sessions evicted from memory by reason.', lambda: {
+    (('reason', reason),): count for reason, count in sessions.evictions.items()
+})
+metrics.register_gauge('persistence_errors', 'Failed session persistence commits.',
+                       lambda: sessions.persistence.stats['errors'])
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+    # 仅在存在剖析任务时介入
+    if profiler.active:
+        session_id = (request.view_args or {}).get('session_id') or request.args.get('session_id')
+        if session_id is None and request.is_json:
+            session_id = (request.get_json(silent=True) or {}).get('session_id')
+        g.profile_token = profiler.begin(request.endpoint, session_id)
+
+
+@app.after_request
+def record_request_metrics(response):
+    """记录各接口耗时与响应状态"""
+    start = g.pop('request_start', None)
+    if start is not None and request.endpoint not in (None, 'static', 'prometheus_metrics'):
+        metrics.observe(request.endpoint, 'http', time.perf_counter() - start)
+        metrics.increment('http_responses', endpoint=request.endpoint, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_request_profile(exc):
+    """结束本次请求的剖析（异常时同样执行）"""
+    profiler.end(g.pop('profile_token', None))
+
+
+def admin_required(fn):
+    """管理接口鉴权：请求头 X-Admin-Token 需与 JPA_ADMIN_TOKEN 一致，未配置时接口关闭"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        expected = os.environ.get('JPA_ADMIN_TOKEN')
+        provided = request.headers.get('X-Admin-Token', '')
+        if not expected or not hmac.compare_digest(provided, expected):
+            return jsonify({'status': 'error', 'message': '无管理权限'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def profiled_event(event):
+    """Socket.IO 事件剖析钩子（无剖析任务时仅做一次判空）"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(data=None):
+            if not profiler.active:
+                return fn(data)
+            session_id = data.get('session_id') if isinstance(data, dict) else None
+            token = profiler.begin(event, session_id)
+            try:
+                return fn(data)
+            finally:
+                profiler.end(token)
+        return wrapper
+    return decorator
+
+
+def run_inference(modality, method, payload, session_id=None):
+    """执行一次模型推理（在原生线程中执行，调用方等待期间不阻塞事件循环）"""
+    return native_executor.run(modality, _infer, modality, method, payload, session_id)
+
+
+def inference_queue_depth(modality):
+    """某模态等待推理的调用数（原生线程排队 + 工作进程中未开始处理的请求）"""
+    depth = native_executor.snapshot().get(modality, {}).get('waiting', 0)
+    pool = inference_pools.get(modality)
+    if pool is not None:
+        depth += max(0, pool.queue_depth() - pool.workers)
+    return depth
+
+
+def _infer(modality, method, payload, session_id, slot_timeout=None):
+    """已配置工作进程的模态经共享内存交给工作进程，否则在本进程内调用"""
+    pool = inference_pools.get(modality)
+    if pool is None:
+        analyzer = {'face': face_analyzer, 'voice': voice_analyzer, 'text': text_analyzer}[modality]
+        return getattr(analyzer, method)(payload)
+
+    future = pool.submit(payload, session_id=session_id, method=method, slot_timeout=slot_timeout)
+    if future is None:
+        # 共享内存槽已满，丢弃该帧
+        metrics.increment('frames_dropped', modality=modality, reason='backpressure')
+        return None
+    return _wait_result(pool, future)
+
+
+def _wait_result(pool, future):
+    """等待工作进程结果；超时时撤销请求，回收共享内存槽后抛出 FutureTimeoutError"""
+    try:
+        return future.result(timeout=inference_timeout)
+    except FutureTimeoutError:
+        pool.cancel(future)
+        raise
+
+
+def _infer_background(modality, method, payload, session_id):
+    """后台线程（分块上传、音画联合分析）中的推理
+
+    原生线程执行器只能从请求/事件处理中调用，后台线程直接推理：本进程内的分析器调用由
+    分析器自身的锁串行，工作进程的共享内存槽已满时等待空槽（最长 JPA_INFERENCE_TIMEOUT）而不是立即丢弃。
+    """
+    with metrics.timer('background', modality):
+        return _infer(modality, method, payload, session_id, slot_timeout=inference_timeout)
+
+
+def _infer_face_batch(images):
+    """批量面部情绪推理：配置了工作进程时逐张分发到各进程并行，否则本进程整批前向计算
 
-# 存储会话数据
-sessions = {}
+    一批图像可能多于共享内存槽数，提交时等待空槽（最长 JPA_INFERENCE_TIMEOUT）；
+    超过槽大小的图像（如高于 1080p 的证据照片）等比缩小后再提交。
+    """
+    pool = inference_pools.get('face')
+    if pool is None:
+        return face_analyzer.analyze_batch(images)
+
+    futures = [
+        pool.submit(_fit_slot(image, pool.ring.slot_bytes), method='analyze', slot_timeout=inference_timeout)
+        for image in images
+    ]
+    try:
+        return [_wait_result(pool, future) if future is not None else None for future in futures]
+    except FutureTimeoutError:
+        for future in futures:
+            if future is not None:
+                pool.cancel(future)
+        raise
+
+
+def _fit_slot(image, slot_bytes):
+    """等比缩小图像使其不超过共享内存槽大小"""
+    if image.nbytes <= slot_bytes:
+        return image
+    scale = (slot_bytes / image.nbytes) ** 0.5
+    height, width = image.shape[:2]
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def _bulk_items(field, multipart_field):
+    """批量请求条目 (id, 值, 错误)：multipart 为文件或表单字段，NDJSON 逐行解析（边接收边产出）"""
+    if request.mimetype == 'multipart/form-data':
+        for value in request.form.getlist(multipart_field):
+            yield None, value, None
+        for file in request.files.getlist(multipart_field):
+            yield file.filename, file.read(), None
+        return
+
+    for line in request.stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+            yield item.get('id'), item.get(field), None
+        except (ValueError, AttributeError) as e:
+            yield None, None, f'无法解析的条目: {e}'
+
+
+def _batched(items, size):
+    """按固定大小分批"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _stream_bulk(items, modality, process_batch):
+    """分批处理条目，每批完成后以 NDJSON 逐条返回结果，最后一行为汇总"""
+    def generate():
+        index = 0
+        errors = 0
+        for batch in _batched(items, bulk_batch_size):
+            try:
+                results = native_executor.run(modality, process_batch, batch)
+            except Exception as e:
+                results = [{'status': 'error', 'message': str(e)}] * len(batch)
+
+            for (item_id, _, _), result in zip(batch, results):
+                errors += result['status'] == 'error'
+                yield json.dumps(dict(result, index=index, id=item_id), ensure_ascii=False,
+                                 default=_json_default) + '\n'
+                index += 1
+
+        metrics.increment('bulk_items', amount=index, modality=modality)
+        yield json.dumps({'status': 'done', 'total': index, 'errors': errors}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def _json_default(value):
+    """NumPy 标量/数组转换为 JSON 可序列化的内置类型"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f'无法序列化的类型: {type(value).__name__}')
+
+
+def _analyze_face_batch(batch):
+    """解码一批图像并整批推理（在原生线程中执行）"""
+    results = [None] * len(batch)
+    images = []
+    positions = []
+    with metrics.timer('decode', 'face'):
+        for i, (_, value, error) in enumerate(batch):
+            if error is None and not value:
+                error = '未提供图像数据'
+            if error is not None:
+                results[i] = {'status': 'error', 'message': error}
+                continue
+            try:
+                # NDJSON 为 base64（可带 data URL 前缀），multipart 为原始文件字节
+                image_bytes = base64.b64decode(value.split(',')[-1]) if isinstance(value, str) else value
+                images.append(np.array(Image.open(io.BytesIO(image_bytes))))
+                positions.append(i)
+            except Exception as e:
+                results[i] = {'status': 'error', 'message': f'图像解码失败: {e}'}
+
+    if images:
+        for i, emotion_data in zip(positions, _infer_face_batch(images)):
+            if emotion_data is None:
+                results[i] = {'status': 'error', 'message': '推理队列已满'}
+                continue
+            results[i] = {
+                'status': 'success',
+                'data': {
+                    'emotions': emotion_data,
+                    'intensity': face_analyzer.calculate_intensity(emotion_data)
+                }
+            }
+    return results
+
+
+def _analyze_text_batch(batch):
+    """整批文本语义分析（在原生线程中执行）"""
+    results = [None] * len(batch)
+    texts = []
+    positions = []
+    for i, (_, value, error) in enumerate(batch):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', errors='replace')
+        if error is None and not (value or '').strip():
+            error = '未提供文本内容'
+        if error is not None:
+            results[i] = {'status': 'error', 'message': error}
+            continue
+        texts.append(value)
+        positions.append(i)
+
+    if texts:
+        semantic_results = _infer('text', 'analyze_semantics_batch', texts, None)
+        for i, text, semantic_analysis in zip(positions, texts, semantic_results):
+            with metrics.timer('features', 'text'):
+                keyword_emotions = _infer('text', 'extract_keyword_emotions', text, None)
+            results[i] = {
+                'status': 'success',
+                'data': {
+                    'semantic_analysis': semantic_analysis,
+                    'keywords': keyword_emotions,
+                    'emotion_vector': text_analyzer.build_emotion_vector(semantic_analysis).tolist()
+                }
+            }
+    return results
 
 
 @app.route('/')
@@ -45,6 +404,137 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 文本格式指标"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+@admin_required
+def start_profile():
+    """对接下来 N 次请求/事件（可按接口名、事件名或会话 ID 过滤）进行剖析"""
+    try:
+        data = request.json or {}
+
+        mode = data.get('mode', 'cprofile')
+        if mode not in PROFILE_MODES:
+            return jsonify({'status': 'error', 'message': '不支持的剖析模式'}), 400
+        if not data.get('target') and not data.get('session_id'):
+            return jsonify({'status': 'error', 'message': '需指定 target 或 session_id'}), 400
+
+        capture = profiler.start(
+            mode=mode,
+            count=int(data.get('count', 10)),
+            target=data.get('target'),
+            session_id=data.get('session_id')
+        )
+
+        return jsonify({'status': 'success', 'capture': capture})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/admin/profile/<capture_id>/stop', methods=['POST'])
+@admin_required
+def stop_profile(capture_id):
+    """提前结束剖析并保存已采集结果"""
+    try:
+        capture = profiler.stop(capture_id)
+        if capture is None:
+            return jsonify({'status': 'error', 'message': '剖析任务不存在'}), 404
+
+        return jsonify({'status': 'success', 'capture': capture})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """列出剖析结果"""
+    try:
+        return jsonify({'status': 'success', 'captures': profiler.list_captures()})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/admin/profiles/<capture_id>', methods=['GET'])
+@admin_required
+def download_profile(capture_id):
+    """下载剖析结果（.prof 或折叠栈 .folded）"""
+    try:
+        path = profiler.capture_file(capture_id)
+        if path is None:
+            return jsonify({'status': 'error', 'message': '剖析结果不存在'}), 404
+
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=os.path.basename(path))
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/inference/workers', methods=['GET'])
+def get_inference_workers():
+    """推理工作进程池状态"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': {modality: pool.snapshot() for modality, pool in inference_pools.items()}
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/resources', methods=['GET'])
+def get_resource_allocation():
+    """各引擎核心划分与框架线程池实际配置"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': resource_manager.report()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/inference/executor', methods=['GET'])
+def get_native_executor():
+    """原生线程执行器各模态并发状态"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'green': native_executor.green,
+            'data': native_executor.snapshot()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/realtime/clients', methods=['GET'])
+def get_realtime_clients():
+    """各实时连接当前的建议帧率、最大边长与平滑处理延迟"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': rate_controller.snapshot()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/metrics/stages', methods=['GET'])
+def get_stage_metrics():
+    """各分析阶段延迟摘要"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': metrics.stage_summary()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @app.route('/api/analyze/face', methods=['POST'])
 def analyze_face():
     """分析面部表情 - 支持实时和视频"""
@@ -53,17 +543,18 @@ def analyze_face():
 
         if 'image' in data:
             # 实时图像分析
-            image_data = data['image']
-            # 移除 data URL 前缀
-            image_data = image_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
+            with metrics.timer('decode', 'face'):
+                image_data = data['image']
+                # 移除 data URL 前缀
+                image_data = image_data.split(',')[1]
+                image_bytes = base64.b64decode(image_data)
 
-            # 转换为 OpenCV 格式
-            image = Image.open(io.BytesIO(image_bytes))
-            image_np = np.array(image)
+                # 转换为 OpenCV 格式
+                image = Image.open(io.BytesIO(image_bytes))
+                image_np = np.array(image)
 
             # 面部情感分析
-            emotion_data = face_analyzer.analyze(image_np)
+            emotion_data = run_inference('face', 'analyze', image_np)
 
         elif 'video' in request.files:
             # 视频文件分析
@@ -73,7 +564,7 @@ def analyze_face():
             video.save(video_path)
 
             # 分析视频中的情感
-            emotion_data = face_analyzer.analyze_video(video_path)
+            emotion_data = native_executor.run('face', face_analyzer.analyze_video, video_path)
 
             # 清理临时文件
             os.remove(video_path)
@@ -103,6 +594,19 @@ def analyze_face():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/api/analyze/face/batch', methods=['POST'])
+def analyze_face_batch():
+    """批量分析图像：multipart（images 文件）或 NDJSON（每行 {"id", "image": base64}），NDJSON 流式返回"""
+    try:
+        items = _bulk_items('image', 'images')
+        if request.mimetype == 'multipart/form-data':
+            # multipart 需在响应开始前解析完毕
+            items = list(items)
+        return _stream_bulk(items, 'face', _analyze_face_batch)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @app.route('/api/analyze/voice', methods=['POST'])
 def analyze_voice():
     """分析语音情感"""
@@ -117,30 +621,179 @@ def analyze_voice():
                                   secure_filename(audio_file.filename))
         audio_file.save(audio_path)
 
-        # 语音特征提取
-        with open(audio_path, 'rb') as f:
-            features = voice_analyzer.extract_features(f)
-
-        # 情感识别（语调、音量、语速）
-        emotion_metrics = voice_analyzer.analyze_emotions(features)
-
-        # 计算情感强度
-        intensity = voice_analyzer.calculate_intensity(emotion_metrics)
+        voice_data = analyze_voice_file(audio_path)
 
         # 清理临时文件
         os.remove(audio_path)
 
         return jsonify({
             'status': 'success',
-            'data': {
-                'pitch': emotion_metrics['pitch'],
-                'volume': emotion_metrics['volume'],
-                'speed': emotion_metrics['speed'],
-                'emotion': emotion_metrics['emotion'],
-                'intensity': intensity,
+            'data': voice_data
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def analyze_voice_file(audio_path):
+    """分析音频文件的语音情感"""
+    # 语音特征提取
+    with open(audio_path, 'rb') as f:
+        features = native_executor.run('voice', voice_analyzer.extract_features, f)
+
+    # 情感识别（语调、音量、语速）
+    emotion_metrics = native_executor.run('voice', voice_analyzer.analyze_emotions, features)
+
+    # 计算情感强度
+    intensity = voice_analyzer.calculate_intensity(emotion_metrics)
+
+    return {
+        'pitch': emotion_metrics['pitch'],
+        'volume': emotion_metrics['volume'],
+        'speed': emotion_metrics['speed'],
+        'emotion': emotion_metrics['emotion'],
+        'intensity': intensity,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+@app.route('/api/analyze/video', methods=['POST'])
+def analyze_video_av():
+    """音画联合分析视频：容器只解复用一次，面部与语音同时分析，结果按时间对齐
+
+    超过 MAX_CONTENT_LENGTH 的录像先经分块上传，完成时以 keep_data=1 保留数据，再传 upload_id 分析。
+    """
+    try:
+        upload_id = request.values.get('upload_id') or (request.get_json(silent=True) or {}).get('upload_id')
+        if upload_id:
+            upload = upload_manager.status(upload_id)
+            if upload is None:
+                return jsonify({'status': 'error', 'message': '上传不存在'}), 404
+            if upload['kind'] != 'video':
+                return jsonify({'status': 'error', 'message': '上传的不是视频文件'}), 400
+            if not upload['finalized']:
+                return jsonify({'status': 'error', 'message': '上传尚未完成', 'received': upload['received']}), 409
+
+            video_path = upload_manager.data_path(upload_id)
+            if not os.path.exists(video_path):
+                return jsonify({'status': 'error', 'message': '上传数据已删除（完成上传时需指定 keep_data=1）'}), 410
+        elif 'video' in request.files:
+            video = request.files['video']
+            video_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(video.filename))
+            video.save(video_path)
+        else:
+            return jsonify({'status': 'error', 'message': '未提供视频文件'}), 400
+
+        try:
+            # 编排在 analysis 线程中执行，面部/语音推理各自经分析器锁或工作进程
+            result = native_executor.run('analysis', av_analyzer.analyze, video_path)
+        finally:
+            os.remove(video_path)
+
+        return jsonify({
+            'status': 'success',
+            'data': dict(result, timestamp=datetime.now().isoformat())
+        })
+    except ImportError:
+        return jsonify({'status': 'error', 'message': '音画联合分析需要安装 PyAV（pip install av）'}), 501
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/upload/init', methods=['POST'])
+def init_upload():
+    """创建分块上传（大文件录像/录音）"""
+    try:
+        data = request.json or {}
+
+        if 'size' not in data or data.get('kind') not in ('video', 'audio'):
+            return jsonify({'status': 'error', 'message': '需提供文件大小与类型（video/audio）'}), 400
+
+        upload = upload_manager.init(data.get('filename'), int(data['size']), data['kind'])
+
+        return jsonify({'status': 'success', 'data': upload})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/upload/<upload_id>', methods=['GET'])
+def get_upload_status(upload_id):
+    """查询上传进度（断点续传时从 received 处继续）"""
+    try:
+        upload = upload_manager.status(upload_id)
+        if upload is None:
+            return jsonify({'status': 'error', 'message': '上传不存在'}), 404
+
+        return jsonify({'status': 'success', 'data': upload})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/upload/<upload_id>', methods=['PUT'])
+def append_upload_chunk(upload_id):
+    """追加分块：请求体为原始字节（application/octet-stream），offset 查询参数为分块起始位置
+
+    请求体直接从输入流写入磁盘，不经表单解析缓冲。
+    """
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'status': 'error', 'message': '未提供 offset'}), 400
+
+        upload_manager.append(upload_id, offset, request.stream)
+
+        return jsonify({'status': 'success', 'data': upload_manager.status(upload_id)})
+    except KeyError:
+        return jsonify({'status': 'error', 'message': '上传不存在'}), 404
+    except UploadOffsetError as e:
+        return jsonify({'status': 'error', 'message': str(e), 'received': e.received}), 409
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/upload/<upload_id>/results', methods=['GET'])
+def get_upload_results(upload_id):
+    """上传过程中已得出的逐帧分析结果（cursor/limit 分页）"""
+    try:
+        results = upload_manager.results(
+            upload_id,
+            cursor=request.args.get('cursor', 0, type=int),
+            limit=request.args.get('limit', type=int)
+        )
+        if results is None:
+            return jsonify({'status': 'error', 'message': '上传不存在'}), 404
+
+        return jsonify({'status': 'success', 'data': results})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/upload/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """完成上传并返回完整分析结果；keep_data=1 时保留数据文件，供 /api/analyze/video 音画联合分析"""
+    try:
+        upload = upload_manager.status(upload_id)
+        if upload is None:
+            return jsonify({'status': 'error', 'message': '上传不存在'}), 404
+
+        if upload['kind'] == 'video':
+            # 视频：只需分析尚未分析的剩余帧
+            emotion_data = native_executor.run('face', upload_manager.finalize, upload_id)
+            result = {
+                'emotions': emotion_data,
+                'intensity': face_analyzer.calculate_intensity(emotion_data['average_emotions'])
+                if emotion_data else 0,
                 'timestamp': datetime.now().isoformat()
             }
-        })
+        else:
+            upload_manager.finalize(upload_id)
+            result = analyze_voice_file(upload_manager.data_path(upload_id))
+
+        if request.args.get('keep_data') != '1':
+            upload_manager.remove_data(upload_id)
+
+        return jsonify({'status': 'success', 'data': result})
+    except UploadOffsetError as e:
+        return jsonify({'status': 'error', 'message': '上传尚未完成', 'received': e.received}), 409
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -157,10 +810,11 @@ def analyze_text():
         text = data['text']
 
         # 深度语义分析
-        semantic_analysis = text_analyzer.analyze_semantics(text)
+        semantic_analysis = run_inference('text', 'analyze_semantics', text)
 
         # 提取关键词情感极性
-        keyword_emotions = text_analyzer.extract_keyword_emotions(text)
+        with metrics.timer('features', 'text'):
+            keyword_emotions = run_inference('text', 'extract_keyword_emotions', text)
 
         # 构建情感向量
         emotion_vector = text_analyzer.build_emotion_vector(semantic_analysis)
@@ -178,6 +832,66 @@ def analyze_text():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/api/analyze/text/batch', methods=['POST'])
+def analyze_text_batch():
+    """批量分析文本：multipart（texts 字段或文件）或 NDJSON（每行 {"id", "text"}），NDJSON 流式返回"""
+    try:
+        items = _bulk_items('text', 'texts')
+        if request.mimetype == 'multipart/form-data':
+            items = list(items)
+        return _stream_bulk(items, 'text', _analyze_text_batch)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _append_session_text(session, text, final):
+    """在原生线程中持会话文本锁完成增量分析与写入，同一会话的并发分块按到达顺序处理"""
+    with session.text_lock:
+        if session.text_analyzer is None:
+            session_id = session.id
+            session.text_analyzer = IncrementalTextAnalyzer(
+                text_analyzer, classify=lambda sentences: _infer('text', 'classify', sentences, session_id),
+                history=session.text_data)
+
+        result = session.text_analyzer.append(text, final=final)
+
+        if result['new_sentences']:
+            sessions.append_text(session.id, {
+                'timestamp': datetime.now().isoformat(),
+                'data': result['new_sentences']
+            })
+        return result
+
+
+@app.route('/api/analyze/text/append', methods=['POST'])
+def analyze_text_append():
+    """增量分析实时转录文本"""
+    try:
+        data = request.json
+
+        session = sessions.get(data.get('session_id'))
+        if session is None:
+            return jsonify({'status': 'error', 'message': '会话不存在'}), 404
+
+        # 仅对新增句子打分
+        result = native_executor.run('text', _append_session_text, session,
+                                     data.get('text', ''), data.get('final', False))
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'new_sentences': result['new_sentences'],
+                'overall': result['overall'],
+                'consistency': result['consistency'],
+                'sentence_count': result['sentence_count'],
+                'emotion_vector': result['emotion_vector'].tolist(),
+                'timestamp': datetime.now().isoformat()
+            }
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
 @app.route('/api/evaluate/comprehensive', methods=['POST'])
 def comprehensive_evaluation():
     """综合心理状态评估"""
@@ -185,20 +899,22 @@ def comprehensive_evaluation():
         data = request.json
 
         # 融合多模态分析结果
-        integrated_data = psych_evaluator.integrate_multimodal_data(
-            data.get('face_data'),
-            data.get('voice_data'),
-            data.get('text_data')
-        )
+        with metrics.timer('fusion', 'multimodal'):
+            integrated_data = psych_evaluator.integrate_multimodal_data(
+                data.get('face_data'),
+                data.get('voice_data'),
+                data.get('text_data')
+            )
 
-        # 构建心理状态雷达图数据
-        radar_data = psych_evaluator.build_psychological_radar(integrated_data)
+            # 构建心理状态雷达图数据
+            radar_data = psych_evaluator.build_psychological_radar(integrated_data)
 
-        # 识别潜在心理障碍风险
-        psychological_risks = risk_assessor.identify_psychological_risks(integrated_data)
+        with metrics.timer('risk', 'multimodal'):
+            # 识别潜在心理障碍风险
+            psychological_risks = risk_assessor.identify_psychological_risks(integrated_data)
 
-        # 评估沟通障碍可能性
-        communication_barriers = risk_assessor.assess_communication_barriers(integrated_data)
+            # 评估沟通障碍可能性
+            communication_barriers = risk_assessor.assess_communication_barriers(integrated_data)
 
         # 生成干预建议
         interventions = psych_evaluator.generate_interventions(
@@ -206,20 +922,34 @@ def comprehensive_evaluation():
             communication_barriers
         )
 
-        # 生成评估报告ID
-        report_id = f"JPA_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        # 生成评估报告ID（附随机后缀，同一秒内的多次评估不会互相覆盖）
+        report_id = f"JPA_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+        evaluation = {
+            'report_id': report_id,
+            'radar_chart': radar_data,
+            'psychological_risks': psychological_risks,
+            'communication_barriers': communication_barriers,
+            'interventions': interventions,
+            'emotion_intensity_index': integrated_data['overall_intensity'],
+            'timestamp': datetime.now().isoformat()
+        }
+
+        # 关联会话时附带时间线数据，供报告渲染使用
+        session = sessions.get(data.get('session_id'))
+        timeline = None
+        if session is not None:
+            with metrics.timer('fusion', 'session'):
+                fused = native_executor.run('analysis', multimodal_fusion.fuse_session, session)
+                timeline = native_executor.run('analysis', multimodal_fusion.evaluate_windows,
+                                               fused, 10.0, psych_evaluator, risk_assessor)
+
+        # 保存评估结果，报告在后台渲染
+        report_manager.save_evaluation(report_id, dict(evaluation, timeline=timeline))
 
         return jsonify({
             'status': 'success',
-            'data': {
-                'report_id': report_id,
-                'radar_chart': radar_data,
-                'psychological_risks': psychological_risks,
-                'communication_barriers': communication_barriers,
-                'interventions': interventions,
-                'emotion_intensity_index': integrated_data['overall_intensity'],
-                'timestamp': datetime.now().isoformat()
-            }
+            'data': evaluation
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -231,14 +961,7 @@ def start_session():
     try:
         session_id = f"SESSION_{datetime.now().strftime('%Y%m%d%H%M%S')}_{np.random.randint(1000, 9999)}"
 
-        sessions[session_id] = {
-            'id': session_id,
-            'start_time': datetime.now().isoformat(),
-            'face_data': [],
-            'voice_data': [],
-            'text_data': [],
-            'events': []
-        }
+        sessions.create(session_id)
 
         return jsonify({
             'status': 'success',
@@ -249,16 +972,198 @@ def start_session():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 
+@app.route('/api/sessions/stats', methods=['GET'])
+def get_sessions_stats():
+    """会话存储内存使用情况"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': sessions.memory_usage()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/moments/index', methods=['POST'])
+def index_session_moments():
+    """将会话的面部与语音序列加入时刻索引（重复索引时替换旧记录）"""
+    try:
+        data = request.json or {}
+        session = sessions.get(data.get('session_id'))
+        if session is None:
+            return jsonify({'status': 'error', 'message': '会话不存在'}), 404
+
+        series = {modality: (session.series(modality).times, session.series(modality).values)
+                  for modality in ('face', 'voice')}
+        with metrics.timer('moments', 'index'):
+            count = native_executor.run('analysis', moment_index.add_session, session.id, series,
+                                        data.get('case_id'))
+
+        return jsonify({
+            'status': 'success',
+            'data': {'session_id': session.id, 'moments': count}
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/moments/query', methods=['POST'])
+def query_moments():
+    """跨会话查询情绪时刻
+
+    where 为 {modality, channel, min}；带 overlaps（同结构）时返回同一会话中两个条件重叠的时段。
+    可选 start/end（epoch 秒或 ISO 时间）、sessions、case_id、limit 过滤。
+    """
+    try:
+        data = request.json or {}
+        where = data.get('where') or {}
+        if not where.get('modality') or not where.get('channel'):
+            return jsonify({'status': 'error', 'message': '缺少 where.modality 或 where.channel'}), 400
+
+        filters = {
+            'start': _epoch(data.get('start')),
+            'end': _epoch(data.get('end')),
+            'sessions': data.get('sessions'),
+            'case_id': data.get('case_id'),
+            'limit': data.get('limit', 1000)
+        }
+
+        started = time.perf_counter()
+        with metrics.timer('moments', 'query'):
+            if data.get('overlaps'):
+                results = moment_index.overlap(where, data['overlaps'], **filters)
+            else:
+                results = moment_index.query(where['modality'], where['channel'], where.get('min'), **filters)
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'results': results,
+                'count': len(results),
+                'elapsed_ms': (time.perf_counter() - started) * 1000
+            }
+        })
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/moments/stats', methods=['GET'])
+def get_moment_index_stats():
+    """时刻索引规模"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'data': moment_index.stats()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+def _epoch(value):
+    """epoch 秒或 ISO 时间 -> epoch 秒"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
 @app.route('/api/session/<session_id>/data', methods=['GET'])
 def get_session_data(session_id):
-    """获取会话数据"""
+    """获取会话数据
+
+    不带参数时返回完整会话；指定 modality 时支持以下查询参数：
+    start/end（epoch 秒）时间范围，cursor/limit 游标分页与增量同步，
+    points/method（lttb 或 minmax）服务端降采样。
+    """
     try:
-        if session_id not in sessions:
+        session = sessions.get(session_id)
+        if session is None:
             return jsonify({'status': 'error', 'message': '会话不存在'}), 404
 
+        modality = request.args.get('modality')
+        if modality is None:
+            return jsonify({
+                'status': 'success',
+                'data': session.to_dict()
+            })
+
+        if modality not in ('face', 'voice', 'text'):
+            return jsonify({'status': 'error', 'message': '不支持的数据类型'}), 400
+
+        method = request.args.get('method', 'lttb')
+        if method not in DOWNSAMPLERS:
+            return jsonify({'status': 'error', 'message': '不支持的降采样方法'}), 400
+
+        result = session.query(
+            modality,
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            cursor=request.args.get('cursor', 0, type=int),
+            limit=request.args.get('limit', type=int),
+            points=request.args.get('points', type=int),
+            method=method,
+            downsamplers=DOWNSAMPLERS
+        )
+
         return jsonify({
             'status': 'success',
-            'data': sessions[session_id]
+            'data': result
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/risk', methods=['GET'])
+def get_session_risk(session_id):
+    """获取会话的流式风险监测状态"""
+    try:
+        session = sessions.get(session_id)
+        if session is None or session.risk_monitor is None:
+            return jsonify({'status': 'error', 'message': '会话未开启实时监测'}), 404
+
+        return jsonify({
+            'status': 'success',
+            'data': session.risk_monitor.snapshot()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/session/<session_id>/fusion', methods=['GET'])
+def get_session_fusion(session_id):
+    """基于会话完整历史的时间对齐融合评估"""
+    try:
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({'status': 'error', 'message': '会话不存在'}), 404
+
+        step = request.args.get('step', 0.1, type=float)
+        window = request.args.get('window', 10.0, type=float)
+
+        try:
+            with metrics.timer('fusion', 'session'):
+                fused = native_executor.run('analysis', multimodal_fusion.fuse_session, session, step)
+                windows = native_executor.run('analysis', multimodal_fusion.evaluate_windows,
+                                              fused, window, psych_evaluator, risk_assessor)
+        except ValueError as e:
+            # step / window 非正数或网格过大
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'features': fused['features'],
+                'grid_points': len(fused['times']),
+                'step': step,
+                'window': window,
+                'windows': windows
+            }
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -266,14 +1171,52 @@ def get_session_data(session_id):
 
 @app.route('/api/report/generate/<report_id>', methods=['GET'])
 def generate_report_pdf(report_id):
-    """生成PDF格式报告"""
+    """生成PDF格式报告（后台渲染，内容未变时直接命中缓存）"""
     try:
-        # 这里应该实现PDF生成逻辑
-        # 暂时返回模拟数据
+        job = report_manager.submit(report_id)
+        if job is None:
+            return jsonify({'status': 'error', 'message': '评估结果不存在'}), 404
+
         return jsonify({
             'status': 'success',
+            'job': job,
             'download_url': f'/api/report/download/{report_id}'
-        })
+        }), 200 if job['status'] == 'done' else 202
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/report/status/<report_id>', methods=['GET'])
+def get_report_status(report_id):
+    """查询报告渲染状态"""
+    try:
+        job = report_manager.status(report_id)
+        if job is None:
+            return jsonify({'status': 'error', 'message': '报告任务不存在'}), 404
+
+        return jsonify({'status': 'success', 'job': job})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+
+@app.route('/api/report/download/<report_id>', methods=['GET'])
+def download_report(report_id):
+    """下载PDF报告（文件流式发送）"""
+    try:
+        pdf_path = report_manager.report_path(report_id)
+        if pdf_path is None:
+            job = report_manager.status(report_id)
+            if job is not None and job['status'] in ('queued', 'rendering'):
+                return jsonify({'status': 'pending', 'job': job}), 202
+            return jsonify({'status': 'error', 'message': '报告尚未生成'}), 404
+
+        return send_file(
+            pdf_path,
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f'{report_id}.pdf',
+            conditional=True
+        )
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -289,25 +1232,48 @@ def handle_connect():
 def handle_disconnect():
     """WebSocket断开"""
     print(f'Client disconnected: {request.sid}')
+    realtime_encodings.pop(request.sid, None)
+    rate_controller.close(request.sid)
 
 
 @socketio.on('start_realtime_analysis')
+@profiled_event('start_realtime_analysis')
 def handle_start_realtime(data):
     """开始实时分析"""
     session_id = data.get('session_id')
     analysis_type = data.get('type')
 
+    # 协商 analysis_result 编码：binary 为定长 float32 帧，默认 JSON 保持兼容
+    encoding = data.get('encoding', 'json')
+    if encoding not in ENCODINGS:
+        encoding = 'json'
+    realtime_encodings[request.sid] = encoding
+
+    # 加入会话房间以接收风险告警
+    if session_id:
+        join_room(session_id)
+        session = sessions.get(session_id)
+        if session is not None and session.risk_monitor is None:
+            session.risk_monitor = StreamingRiskMonitor(risk_assessor, face_analyzer)
+
     emit('realtime_started', {
         'session_id': session_id,
         'type': analysis_type,
+        'encoding': encoding,
+        'layout': result_layout() if encoding == 'binary' else None,
         'message': f'{analysis_type}实时分析已启动'
     })
 
+    # 初始采集参数，之后按负载调整
+    emit('capture_control', rate_controller.open(request.sid))
+
 
 @socketio.on('realtime_frame')
+@profiled_event('realtime_frame')
 def handle_realtime_frame(data):
     """处理实时帧数据"""
     try:
+        started = time.perf_counter()
         session_id = data.get('session_id')
         frame_type = data.get('type')
         frame_data = data.get('data')
@@ -316,42 +1282,80 @@ def handle_realtime_frame(data):
 
         if frame_type == 'face':
             # 处理面部数据
-            image_data = frame_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            image_np = np.array(image)
+            with metrics.timer('decode', 'face'):
+                image_data = frame_data.split(',')[1]
+                image_bytes = base64.b64decode(image_data)
+                image = Image.open(io.BytesIO(image_bytes))
+                image_np = np.array(image)
 
-            result = face_analyzer.analyze_realtime(image_np)
+            result = run_inference('face', 'analyze_realtime', image_np, session_id)
 
         elif frame_type == 'voice':
             # 处理语音数据
-            audio_data = base64.b64decode(frame_data)
-            result = voice_analyzer.analyze_realtime(audio_data)
+            with metrics.timer('decode', 'voice'):
+                audio_data = base64.b64decode(frame_data)
+            result = run_inference('voice', 'analyze_realtime', audio_data, session_id)
+
+        # 反馈处理延迟与排队深度，需要时下发新的采集参数
+        control = rate_controller.observe(request.sid, time.perf_counter() - started,
+                                          inference_queue_depth(frame_type))
+        if control is not None:
+            emit('capture_control', control)
 
         # 存储到会话
-        if session_id in sessions and result:
-            sessions[session_id][f'{frame_type}_data'].append({
-                'timestamp': datetime.now().isoformat(),
-                'data': result
+        now = time.time()
+        session = sessions.get(session_id)
+        if session is not None and result:
+            sessions.append_frame(session_id, frame_type, result, now)
+
+        # 发送分析结果（按协商的编码）
+        if realtime_encodings.get(request.sid) == 'binary':
+            emit('analysis_result', encode_result(frame_type, result, now))
+        else:
+            emit('analysis_result', {
+                'type': frame_type,
+                'result': result,
+                'timestamp': datetime.fromtimestamp(now).isoformat()
             })
 
-        # 发送分析结果
-        emit('analysis_result', {
-            'type': frame_type,
-            'result': result,
-            'timestamp': datetime.now().isoformat()
-        })
+        # 流式风险监测，等级变化时向会话房间推送告警（会话被淘汰后从磁盘恢复时重新创建监测器）
+        if session is not None and session.risk_monitor is None:
+            session.risk_monitor = StreamingRiskMonitor(risk_assessor, face_analyzer)
+        if session is not None:
+            with metrics.timer('risk', frame_type):
+                alerts = session.risk_monitor.update(frame_type, result)
+            for alert in alerts:
+                emit('risk_alert', dict(alert, session_id=session_id), to=session_id)
+
+    except ExecutorSaturated:
+        # 推理积压时丢弃实时帧，不向客户端报错
+        metrics.increment('frames_dropped', modality=data.get('type'), reason='saturated')
+        control = rate_controller.overload(request.sid)
+        if control is not None:
+            emit('capture_control', control)
+
+    except FutureTimeoutError:
+        # 工作进程未在 JPA_INFERENCE_TIMEOUT 内返回：丢弃该帧并要求客户端降低采集速率
+        metrics.increment('frames_dropped', modality=data.get('type'), reason='timeout')
+        control = rate_controller.overload(request.sid)
+        if control is not None:
+            emit('capture_control', control)
 
     except Exception as e:
+        metrics.increment('frames_dropped', modality=data.get('type'), reason='error')
         emit('analysis_error', {'error': str(e)})
 
 
 @socketio.on('stop_realtime_analysis')
+@profiled_event('stop_realtime_analysis')
 def handle_stop_realtime(data):
     """停止实时分析"""
     session_id = data.get('session_id')
     analysis_type = data.get('type')
 
+    if session_id:
+        leave_room(session_id)
+
     emit('realtime_stopped', {
         'session_id': session_id,
         'type': analysis_type,
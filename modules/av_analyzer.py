@@ -0,0 +1,272 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class AudioVisualAnalyzer:
+    """视频音画联合分析：容器只解复用一次，画面帧与音频窗口同时送入面部与语音分析
+
+    解复用与解码在调用线程中进行，面部与语音各由一个线程消费有界队列（队列满时解复用等待，
+    内存占用恒定），总耗时接近较慢的一种模态而非两者之和。结果按容器时间戳对齐到统一的
+    时间窗口。需要 PyAV（pip install av）。
+    """
+
+    def __init__(self, analyze_frame, analyze_audio, sample_rate=16000, frame_step=5, voice_window=None,
+                 queue_size=8):
+        self.analyze_frame = analyze_frame  # BGR 帧 -> 实时面部结果（未检测到人脸时为 None）
+        self.analyze_audio = analyze_audio  # 单声道 float32 采样 -> 语音结果（无结果时为 None）
+        self.sample_rate = sample_rate
+        self.frame_step = frame_step  # 与 analyze_video 相同的抽帧间隔
+        self.voice_window = voice_window or float(os.environ.get('JPA_AV_VOICE_WINDOW', 5))  # 语音分析窗口（秒）
+        self.min_window = 1.0  # 末尾不足该时长的音频不单独分析
+        self.queue_size = queue_size
+
+    def analyze(self, video_path):
+        """分析视频文件，返回面部汇总、语音窗口与对齐后的时间线"""
+        import av
+
+        started = time.perf_counter()
+        container = av.open(video_path)
+        face = _Consumer(self._analyze_frame, self.queue_size, 'av-face')
+        voice = _Consumer(self._analyze_window, self.queue_size, 'av-voice')
+
+        try:
+            video_stream = next(iter(container.streams.video), None)
+            audio_stream = next(iter(container.streams.audio), None)
+            if video_stream is None and audio_stream is None:
+                raise ValueError('文件中没有音视频流')
+
+            streams = [stream for stream in (video_stream, audio_stream) if stream is not None]
+            for stream in streams:
+                stream.thread_type = 'AUTO'
+
+            origin = container.start_time / av.time_base if container.start_time is not None else 0.0
+            fps = float(video_stream.average_rate) if video_stream is not None and video_stream.average_rate else 30.0
+            resampler = av.AudioResampler(format='flt', layout='mono', rate=self.sample_rate) \
+                if audio_stream is not None else None
+
+            window_samples = int(self.voice_window * self.sample_rate)
+            audio = _AudioWindows(window_samples, self.sample_rate)
+            frame_count = 0
+
+            for packet in container.demux(streams):
+                for frame in packet.decode():
+                    if packet.stream.type == 'video':
+                        if frame_count % self.frame_step == 0:
+                            timestamp = frame.time - origin if frame.time is not None else frame_count / fps
+                            face.put((frame_count, timestamp, frame.to_ndarray(format='bgr24')))
+                        frame_count += 1
+                    else:
+                        if audio.start is None and frame.time is not None:
+                            audio.start = frame.time - origin
+                        for window in audio.push(_resample(resampler, frame)):
+                            voice.put(window)
+
+            if resampler is not None:
+                # 冲刷重采样器中剩余的采样
+                for window in audio.push(_resample(resampler, None)):
+                    voice.put(window)
+                remainder = audio.flush(int(self.min_window * self.sample_rate))
+                if remainder is not None:
+                    voice.put(remainder)
+
+        finally:
+            face.close()
+            voice.close()
+            container.close()
+
+        for consumer in (face, voice):
+            if consumer.error is not None:
+                raise consumer.error
+
+        face_frames = sorted(face.results, key=lambda item: item['frame'])
+        voice_windows = sorted(voice.results, key=lambda item: item['start'])
+        duration = max([frame_count / fps] + [window['end'] for window in voice_windows])
+
+        return {
+            'face': summarize_face_frames(face_frames, frame_count),
+            'voice': {
+                'windows': voice_windows,
+                'average_intensity': float(np.mean([w['data']['intensity'] for w in voice_windows]))
+                if voice_windows else None
+            },
+            'timeline': self._align(face_frames, voice_windows, duration),
+            'duration': duration,
+            'processing': {
+                'wall_s': time.perf_counter() - started,
+                'face_s': face.busy,
+                'voice_s': voice.busy
+            }
+        }
+
+    def _analyze_frame(self, frame_index, timestamp, image):
+        result = self.analyze_frame(image)
+        if not result:
+            return None
+        return {'frame': frame_index, 'timestamp': timestamp, 'data': result}
+
+    def _analyze_window(self, start, samples):
+        result = self.analyze_audio(samples)
+        if not result:
+            return None
+        return {
+            'start': start,
+            'end': start + len(samples) / self.sample_rate,
+            'data': result
+        }
+
+    def _align(self, face_frames, voice_windows, duration):
+        """按语音窗口长度划分时间轴，每个窗口合并该时段的面部均值与语音结果"""
+        count = max(1, int(np.ceil(duration / self.voice_window)))
+        timeline = [{'start': i * self.voice_window, 'end': min(duration, (i + 1) * self.voice_window),
+                     'face': None, 'voice': None} for i in range(count)]
+
+        groups = {}
+        for frame in face_frames:
+            groups.setdefault(min(count - 1, int(frame['timestamp'] // self.voice_window)), []).append(frame)
+        for index, frames in groups.items():
+            timeline[index]['face'] = {
+                'average_emotions': _average_emotions(frames),
+                'analyzed_frames': len(frames)
+            }
+
+        # 按窗口中点归入时间段（音频流可能相对容器起点有偏移）；多个窗口落入同一段时取重叠最长者
+        overlaps = {}
+        for window in voice_windows:
+            midpoint = (window['start'] + window['end']) / 2
+            index = min(count - 1, int(midpoint // self.voice_window))
+            segment = timeline[index]
+            overlap = min(window['end'], segment['end']) - max(window['start'], segment['start'])
+            if overlap > overlaps.get(index, float('-inf')):
+                overlaps[index] = overlap
+                segment['voice'] = window['data']
+
+        return timeline
+
+
+def summarize_face_frames(frames, total_frames):
+    """逐帧面部结果汇总为与 analyze_video 相同的结构"""
+    if not frames:
+        return None
+
+    key_moments = []
+    for frame in frames:
+        for emotion, value in frame['data'].get('emotions', {}).items():
+            if emotion != 'neutral' and value > 0.7:
+                key_moments.append({
+                    'frame': frame['frame'],
+                    'timestamp': frame['timestamp'],
+                    'emotion': emotion,
+                    'intensity': value
+                })
+
+    return {
+        'average_emotions': _average_emotions(frames),
+        'key_moments': key_moments,
+        'total_frames': total_frames,
+        'analyzed_frames': len(frames)
+    }
+
+
+def _average_emotions(frames):
+    sums = {}
+    for frame in frames:
+        for emotion, value in frame['data'].get('emotions', {}).items():
+            sums[emotion] = sums.get(emotion, 0) + value
+    return {emotion: value / len(frames) for emotion, value in sums.items()}
+
+
+def _resample(resampler, frame):
+    """重采样为单声道 float32 数组（兼容返回单帧或帧列表的 PyAV 版本）"""
+    frames = resampler.resample(frame)
+    if not isinstance(frames, list):
+        frames = [frames] if frames is not None else []
+    if not frames:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate([f.to_ndarray().reshape(-1) for f in frames]).astype(np.float32, copy=False)
+
+
+class _AudioWindows:
+    """将连续音频采样切分为定长窗口 (起始秒, 采样)"""
+
+    def __init__(self, window_samples, sample_rate):
+        self.window_samples = window_samples
+        self.sample_rate = sample_rate
+        self.start = None  # 首个音频帧的时间（秒）
+        self.consumed = 0  # 已切出的采样数
+        self._chunks = []
+        self._buffered = 0
+
+    def push(self, samples):
+        if len(samples):
+            self._chunks.append(samples)
+            self._buffered += len(samples)
+
+        windows = []
+        while self._buffered >= self.window_samples:
+            buffer = np.concatenate(self._chunks)
+            windows.append(self._window(buffer[:self.window_samples]))
+            rest = buffer[self.window_samples:]
+            self._chunks = [rest] if len(rest) else []
+            self._buffered = len(rest)
+        return windows
+
+    def flush(self, min_samples):
+        """剩余采样达到 min_samples 时作为最后一个窗口"""
+        if self._buffered < max(1, min_samples):
+            return None
+        window = self._window(np.concatenate(self._chunks))
+        self._chunks = []
+        self._buffered = 0
+        return window
+
+    def _window(self, samples):
+        start = (self.start or 0.0) + self.consumed / self.sample_rate
+        self.consumed += len(samples)
+        return start, samples
+
+
+class _Consumer:
+    """单线程消费有界队列，记录处理耗时；出错后丢弃后续任务，避免生产方阻塞"""
+
+    def __init__(self, fn, size, name):
+        self.fn = fn
+        self.queue = queue.Queue(maxsize=size)
+        self.results = []
+        self.busy = 0.0
+        self.error = None
+
+        # 保留调用方上下文（如剖析令牌）
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self._run,), name=name, daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue
+
+            started = time.perf_counter()
+            try:
+                result = self.fn(*item)
+            except Exception as e:
+                self.error = e
+                result = None
+            self.busy += time.perf_counter() - started
+
+            if result is not None:
+                self.results.append(result)
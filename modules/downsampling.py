@@ -0,0 +1,67 @@
+import numpy as np
+
+
+def downsample_lttb(times, values, n_out):
+    """Largest-Triangle-Three-Buckets 降采样，返回选中点的下标（保留峰值形状）"""
+    n = len(times)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # 缺失值按 0 参与三角形面积计算
+    values = np.nan_to_num(values)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # 下一个桶的平均点
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_t = times[next_start:next_end].mean()
+        avg_v = values[next_start:next_end].mean()
+
+        # 当前桶中与前一选中点、下一桶均值构成最大三角形的点
+        t = times[start:end]
+        v = values[start:end]
+        areas = np.abs(
+            (times[previous] - avg_t) * (v - values[previous]) -
+            (times[previous] - t) * (avg_v - values[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def downsample_minmax(times, values, n_out):
+    """最小/最大值分桶降采样，每桶保留最小值与最大值所在点，返回下标"""
+    n = len(times)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+
+    n_buckets = max(1, n_out // 2)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+
+    # 缺失值不参与极值选择
+    filled_low = np.where(np.isnan(values), np.inf, values)
+    filled_high = np.where(np.isnan(values), -np.inf, values)
+
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        low = start + int(np.argmin(filled_low[start:end]))
+        high = start + int(np.argmax(filled_high[start:end]))
+        selected.extend(sorted({low, high}))
+
+    return np.array(selected, dtype=int)
+
+
+DOWNSAMPLERS = {
+    'lttb': downsample_lttb,
+    'minmax': downsample_minmax
+}
@@ -1,39 +1,70 @@
 import cv2
 import numpy as np
-from deepface import DeepFace
-import mediapipe as mp
 from collections import deque
 import threading
 import time
 
+from modules.metrics import metrics
+
 
 class FaceEmotionAnalyzer:
     def __init__(self):
-        # 初始化MediaPipe
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5
-        )
+        # MediaPipe 与 DeepFace 模型在首次推理时加载（仅做强度计算等后处理的实例不加载模型）
+        self._face_mesh = None
 
         # 情绪类别
         self.emotion_labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
 
+        # 不同情绪的强度权重（中性不计入）
+        self.intensity_weights = {
+            'angry': 1.2,
+            'disgust': 1.0,
+            'fear': 1.3,
+            'happy': 0.8,
+            'sad': 1.1,
+            'surprise': 0.9
+        }
+
         # 微表情检测参数
         self.micro_expression_buffer = deque(maxlen=30)  # 1秒缓冲（30fps）
         self.emotion_history = deque(maxlen=150)  # 5秒历史
 
+        # 批量分析时直接调用的情绪分类模型（首次使用时加载）
+        self._emotion_model = None
+
+        # MediaPipe 跟踪模型与上面的缓冲区都不是线程安全的，同一实例的分析调用串行执行
+        self._lock = threading.RLock()
+
+    @property
+    def face_mesh(self):
+        """MediaPipe 人脸跟踪模型（首次使用时创建）"""
+        if self._face_mesh is None:
+            import mediapipe as mp
+            self._face_mesh = mp.solutions.face_mesh.FaceMesh(
+                static_image_mode=False,
+                max_num_faces=1,
+                refine_landmarks=True,
+                min_detection_confidence=0.5
+            )
+        return self._face_mesh
+
     def analyze(self, image):
         """分析单张图像"""
+        with self._lock:
+            return self._analyze(image)
+
+    def _analyze(self, image):
+        from deepface import DeepFace
+
         try:
             # 使用DeepFace进行情绪识别
-            result = DeepFace.analyze(
-                img_path=image,
-                actions=['emotion'],
-                enforce_detection=False
-            )
+            metrics.increment('model_calls', model='deepface')
+            with metrics.timer('classify', 'face'):
+                result = DeepFace.analyze(
+                    img_path=image,
+                    actions=['emotion'],
+                    enforce_detection=False
+                )
 
             emotions = result[0]['emotion'] if isinstance(result, list) else result['emotion']
 
@@ -45,16 +76,71 @@ class FaceEmotionAnalyzer:
 
         except Exception as e:
             print(f"Face analysis error: {e}")
+            metrics.increment('errors', stage='classify', modality='face')
             return {emotion: 0 for emotion in self.emotion_labels}
 
+    def analyze_batch(self, images):
+        """批量分析多张图像：逐张检测裁剪人脸，情绪模型对整批做一次前向计算"""
+        with self._lock:
+            return self._analyze_batch(images)
+
+    def _analyze_batch(self, images):
+        try:
+            with metrics.timer('detect', 'face'):
+                faces = np.stack([self._extract_face(image) for image in images])
+
+            metrics.increment('model_calls', model='deepface')
+            with metrics.timer('classify', 'face'):
+                predictions = self._load_emotion_model().predict(faces, verbose=0)
+
+        except Exception as e:
+            # 模型接口与 DeepFace 版本不兼容等情况下退回逐张分析
+            print(f"Face batch analysis error: {e}")
+            metrics.increment('errors', stage='classify_batch', modality='face')
+            return [self.analyze(image) for image in images]
+
+        results = []
+        for scores in predictions:
+            # 模型输出顺序与 emotion_labels 一致
+            total = float(np.sum(scores)) or 1.0
+            results.append({emotion: float(score) / total for emotion, score in zip(self.emotion_labels, scores)})
+        return results
+
+    def _extract_face(self, image):
+        """检测并裁剪人脸，转换为情绪模型输入（48x48 灰度，0-1）；未检测到时使用整张图像"""
+        from deepface import DeepFace
+
+        faces = DeepFace.extract_faces(img_path=image, enforce_detection=False)
+        face = faces[0]['face']
+        if face.dtype != np.uint8:
+            face = (np.clip(face, 0, 1) * 255).astype(np.uint8)
+        gray = cv2.cvtColor(face, cv2.COLOR_RGB2GRAY) if face.ndim == 3 else face
+        gray = cv2.resize(gray, (48, 48)).astype(np.float32) / 255.0
+        return gray[..., np.newaxis]
+
+    def _load_emotion_model(self):
+        """DeepFace 情绪分类模型（新版本返回包装对象，取其中的 Keras 模型）"""
+        if self._emotion_model is None:
+            from deepface import DeepFace
+            model = DeepFace.build_model('Emotion')
+            self._emotion_model = getattr(model, 'model', model)
+        return self._emotion_model
+
     def analyze_realtime(self, frame):
         """实时分析视频帧"""
+        with self._lock:
+            return self._analyze_realtime(frame)
+
+    def _analyze_realtime(self, frame):
         try:
             # 检测人脸
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(rgb_frame)
+            metrics.increment('model_calls', model='mediapipe')
+            with metrics.timer('detect', 'face'):
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                results = self.face_mesh.process(rgb_frame)
 
             if not results.multi_face_landmarks:
+                metrics.increment('frames_dropped', modality='face', reason='no_face')
                 return None
 
             # 获取面部关键点
@@ -64,7 +150,8 @@ class FaceEmotionAnalyzer:
             emotions = self.analyze(frame)
 
             # 检测微表情
-            micro_expressions = self.detect_micro_expressions(landmarks, emotions)
+            with metrics.timer('features', 'face'):
+                micro_expressions = self.detect_micro_expressions(landmarks, emotions)
 
             # 更新历史
             self.emotion_history.append(emotions)
@@ -77,6 +164,7 @@ class FaceEmotionAnalyzer:
 
         except Exception as e:
             print(f"Realtime analysis error: {e}")
+            metrics.increment('errors', stage='realtime', modality='face')
             return None
 
     def analyze_video(self, video_path):
@@ -87,7 +175,8 @@ class FaceEmotionAnalyzer:
         frame_count = 0
 
         while cap.isOpened():
-            ret, frame = cap.read()
+            with metrics.timer('decode', 'video'):
+                ret, frame = cap.read()
             if not ret:
                 break
 
@@ -239,14 +328,7 @@ class FaceEmotionAnalyzer:
         for emotion, value in emotions.items():
             if emotion != 'neutral':
                 # 不同情绪的权重
-                weight = {
-                    'angry': 1.2,
-                    'disgust': 1.0,
-                    'fear': 1.3,
-                    'happy': 0.8,
-                    'sad': 1.1,
-                    'surprise': 0.9
-                }.get(emotion, 1.0)
+                weight = self.intensity_weights.get(emotion, 1.0)
 
                 intensity += value * weight
 
@@ -0,0 +1,411 @@
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+import types
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# 各模态的默认共享内存槽大小（字节）与槽数
+SLOT_BYTES = {
+    'face': 1920 * 1080 * 3,  # 一帧 1080p BGR 图像
+    'voice': 4 * 1024 * 1024,  # 约 2 分钟 16kHz 16-bit 音频
+}
+DEFAULT_SLOTS = 8
+
+# 各模态工作进程可调用的分析方法（第一个为默认）
+WORKER_METHODS = {
+    'face': ['analyze_realtime', 'analyze'],
+    'voice': ['analyze_realtime', 'analyze_samples'],
+    'text': ['analyze_semantics', 'analyze_semantics_batch', 'classify', 'extract_keyword_emotions']
+}
+
+
+class SharedFrameRing:
+    """共享内存帧环：固定大小槽位，由父进程分配与回收，子进程按名称映射后零拷贝读取"""
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self._free = queue.Queue()
+            for slot in range(slots):
+                self._free.put(slot)
+        else:
+            self.shm = _attach_shared_memory(name)
+            self._free = None
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self, timeout=None):
+        """申请空闲槽位，超时返回 None"""
+        try:
+            return self._free.get(timeout=timeout) if timeout else self._free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def free_slots(self):
+        return self._free.qsize()
+
+    def write(self, slot, array):
+        """将数组写入槽位，返回 (shape, dtype) 描述"""
+        array = np.ascontiguousarray(array)
+        if array.nbytes > self.slot_bytes:
+            raise ValueError(f'数据大小 {array.nbytes} 超过共享内存槽大小 {self.slot_bytes}')
+        self.view(slot, array.shape, array.dtype)[...] = array
+        return array.shape, array.dtype.str
+
+    def view(self, slot, shape, dtype):
+        """槽位上的数组视图（不复制）"""
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class InferenceWorkerPool:
+    """单一模态的推理工作进程池
+
+    父进程（Web 进程）把解码后的帧/音频写入共享内存槽，只通过队列传递槽位描述；
+    工作进程启动时加载模型并以一次空输入推理预热（分析器的模型为延迟加载），处理后经
+    结果队列返回结果。同一会话固定路由到同一工作进程，保证有状态分析器（微表情缓冲、
+    情绪历史）按顺序处理。调用方等待超时时用 cancel() 撤销请求并回收共享内存槽。
+    """
+
+    def __init__(self, modality, workers=1, slots=None, slot_bytes=None):
+        self.modality = modality
+        self.workers = workers
+        self.uses_shared_memory = modality in SLOT_BYTES
+
+        self.ring = None
+        if self.uses_shared_memory:
+            self.ring = SharedFrameRing(slots or DEFAULT_SLOTS * workers, slot_bytes or SLOT_BYTES[modality])
+
+        self._ctx = mp.get_context('spawn')  # 避免 fork 继承 TensorFlow / torch 线程状态
+        self.result_queue = self._ctx.Queue()
+        self.task_queues = []
+        self.processes = []
+        for index in range(workers):
+            self.task_queues.append(self._ctx.Queue())
+            self.processes.append(self._spawn(index))
+
+        self.pending = {}  # request_id -> (future, slot, worker_index, submitted_at)
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'dropped': 0, 'cancelled': 0, 'restarts': 0}
+        self._ids = itertools.count()
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._stopped = False
+
+        self._collector = threading.Thread(target=self._collect, name=f'{modality}-results', daemon=True)
+        self._collector.start()
+
+    def submit(self, payload, session_id=None, method=None, slot_timeout=None):
+        """提交一条推理请求，返回 Future；共享内存槽已满时返回 None（调用方丢弃该帧）"""
+        if self._stopped:
+            raise RuntimeError('推理工作进程池已停止')
+
+        method = method or WORKER_METHODS[self.modality][0]
+        if method not in WORKER_METHODS[self.modality]:
+            raise ValueError(f'{self.modality} 工作进程不支持方法: {method}')
+
+        slot = None
+        if self.uses_shared_memory:
+            if isinstance(payload, (bytes, bytearray)):
+                payload = np.frombuffer(payload, dtype=np.uint8)
+            slot = self.ring.acquire(slot_timeout)
+            if slot is None:
+                with self._lock:
+                    self.stats['dropped'] += 1
+                return None
+            try:
+                shape, dtype = self.ring.write(slot, payload)
+            except Exception:
+                self.ring.release(slot)
+                raise
+            message_payload = (shape, dtype)
+        else:
+            message_payload = payload
+
+        index = self._route(session_id)
+        future = Future()
+        with self._lock:
+            self._ensure_alive(index)
+            request_id = next(self._ids)
+            future.request_id = request_id
+            self.pending[request_id] = (future, slot, index, time.perf_counter())
+            self.stats['submitted'] += 1
+
+        self.task_queues[index].put((request_id, method, slot, message_payload))
+        return future
+
+    def cancel(self, future):
+        """撤销未完成的请求（调用方已超时）：回收共享内存槽，工作进程稍后返回的结果被丢弃
+
+        工作进程可能仍在读取该槽；槽被新请求复用时只影响这条已撤销请求的结果。
+        """
+        with self._lock:
+            entry = self.pending.pop(getattr(future, 'request_id', None), None)
+            if entry is None:
+                return False
+            self.stats['cancelled'] += 1
+
+        slot = entry[1]
+        if slot is not None:
+            self.ring.release(slot)
+        future.cancel()
+        return True
+
+    def queue_depth(self):
+        """已提交未完成的请求数"""
+        return len(self.pending)
+
+    def snapshot(self):
+        """进程池状态"""
+        with self._lock:
+            return {
+                'modality': self.modality,
+                'workers': self.workers,
+                'alive': sum(p.is_alive() for p in self.processes),
+                'in_flight': len(self.pending),
+                'free_slots': self.ring.free_slots() if self.ring is not None else None,
+                **self.stats
+            }
+
+    def stop(self, timeout=10):
+        """停止工作进程并释放共享内存"""
+        if self._stopped:
+            return
+        self._stopped = True
+
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+        self.result_queue.put(None)
+        self._collector.join(timeout)
+
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+
+    def _spawn(self, index):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(self.modality, index, self.workers, self.ring.name if self.ring else None,
+                  self.ring.slot_bytes if self.ring else 0,
+                  self.task_queues[index], self.result_queue),
+            name=f'{self.modality}-worker-{index}',
+            daemon=True
+        )
+        with _detached_main():
+            process.start()
+        return process
+
+    def _route(self, session_id):
+        """会话亲和路由：同一会话固定到同一工作进程"""
+        if session_id is None or self.workers == 1:
+            return next(self._round_robin) % self.workers
+        return zlib.crc32(str(session_id).encode('utf-8')) % self.workers
+
+    def _ensure_alive(self, index):
+        """工作进程异常退出时重启，并使其未完成的请求失败"""
+        if self.processes[index].is_alive():
+            return
+
+        for request_id, (future, slot, worker, _) in list(self.pending.items()):
+            if worker == index:
+                del self.pending[request_id]
+                if slot is not None:
+                    self.ring.release(slot)
+                future.set_exception(RuntimeError(f'{self.modality} 推理进程异常退出'))
+                self.stats['failed'] += 1
+
+        # 旧队列中可能残留任务，重建队列
+        self.task_queues[index] = self._ctx.Queue()
+        self.processes[index] = self._spawn(index)
+        self.stats['restarts'] += 1
+        print(f"Inference worker {self.modality}-{index} restarted")
+
+    def _collect(self):
+        """结果收集线程：回收槽位并回填 Future"""
+        from modules.metrics import metrics
+
+        while True:
+            item = self.result_queue.get()
+            if item is None:
+                break
+
+            request_id, ok, value, elapsed, counters = item
+            # 工作进程中分析器记录的计数器增量（模型调用、无人脸丢帧等）并入本进程，由 /metrics 导出；
+            # 已撤销的请求也合并
+            metrics.merge_counters(counters)
+            with self._lock:
+                entry = self.pending.pop(request_id, None)
+                if entry is None:
+                    continue
+                future, slot, _, submitted_at = entry
+                self.stats['completed' if ok else 'failed'] += 1
+
+            if slot is not None:
+                self.ring.release(slot)
+
+            metrics.observe('worker', self.modality, elapsed)
+            metrics.observe('ipc', self.modality, max(0.0, time.perf_counter() - submitted_at - elapsed))
+
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+
+def create_worker_pools(spec=None):
+    """按配置创建各模态工作进程池
+
+    spec 形如 'face=2,voice=1,text=1'，默认读取 JPA_INFERENCE_WORKERS；
+    未配置的模态仍在 Web 进程内推理。
+    """
+    spec = spec if spec is not None else os.environ.get('JPA_INFERENCE_WORKERS', '')
+    pools = {}
+    for part in spec.split(','):
+        if '=' not in part:
+            continue
+        modality, count = part.split('=', 1)
+        modality = modality.strip()
+        count = int(count)
+        if modality not in ('face', 'voice', 'text'):
+            raise ValueError(f'不支持的推理模态: {modality}')
+        if count > 0:
+            pools[modality] = InferenceWorkerPool(modality, workers=count)
+
+    if pools:
+        atexit.register(lambda: [pool.stop() for pool in pools.values()])
+    return pools
+
+
+def _create_analyzer(modality):
+    """在工作进程内加载分析器"""
+    from modules.model_store import ModelStore, configure_offline
+    configure_offline(ModelStore())
+
+    if modality == 'face':
+        from modules.face_emotion import FaceEmotionAnalyzer
+        return FaceEmotionAnalyzer()
+
+    if modality == 'voice':
+        from modules.voice_emotion import VoiceEmotionAnalyzer
+        return VoiceEmotionAnalyzer()
+
+    from modules.text_emotion import TextEmotionAnalyzer
+    return TextEmotionAnalyzer()
+
+
+def _warm_up(modality, analyzer):
+    """加载延迟加载的模型并完成一次推理，避免工作进程的首个请求超过 JPA_INFERENCE_TIMEOUT"""
+    started = time.perf_counter()
+    if modality == 'face':
+        blank = np.zeros((224, 224, 3), dtype=np.uint8)
+        analyzer.face_mesh.process(blank)
+        analyzer._load_emotion_model()
+        analyzer.analyze(blank)
+    elif modality == 'voice':
+        analyzer.analyze_samples(np.zeros(analyzer.sample_rate, dtype=np.float32))
+    else:
+        analyzer.classify(['预热'])
+    print(f"Inference worker {modality} warmed up in {time.perf_counter() - started:.1f}s")
+
+
+def _worker_main(modality, index, workers, shm_name, slot_bytes, task_queue, result_queue):
+    """工作进程主循环"""
+    from modules.metrics import metrics
+    from modules.resource_manager import ResourceManager
+
+    # 导入框架前按该进程分到的核心数设置线程池
+    resources = ResourceManager()
+    cores = resources.configure_worker(modality, index, workers)
+
+    ring = SharedFrameRing(0, slot_bytes, name=shm_name) if shm_name else None
+
+    # 模型加载失败时保持进程运行，逐条返回错误，避免调用方等待超时
+    analyzer = None
+    startup_error = None
+    try:
+        analyzer = _create_analyzer(modality)
+        _warm_up(modality, analyzer)
+        resources.configure_frameworks(modality, threads=len(cores))
+    except Exception as e:
+        print(f"Inference worker {modality} startup error: {e}")
+        startup_error = str(e)
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        request_id, method, slot, payload = task
+        start = time.perf_counter()
+        try:
+            if analyzer is None:
+                raise RuntimeError(startup_error)
+            if ring is not None:
+                shape, dtype = payload
+                payload = ring.view(slot, shape, dtype)
+                if modality == 'voice':
+                    payload = payload.tobytes()
+            result = getattr(analyzer, method)(payload)
+            result_queue.put((request_id, True, result, time.perf_counter() - start, metrics.drain_counters()))
+        except Exception as e:
+            print(f"Inference worker {modality} error: {e}")
+            result_queue.put((request_id, False, str(e), time.perf_counter() - start, metrics.drain_counters()))
+
+    if ring is not None:
+        ring.close()
+
+
+@contextmanager
+def _detached_main():
+    """启动子进程期间临时替换主模块
+
+    spawn 子进程默认会重新执行主模块（app.py 会再次加载全部模型并启动后台线程），
+    工作进程入口位于本模块，无需主模块。
+    """
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+def _attach_shared_memory(name):
+    """子进程按名称映射共享内存（由父进程负责删除）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 没有 track 参数；spawn 子进程与父进程共用 resource_tracker，
+        # 重复登记不会导致子进程退出时删除共享内存
+        return shared_memory.SharedMemory(name=name)
@@ -0,0 +1,178 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# 延迟直方图桶上界（秒），覆盖 0.5ms ~ 10s
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# 对外暴露的分位数
+QUANTILES = [0.5, 0.95, 0.99]
+
+
+class LatencyHistogram:
+    """单个阶段的延迟统计：累积桶计数 + 最近样本环形缓冲（用于分位数）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1024):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+        self._recent = np.zeros(window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """记录一次耗时"""
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self._recent[self.count % len(self._recent)] = seconds
+            self.count += 1
+            self.sum += seconds
+
+    def quantiles(self, qs=QUANTILES):
+        """最近窗口内的分位数"""
+        with self._lock:
+            recent = self._recent[:min(self.count, len(self._recent))].copy()
+        if not len(recent):
+            return {q: 0.0 for q in qs}
+        return {q: float(v) for q, v in zip(qs, np.quantile(recent, qs))}
+
+    def snapshot(self):
+        """累积桶计数、总数与总耗时"""
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+
+class MetricsRegistry:
+    """进程内指标注册表：阶段延迟直方图、计数器与按需采集的仪表值"""
+
+    def __init__(self, prefix='jpa'):
+        self.prefix = prefix
+        self.histograms = {}  # (stage, modality) -> LatencyHistogram
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # name -> (help, fn)，fn 返回 {labels: value}
+
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, stage, modality):
+        """计时上下文：with metrics.timer('detect', 'face'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, modality, time.perf_counter() - start)
+
+    def observe(self, stage, modality, seconds):
+        """记录某模态某阶段的耗时"""
+        histogram = self.histograms.get((stage, modality))
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault((stage, modality), LatencyHistogram())
+        histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        """计数器累加，如 metrics.increment('model_calls', model='deepface')"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def drain_counters(self):
+        """取出并清零全部计数器（推理工作进程随每个结果把增量交回 Web 进程）"""
+        with self._lock:
+            counters, self.counters = self.counters, {}
+        return counters
+
+    def merge_counters(self, counters):
+        """累加其他进程交回的计数器增量"""
+        with self._lock:
+            for key, amount in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_gauge(self, name, help_text, fn):
+        """注册仪表值，采集时调用 fn() 取值；fn 返回数值或 {labels 元组: 数值}"""
+        self.gauges[name] = (help_text, fn)
+
+    def stage_summary(self):
+        """各阶段延迟摘要（毫秒），供 JSON 接口使用"""
+        summary = {}
+        for (stage, modality), histogram in list(self.histograms.items()):
+            _, count, total = histogram.snapshot()
+            quantiles = histogram.quantiles()
+            summary.setdefault(modality, {})[stage] = {
+                'count': count,
+                'mean_ms': total / count * 1000 if count else 0.0,
+                **{f'p{int(q * 100)}_ms': value * 1000 for q, value in quantiles.items()}
+            }
+        return summary
+
+    def render_prometheus(self):
+        """输出 Prometheus 文本格式"""
+        lines = []
+        latency = f'{self.prefix}_stage_latency_seconds'
+        quantile_name = f'{self.prefix}_stage_latency_quantile_seconds'
+
+        histograms = sorted(self.histograms.items())
+
+        lines.append(f'# HELP {latency} Analyzer stage latency.')
+        lines.append(f'# TYPE {latency} histogram')
+        for (stage, modality), histogram in histograms:
+            counts, count, total = histogram.snapshot()
+            labels = f'stage="{stage}",modality="{modality}"'
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{latency}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{latency}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{latency}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{latency}_count{{{labels}}} {count}')
+
+        lines.append(f'# HELP {quantile_name} Analyzer stage latency quantiles over recent samples.')
+        lines.append(f'# TYPE {quantile_name} gauge')
+        for (stage, modality), histogram in histograms:
+            for q, value in histogram.quantiles().items():
+                lines.append(f'{quantile_name}{{stage="{stage}",modality="{modality}",quantile="{q}"}} {float(value)}')
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+        seen = set()
+        for (name, labels), value in counters:
+            metric = f'{self.prefix}_{name}_total'
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+
+        for name, (help_text, fn) in sorted(self.gauges.items()):
+            metric = f'{self.prefix}_{name}'
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"Metrics gauge error ({name}): {e}")
+                continue
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    lines.append(f'{metric}{_format_labels(labels)} {v}')
+            else:
+                lines.append(f'{metric} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    """(('k', 'v'), ...) -> {k="v",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+
+# 进程级共享注册表，各分析模块直接导入使用
+metrics = MetricsRegistry()
@@ -0,0 +1,125 @@
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """跨请求微批处理调度器
+
+    调用方提交单条输入并获得 Future；后台线程最多收集 max_batch_size 条
+    或等待 max_wait_ms 毫秒后执行一次批量前向计算，再逐条回填结果。
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self.queue = queue.Queue()
+        self.stats = {
+            'batches': 0,
+            'items': 0,
+            'max_batch': 0
+        }
+
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """提交单条输入，返回 Future"""
+        if self._stopped:
+            raise RuntimeError('批处理调度器已停止')
+
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def map(self, items, timeout=None):
+        """提交多条输入并按顺序等待结果"""
+        futures = [self.submit(item) for item in items]
+
+        # eventlet 绿色线程中（未 monkey-patch）Future.result() 会阻塞整个事件循环，改由 tpool 线程等待
+        if _in_green_thread():
+            from eventlet import tpool
+            return tpool.execute(_wait_all, futures, timeout)
+        return _wait_all(futures, timeout)
+
+    def queue_depth(self):
+        """当前排队数量"""
+        return self.queue.qsize()
+
+    def stop(self):
+        """停止后台线程"""
+        self._stopped = True
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """批处理循环"""
+        while True:
+            first = self.queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+
+            # 在时间窗口内尽量凑满一批
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._stopped = True
+                    break
+                batch.append(item)
+
+            self._process(batch)
+
+            if self._stopped and self.queue.empty():
+                break
+
+    def _process(self, batch):
+        """执行一次批量计算并回填结果"""
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+
+        try:
+            results = list(self.batch_fn(items))
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+        # 结果条数不足时其余调用方不能一直等待
+        if len(results) != len(futures):
+            error = RuntimeError(f'批量计算返回 {len(results)} 条结果，应为 {len(futures)} 条')
+            for future in futures[len(results):]:
+                future.set_exception(error)
+
+        self.stats['batches'] += 1
+        self.stats['items'] += len(batch)
+        self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+
+
+def _wait_all(futures, timeout):
+    """按顺序等待全部 Future"""
+    return [future.result(timeout) for future in futures]
+
+
+def _in_green_thread():
+    """当前是否运行在 eventlet 绿色线程中（tpool 线程与普通线程返回 False）"""
+    if 'eventlet' not in sys.modules:
+        return False
+    import greenlet
+    return greenlet.getcurrent().parent is not None
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from datetime import datetime
+
+
+# safetensors 数据类型到 torch 数据类型名的映射
+SAFETENSORS_DTYPES = {
+    'F64': 'float64',
+    'F32': 'float32',
+    'F16': 'float16',
+    'BF16': 'bfloat16',
+    'I64': 'int64',
+    'I32': 'int32',
+    'I16': 'int16',
+    'I8': 'int8',
+    'U8': 'uint8',
+    'BOOL': 'bool'
+}
+
+# 拉取 Hugging Face 模型时保留的文件
+HF_ALLOW_PATTERNS = ['*.json', '*.txt', '*.model', '*.safetensors', '*.bin']
+
+
+class ModelStore:
+    """本地离线模型仓库（清单记录模型 ID、版本与校验和）"""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get('JPA_MODEL_STORE', 'models/store')
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.manifest = self._load_manifest()
+
+    def has(self, model_id):
+        """模型是否已在仓库中"""
+        return model_id in self.manifest['models']
+
+    def path(self, model_id):
+        """模型在仓库中的目录"""
+        return os.path.join(self.root, model_id.replace('/', '__'))
+
+    def entry(self, model_id):
+        """获取清单条目"""
+        return self.manifest['models'].get(model_id)
+
+    def list_models(self):
+        """列出仓库中的模型"""
+        return [
+            {'id': model_id, 'version': entry['version'], 'format': entry['format'],
+             'files': len(entry['files'])}
+            for model_id, entry in sorted(self.manifest['models'].items())
+        ]
+
+    def verify(self, model_id, full=False):
+        """校验模型文件（默认只校验大小，full=True 时计算 SHA-256）"""
+        entry = self.entry(model_id)
+        if entry is None:
+            return {'id': model_id, 'ok': False, 'errors': ['模型不在清单中']}
+
+        errors = []
+        model_dir = self.path(model_id)
+        for rel_path, meta in entry['files'].items():
+            file_path = os.path.join(model_dir, rel_path)
+            if not os.path.exists(file_path):
+                errors.append(f'{rel_path}: 文件缺失')
+            elif os.path.getsize(file_path) != meta['size']:
+                errors.append(f'{rel_path}: 大小不符')
+            elif full and _sha256(file_path) != meta['sha256']:
+                errors.append(f'{rel_path}: 校验和不符')
+
+        return {'id': model_id, 'ok': not errors, 'errors': errors}
+
+    def pull_hf_model(self, model_id, revision='main'):
+        """从 Hugging Face 拉取模型，转换为 safetensors 并登记到清单"""
+        from huggingface_hub import snapshot_download
+
+        model_dir = self.path(model_id)
+        snapshot_download(
+            repo_id=model_id,
+            revision=revision,
+            local_dir=model_dir,
+            local_dir_use_symlinks=False,
+            allow_patterns=HF_ALLOW_PATTERNS
+        )
+
+        # 仅有 pytorch_model.bin 时转换为 safetensors，以便内存映射加载
+        bin_path = os.path.join(model_dir, 'pytorch_model.bin')
+        st_path = os.path.join(model_dir, 'model.safetensors')
+        if os.path.exists(bin_path):
+            if not os.path.exists(st_path):
+                _convert_bin_to_safetensors(bin_path, st_path)
+            os.remove(bin_path)
+
+        return self.register(model_id, revision, 'safetensors')
+
+    def pull_deepface_weights(self, model_name='Emotion'):
+        """预下载 DeepFace 权重到仓库目录"""
+        os.environ['DEEPFACE_HOME'] = self.path('deepface')
+        os.makedirs(os.environ['DEEPFACE_HOME'], exist_ok=True)
+
+        from deepface import DeepFace
+        DeepFace.build_model(model_name)
+
+        return self.register('deepface', model_name, 'h5')
+
+    def register(self, model_id, version, fmt):
+        """扫描模型目录，计算校验和并写入清单"""
+        model_dir = self.path(model_id)
+
+        files = {}
+        for dirpath, _, filenames in os.walk(model_dir):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(file_path, model_dir)
+                if rel_path.startswith('.cache'):
+                    continue
+                files[rel_path] = {
+                    'size': os.path.getsize(file_path),
+                    'sha256': _sha256(file_path)
+                }
+
+        self.manifest['models'][model_id] = {
+            'version': version,
+            'format': fmt,
+            'files': files,
+            'added_at': datetime.now().isoformat()
+        }
+        self._save_manifest()
+
+        return self.manifest['models'][model_id]
+
+    def _load_manifest(self):
+        """加载清单"""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        return {'models': {}}
+
+    def _save_manifest(self):
+        """原子写入清单"""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def configure_offline(store):
+    """配置离线运行环境：禁用 Hub 访问，DeepFace 从仓库读取权重"""
+    if not store.manifest['models']:
+        return
+
+    # 启动时只做快速的大小校验
+    for item in store.list_models():
+        result = store.verify(item['id'])
+        if not result['ok']:
+            print(f"Model store warning: {item['id']}: {'; '.join(result['errors'])}")
+
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+    if store.has('deepface'):
+        os.environ.setdefault('DEEPFACE_HOME', store.path('deepface'))
+
+
+def load_safetensors_mmap(file_path):
+    """以写时复制方式内存映射 safetensors 文件，返回共享页面的张量字典"""
+    import torch
+
+    with open(file_path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info['dtype']])
+        begin, end = info['data_offsets']
+        count = (end - begin) // torch.tensor([], dtype=dtype).element_size()
+
+        if count == 0:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+        else:
+            tensors[name] = torch.frombuffer(
+                mm, dtype=dtype, count=count, offset=data_start + begin
+            ).reshape(info['shape'])
+
+    return tensors
+
+
+def attach_mmap_weights(model, file_path):
+    """用内存映射张量替换模型参数（多个工作进程共享同一物理页）"""
+    tensors = load_safetensors_mmap(file_path)
+    state_keys = set(model.state_dict().keys())
+
+    for name, tensor in tensors.items():
+        # 兼容带/不带基础模型前缀的权重命名
+        if name not in state_keys:
+            prefixed = f'{model.base_model_prefix}.{name}'
+            if prefixed not in state_keys:
+                continue
+            name = prefixed
+
+        module_name, _, attr = name.rpartition('.')
+        module = model.get_submodule(module_name)
+        current = getattr(module, attr)
+        if current.shape == tensor.shape and current.dtype == tensor.dtype:
+            current.data = tensor
+
+    return model
+
+
+def _convert_bin_to_safetensors(bin_path, st_path):
+    """将 PyTorch .bin 权重转换为 safetensors"""
+    import torch
+    from safetensors.torch import save_file
+
+    state_dict = torch.load(bin_path, map_location='cpu')
+    # safetensors 不允许共享存储，逐个复制为连续张量
+    state_dict = {k: v.contiguous().clone() for k, v in state_dict.items()}
+    save_file(state_dict, st_path, metadata={'format': 'pt'})
+
+
+def _sha256(file_path, chunk_size=1 << 20):
+    """计算文件 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,475 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from modules.session_store import MODALITY_COLUMNS
+
+
+# 阈值档位：某通道连续超过某档阈值的时段记为该档的一个"时刻"，最低档即进入索引的基准阈值。
+# 查询阈值 min 使用不高于它的最高一档的时段（时段边界的精度为档位间隔），再按峰值过滤
+DEFAULT_THRESHOLD_LEVELS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+THRESHOLD_LEVELS = {('voice', 'intensity'): (30.0, 40.0, 50.0, 60.0, 70.0, 80.0, 90.0)}  # 语音综合强度为 0-100
+DEFAULT_BASE_THRESHOLD = DEFAULT_THRESHOLD_LEVELS[0]
+
+# 相邻采样间隔超过该值（秒）时断开时段
+MAX_GAP = 2.0
+
+# 段文件中的列
+ROW_FIELDS = ['channel', 'level', 'session', 'start', 'end', 'peak', 'mean']
+ROW_DTYPES = {'channel': np.int16, 'level': np.int8, 'session': np.int32, 'start': np.float64, 'end': np.float64,
+              'peak': np.float32, 'mean': np.float32}
+
+
+class MomentIndex:
+    """情绪时刻区间索引
+
+    从会话各模态的列式序列中提取每个通道（情绪、微表情、语音强度等）在各阈值档位上的连续
+    时段，按 (模态, 通道, 档位) 分别保存为按起始时间排序的区间数组，并维护结束时间的前缀最大值：
+    时间范围查询只需两次二分查找定位候选区间，再对候选做向量化的阈值与会话过滤。
+    新增会话写成小的段文件（npz），段数过多时合并为一个；重新索引同一会话时旧记录作废，
+    合并时清除。服务进程与回填脚本可同时写同一目录：写盘在跨进程文件锁内进行，
+    写前若 index.json 已被其他进程更新则先重新加载，新记录在此时才分配会话与通道编号。
+    """
+
+    def __init__(self, root=None, max_segments=16):
+        self.root = root or os.environ.get('JPA_MOMENT_INDEX_DIR', os.path.join('data', 'moments'))
+        self.max_segments = max_segments
+        os.makedirs(self.root, exist_ok=True)
+
+        self._pending = []  # 尚未写入段文件的 (会话 ID, 案件 ID, {(模态, 通道): 时段})
+        self._lock = threading.Lock()
+
+        with self._lock, self._file_lock(exclusive=False):
+            self._load()
+
+    def add_session(self, session_id, series, case_id=None, flush=True):
+        """索引一个会话：series 为 {模态: (times, values)}，列顺序与 MODALITY_COLUMNS 一致，返回基准档的时刻数
+
+        批量建索引时可传 flush=False，之后调用 flush() 一次性合并并写盘（此前新记录不可查询）。
+        """
+        columns = {}
+        for modality, (times, values) in series.items():
+            times = np.asarray(times, dtype=np.float64)
+            values = np.asarray(values, dtype=np.float32)
+            if not len(times):
+                continue
+            for i, name in enumerate(MODALITY_COLUMNS[modality]):
+                if name == 'emotion_neutral':
+                    continue
+                levels = []
+                for threshold in _threshold_levels(modality, name):
+                    runs = _extract_runs(times, values[:, i], threshold)
+                    if runs is None:
+                        break  # 更高档位的时段是当前档位的子集
+                    levels.append(runs)
+                if levels:
+                    columns[(modality, name)] = levels
+
+        with self._lock:
+            self._pending.append((session_id, case_id, columns))
+
+        if flush:
+            self.flush()
+        return sum(len(levels[0][0]) for levels in columns.values())
+
+    def flush(self):
+        """将新增记录并入查询数组并写成段文件，段数超过上限时合并"""
+        with self._lock, self._file_lock(exclusive=True):
+            # 其他进程写过索引时先加载其结果，再在最新状态上分配编号，避免编号冲突与段文件丢失
+            if self._changed_on_disk():
+                self._load()
+
+            if self._pending:
+                rows = [
+                    _rows({self._channel_code(*key): runs for key, runs in columns.items()},
+                          self._register_session(session_id, case_id))
+                    for session_id, case_id, columns in self._pending
+                ]
+                rows = {field: np.concatenate([r[field] for r in rows]) for field in ROW_FIELDS}
+                self._pending = []
+                self._insert(rows)
+                name = f"segment-{int(time.time() * 1000)}-{len(self.segments)}.npz"
+                _write_segment(os.path.join(self.root, name), rows)
+                self.segments.append(name)
+
+            if len(self.segments) > self.max_segments:
+                self._compact()
+            self._save_meta()
+
+    def refresh(self):
+        """其他进程（如回填脚本）更新过索引时重新加载"""
+        if not self._changed_on_disk():
+            return
+        with self._lock, self._file_lock(exclusive=False):
+            if self._changed_on_disk():
+                self._load()
+
+    def query(self, modality, channel, min_value=None, start=None, end=None, sessions=None, case_id=None,
+              limit=None):
+        """查询某通道与 [start, end] 有交集、峰值不低于 min_value 的时刻，按开始时间排序
+
+        min_value 低于通道基准阈值时抛出 ValueError（低于基准阈值的时段未进入索引）。
+        """
+        self.refresh()
+        arrays, alive = self._snapshot(modality, channel, min_value)
+        if arrays is None:
+            return []
+
+        index = self._select(arrays, alive, min_value, start, end, self._session_filter(sessions, case_id))
+        if limit is not None:
+            index = index[:limit]
+        return self._moments(arrays, index, modality, channel)
+
+    def overlap(self, left, right, start=None, end=None, sessions=None, case_id=None, limit=None):
+        """同一会话中两个条件的时刻在时间上重叠的部分
+
+        left / right 为 {'modality', 'channel', 'min'}，返回重叠区间及两侧时刻。两侧时段取 min 所在
+        档位的时段，重叠区间是两侧都超过该档阈值的部分，而不是基准阈值下的整段。
+        """
+        self.refresh()
+        session_filter = self._session_filter(sessions, case_id)
+        # 会话有效性数组只会变长，取后一次快照即可覆盖两侧
+        left_arrays, _ = self._snapshot(left['modality'], left['channel'], left.get('min'))
+        right_arrays, alive = self._snapshot(right['modality'], right['channel'], right.get('min'))
+        if left_arrays is None or right_arrays is None:
+            return []
+
+        left_index = self._select(left_arrays, alive, left.get('min'), start, end, session_filter)
+        right_index = self._select(right_arrays, alive, right.get('min'), start, end, session_filter)
+        if not len(left_index) or not len(right_index):
+            return []
+
+        # 两侧分别按会话分组（组内保持起始时间顺序），逐会话向量化求重叠对
+        left_index, left_groups = _group_by_session(left_arrays, left_index)
+        right_index, right_groups = _group_by_session(right_arrays, right_index)
+        right_start = right_arrays['start'][right_index]
+        right_end = right_arrays['end'][right_index]
+
+        pairs_left, pairs_right = [], []
+        for session, (left_lo, left_hi) in left_groups.items():
+            if session not in right_groups:
+                continue
+            lo, hi = right_groups[session]
+            max_end = np.maximum.accumulate(right_end[lo:hi])
+
+            candidates = left_index[left_lo:left_hi]
+            a_start = left_arrays['start'][candidates]
+            a_end = left_arrays['end'][candidates]
+            # 右侧候选为 [first, last)：结束时间前缀最大值 >= 左起点，且起点 <= 左终点
+            first = lo + np.searchsorted(max_end, a_start, side='left')
+            last = lo + np.searchsorted(right_start[lo:hi], a_end, side='right')
+            counts = np.maximum(last - first, 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+
+            owner = np.repeat(np.arange(len(candidates)), counts)
+            j = np.repeat(first, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            keep = right_end[j] >= a_start[owner]
+            pairs_left.append(candidates[owner[keep]])
+            pairs_right.append(j[keep])
+
+        if not pairs_left:
+            return []
+        pairs_left = np.concatenate(pairs_left)
+        pairs_right = right_index[np.concatenate(pairs_right)]
+
+        overlap_start = np.maximum(left_arrays['start'][pairs_left], right_arrays['start'][pairs_right])
+        overlap_end = np.minimum(left_arrays['end'][pairs_left], right_arrays['end'][pairs_right])
+        order = np.argsort(overlap_start, kind='stable')[:limit]
+
+        left_moments = self._moments(left_arrays, pairs_left[order], left['modality'], left['channel'])
+        right_moments = self._moments(right_arrays, pairs_right[order], right['modality'], right['channel'])
+        return [
+            {
+                'session_id': left_moment['session_id'],
+                'case_id': left_moment['case_id'],
+                'start': start_value,
+                'end': end_value,
+                'left': left_moment,
+                'right': right_moment
+            }
+            for left_moment, right_moment, start_value, end_value in zip(
+                left_moments, right_moments, overlap_start[order].tolist(), overlap_end[order].tolist())
+        ]
+
+    def stats(self):
+        """索引规模"""
+        self.refresh()
+        with self._lock:
+            return {
+                'sessions': int(self._alive.sum()),
+                'moments': int(sum(len(a['start']) for (_, level), a in self._arrays.items() if level == 0)),
+                'channels': [f'{modality}.{channel}' for modality, channel in self.channels],
+                'segments': len(self.segments),
+                'pending': sum(len(levels[0][0]) for _, _, columns in self._pending for levels in columns.values())
+            }
+
+    def _select(self, arrays, alive, min_value, start, end, session_filter):
+        """时间范围二分定位候选，再按峰值、会话有效性与会话过滤"""
+        lo = 0 if start is None else int(np.searchsorted(arrays['max_end'], start, side='left'))
+        hi = len(arrays['start']) if end is None else int(np.searchsorted(arrays['start'], end, side='right'))
+        if hi <= lo:
+            return np.zeros(0, dtype=np.int64)
+
+        index = np.arange(lo, hi)
+        mask = alive[arrays['session'][lo:hi]]
+        if start is not None:
+            mask &= arrays['end'][lo:hi] >= start
+        if min_value is not None:
+            mask &= arrays['peak'][lo:hi] >= min_value
+        if session_filter is not None:
+            mask &= np.isin(arrays['session'][lo:hi], session_filter)
+        return index[mask]
+
+    def _session_filter(self, sessions, case_id):
+        """会话 ID 列表 / 案件 ID -> 会话编号数组（None 表示不过滤）"""
+        if sessions is None and case_id is None:
+            return None
+        with self._lock:
+            codes = [code for code, info in enumerate(self.sessions)
+                     if info['alive'] and (sessions is None or info['id'] in sessions)
+                     and (case_id is None or info['case_id'] == case_id)]
+        return np.array(codes, dtype=np.int32)
+
+    def _snapshot(self, modality, channel, min_value=None):
+        """取通道在 min_value 所在档位的数组与会话有效性（数组只整体替换，不原地修改，读取时无需持锁）"""
+        levels = _threshold_levels(modality, channel)
+        if min_value is not None and min_value < levels[0]:
+            raise ValueError(f'{modality}.{channel} 的 min 不能低于基准阈值 {levels[0]}')
+        level = 0 if min_value is None else bisect.bisect_right(levels, min_value) - 1
+
+        with self._lock:
+            code = self.channel_codes.get((modality, channel))
+            if code is None:
+                code = self.channel_codes.get((modality, f'emotion_{channel}'))
+            if code is None or (code, level) not in self._arrays:
+                return None, None
+            return self._arrays[(code, level)], self._alive
+
+    def _moments(self, arrays, index, modality, channel):
+        """区间下标 -> 时刻字典列表"""
+        fields = {field: arrays[field][index].tolist() for field in ('session', 'start', 'end', 'peak', 'mean')}
+        moments = []
+        for session, start, end, peak, mean in zip(*fields.values()):
+            info = self.sessions[session]
+            moments.append({
+                'session_id': info['id'],
+                'case_id': info['case_id'],
+                'modality': modality,
+                'channel': channel,
+                'start': start,
+                'end': end,
+                'peak': peak,
+                'mean': mean
+            })
+        return moments
+
+    def _register_session(self, session_id, case_id):
+        """登记会话编号；已索引过的会话旧记录作废"""
+        previous = self.session_codes.get(session_id)
+        if previous is not None:
+            self.sessions[previous]['alive'] = False
+            if case_id is None:
+                case_id = self.sessions[previous]['case_id']
+
+        code = len(self.sessions)
+        self.sessions.append({'id': session_id, 'case_id': case_id, 'alive': True})
+        self.session_codes[session_id] = code
+        self._alive = np.array([info['alive'] for info in self.sessions], dtype=bool)
+        return code
+
+    def _channel_code(self, modality, channel):
+        key = (modality, channel)
+        if key not in self.channel_codes:
+            self.channel_codes[key] = len(self.channels)
+            self.channels.append(key)
+        return self.channel_codes[key]
+
+    def _insert(self, rows):
+        """将新记录按起始时间插入各 (通道, 档位) 数组（替换为新数组）"""
+        keys = np.unique(np.stack([rows['channel'], rows['level']], axis=1), axis=0).tolist()
+        for code, level in keys:
+            selected = (rows['channel'] == code) & (rows['level'] == level)
+            order = np.argsort(rows['start'][selected], kind='stable')
+            new = {field: rows[field][selected][order] for field in ('session', 'start', 'end', 'peak', 'mean')}
+
+            current = self._arrays.get((code, level))
+            if current is None:
+                merged = new
+            else:
+                positions = np.searchsorted(current['start'], new['start'], side='right')
+                merged = {field: np.insert(current[field], positions, new[field]) for field in new}
+            merged['max_end'] = np.maximum.accumulate(merged['end'])
+            self._arrays[(code, level)] = merged
+
+    def _compact(self):
+        """合并所有段文件为一个，并清除作废会话的记录"""
+        rows = {field: [] for field in ROW_FIELDS}
+        for (code, level), arrays in self._arrays.items():
+            keep = self._alive[arrays['session']]
+            rows['channel'].append(np.full(int(keep.sum()), code, dtype=np.int16))
+            rows['level'].append(np.full(int(keep.sum()), level, dtype=np.int8))
+            for field in ROW_FIELDS[2:]:
+                rows[field].append(arrays[field][keep])
+        rows = {field: np.concatenate(values) if values else np.zeros(0, dtype=ROW_DTYPES[field])
+                for field, values in rows.items()}
+
+        name = f"segment-{int(time.time() * 1000)}-compact.npz"
+        _write_segment(os.path.join(self.root, name), rows)
+        old_segments = self.segments
+        self.segments = [name]
+        self._save_meta()
+        for old in old_segments:
+            try:
+                os.remove(os.path.join(self.root, old))
+            except OSError:
+                pass
+
+        self._arrays = {}
+        self._insert(rows)
+
+    @contextmanager
+    def _file_lock(self, exclusive):
+        """跨进程文件锁：写盘独占，加载共享（无 fcntl 的平台上不加锁）"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, 'index.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _meta_signature(self):
+        """index.json 的 (inode, 修改时间)：每次写入都替换文件，二者之一必然变化"""
+        try:
+            stat = os.stat(os.path.join(self.root, 'index.json'))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _changed_on_disk(self):
+        return self._meta_signature() != self._signature
+
+    def _save_meta(self):
+        path = os.path.join(self.root, 'index.json')
+        meta = {'sessions': self.sessions, 'channels': self.channels, 'segments': self.segments}
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        self._signature = self._meta_signature()
+
+    def _load(self):
+        """从 index.json 与段文件重建全部状态（调用方持有文件锁）"""
+        self.sessions = []  # 会话编号 -> {'id', 'case_id', 'alive'}
+        self.session_codes = {}  # 会话 ID -> 当前编号
+        self.channels = []  # 通道编号 -> (模态, 通道)
+        self.channel_codes = {}
+        self.segments = []  # 段文件名
+        self._alive = np.zeros(0, dtype=bool)
+        self._arrays = {}  # (通道编号, 档位) -> 按起始时间排序的区间数组
+        self._signature = self._meta_signature()
+
+        path = os.path.join(self.root, 'index.json')
+        if self._signature is None:
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Moment index load error: {e}")
+            return
+
+        self.sessions = meta['sessions']
+        self.session_codes = {info['id']: code for code, info in enumerate(self.sessions) if info['alive']}
+        self.channels = [tuple(channel) for channel in meta['channels']]
+        self.channel_codes = {channel: code for code, channel in enumerate(self.channels)}
+        self.segments = meta['segments']
+        self._alive = np.array([info['alive'] for info in self.sessions], dtype=bool)
+
+        for name in self.segments:
+            with np.load(os.path.join(self.root, name)) as segment:
+                rows = {field: segment[field] for field in ROW_FIELDS if field in segment.files}
+                # 早期段文件只有基准档（需重新索引才能按更高档位查询重叠区间）
+                rows.setdefault('level', np.zeros(len(rows['channel']), dtype=np.int8))
+                self._insert(rows)
+
+
+def _threshold_levels(modality, channel):
+    return THRESHOLD_LEVELS.get((modality, channel), DEFAULT_THRESHOLD_LEVELS)
+
+
+def _extract_runs(times, values, threshold):
+    """连续超过阈值的时段 -> (起始, 结束, 峰值, 均值)，无时段时返回 None
+
+    每个采样代表到下一采样为止的时段（最长 MAX_GAP 秒），间隔超过 MAX_GAP 时断开。
+    """
+    mask = np.nan_to_num(values, nan=-np.inf) >= threshold
+    if not mask.any():
+        return None
+
+    gaps = np.diff(times)
+    run_starts = mask & (~np.concatenate([[False], mask[:-1]]) | np.concatenate([[True], gaps > MAX_GAP]))
+    run_ids = np.cumsum(run_starts)
+
+    index = np.flatnonzero(mask)
+    ids = run_ids[index]
+    boundaries = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+    first = index[boundaries]
+    last = index[np.append(boundaries[1:], len(index)) - 1]
+
+    selected = values[index]
+    peak = np.maximum.reduceat(selected, boundaries)
+    counts = np.diff(np.append(boundaries, len(index)))
+    mean = np.add.reduceat(selected, boundaries) / counts
+
+    hold = np.minimum(np.append(gaps, 0.0), MAX_GAP)
+    return times[first], times[last] + hold[last], peak, mean
+
+
+def _group_by_session(arrays, index):
+    """按会话稳定排序下标，返回 (排序后下标, {会话编号: (lo, hi)})"""
+    sessions = arrays['session'][index]
+    order = np.argsort(sessions, kind='stable')
+    index = index[order]
+    unique, bounds = np.unique(sessions[order], return_index=True)
+    ends = np.append(bounds[1:], len(index))
+    return index, {session: (int(lo), int(hi)) for session, lo, hi in zip(unique.tolist(), bounds, ends)}
+
+
+def _rows(columns, session_code):
+    """{通道编号: [各档位的 (起始, 结束, 峰值, 均值)]} -> 段记录"""
+    if not columns:
+        return {field: np.zeros(0, dtype=ROW_DTYPES[field]) for field in ROW_FIELDS}
+
+    rows = {field: [] for field in ROW_FIELDS}
+    for code, levels in columns.items():
+        for level, (starts, ends, peaks, means) in enumerate(levels):
+            rows['channel'].append(np.full(len(starts), code))
+            rows['level'].append(np.full(len(starts), level))
+            rows['session'].append(np.full(len(starts), session_code))
+            rows['start'].append(starts)
+            rows['end'].append(ends)
+            rows['peak'].append(peaks)
+            rows['mean'].append(means)
+    return {field: np.concatenate(values).astype(ROW_DTYPES[field]) for field, values in rows.items()}
+
+
+def _write_segment(path, rows):
+    """写段文件（先写临时文件再替换）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **rows)
+    os.replace(tmp_path, path)
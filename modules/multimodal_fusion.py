@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+from datetime import datetime
+
+from modules.psychological_evaluator import MultimodalBatch
+
+
+class MultimodalFusion:
+    """会话历史的时间对齐融合：各模态重采样到统一时间网格"""
+
+    def __init__(self, emotion_labels, intensity_weights, step=0.1, max_gap=1.0, max_points=None):
+        self.emotion_labels = list(emotion_labels)
+        self.intensity_weights = intensity_weights
+        self.step = step  # 时间网格间隔（秒）
+        self.max_gap = max_gap  # 超过该间隔未更新的观测视为缺失
+        # 网格点数与窗口数上限（防止过小的 step / window 在 Web 进程中分配超大数组）
+        self.max_points = max_points or int(os.environ.get('JPA_FUSION_MAX_POINTS', 500000))
+
+        # 融合矩阵的特征列
+        self.voice_features = ['voice_intensity', 'voice_pitch_intensity', 'voice_speed_intensity']
+        self.feature_names = [f'face_{e}' for e in self.emotion_labels] + ['face_intensity'] + self.voice_features
+
+    def fuse_session(self, session, step=None):
+        """将会话的面部/语音列式序列对齐为 (T, features) 矩阵"""
+        step = self.step if step is None else step
+        if not np.isfinite(step) or step <= 0:
+            raise ValueError('step 必须为正数')
+
+        face_times, face_values = self._face_arrays(session.face)
+        voice_times, voice_values = self._voice_arrays(session.voice)
+
+        observed = [t for t in (face_times, voice_times) if len(t)]
+        if not observed:
+            return {'times': np.zeros(0), 'features': self.feature_names,
+                    'matrix': np.zeros((0, len(self.feature_names)))}
+
+        start = min(t[0] for t in observed)
+        end = max(t[-1] for t in observed)
+        points = int(np.floor((end - start) / step)) + 1
+        if points > self.max_points:
+            raise ValueError(f'网格点数 {points} 超过上限 {self.max_points}，请增大 step')
+        grid = start + np.arange(int(np.floor((end - start) / step)) + 1) * step
+
+        matrix = np.hstack([
+            self._resample(face_times, face_values, grid),
+            self._resample(voice_times, voice_values, grid)
+        ])
+
+        return {'times': grid, 'features': self.feature_names, 'matrix': matrix}
+
+    def evaluate_windows(self, fused, window, psych_evaluator, risk_assessor):
+        """按时间窗口计算雷达图与风险（窗口均值由一次分组求和得出）"""
+        if not np.isfinite(window) or window <= 0:
+            raise ValueError('window 必须为正数')
+
+        times = fused['times']
+        matrix = fused['matrix']
+        if not len(times):
+            return []
+        if (times[-1] - times[0]) // window + 1 > self.max_points:
+            raise ValueError(f'窗口数超过上限 {self.max_points}，请增大 window')
+
+        # 每个网格点所属窗口
+        window_ids = ((times - times[0]) // window).astype(int)
+        n_windows = window_ids[-1] + 1
+
+        present = ~np.isnan(matrix)
+        values = np.where(present, matrix, 0.0)
+        sums = np.zeros((n_windows, matrix.shape[1]))
+        counts = np.zeros((n_windows, matrix.shape[1]))
+        np.add.at(sums, window_ids, values)
+        np.add.at(counts, window_ids, present)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+
+        batch = self._to_batch(means, counts > 0)
+        radar = psych_evaluator.radar_records(psych_evaluator.build_psychological_radar_batch(batch))
+        risks = risk_assessor.identify_psychological_risks_batch(batch)['risks']
+
+        return [
+            {
+                'start': datetime.fromtimestamp(times[0] + w * window).isoformat(),
+                'end': datetime.fromtimestamp(times[0] + (w + 1) * window).isoformat(),
+                'radar_chart': radar[w],
+                'psychological_risks': risks[w]
+            }
+            for w in range(n_windows)
+        ]
+
+    def _to_batch(self, means, mask):
+        """将窗口均值组装为 MultimodalBatch"""
+        n = len(means)
+        n_emotions = len(self.emotion_labels)
+        col = {name: i for i, name in enumerate(self.feature_names)}
+
+        profile_mask = mask[:, :n_emotions]
+        profile = np.where(profile_mask, means[:, :n_emotions], 0.0)
+
+        def feature(name):
+            return np.where(mask[:, col[name]], means[:, col[name]], 0.0)
+
+        overall_intensity = feature('face_intensity') * 0.3 + feature('voice_intensity') * 0.3
+        has_voice = mask[:, col['voice_intensity']]
+
+        behavioral_indicators = [
+            {
+                'voice_pitch': {'intensity': feature('voice_pitch_intensity')[i]},
+                'voice_speed': {'intensity': feature('voice_speed_intensity')[i]}
+            } if has_voice[i] else {}
+            for i in range(n)
+        ]
+
+        return MultimodalBatch(
+            [f'face_{e}' for e in self.emotion_labels], profile, profile_mask, overall_intensity,
+            feature('voice_pitch_intensity'), feature('voice_speed_intensity'),
+            np.zeros(n), np.zeros(n, dtype=int), np.zeros(n), np.zeros(n, dtype=bool),
+            behavioral_indicators
+        )
+
+    def _resample(self, times, values, grid):
+        """保持最近观测值重采样：二分查找每个网格点之前的最近观测，O((T + n) log n)"""
+        out = np.full((len(grid), values.shape[1]), np.nan)
+        if not len(times):
+            return out
+
+        idx = np.searchsorted(times, grid, side='right') - 1
+        valid = idx >= 0
+        valid[valid] &= (grid[valid] - times[idx[valid]]) <= self.max_gap
+
+        out[valid] = values[idx[valid]]
+        return out
+
+    def _face_arrays(self, series):
+        """面部列式序列 -> (时间, 情绪矩阵 + 强度)"""
+        weights = np.array([self.intensity_weights.get(e, 0.0) for e in self.emotion_labels])
+
+        emotions = np.column_stack([
+            series.column(f'emotion_{e}') for e in self.emotion_labels
+        ]).astype(np.float64) if len(series) else np.zeros((0, len(self.emotion_labels)))
+
+        # 与 FaceEmotionAnalyzer.calculate_intensity 一致（缺失情绪按 0 计）
+        intensity = np.minimum(100, np.nan_to_num(emotions) @ weights * 100)
+
+        return _sorted(series.times, np.column_stack([emotions, intensity]))
+
+    def _voice_arrays(self, series):
+        """语音列式序列 -> (时间, 强度特征)"""
+        columns = ['intensity', 'pitch_intensity', 'speed_intensity']
+        values = np.column_stack([
+            series.column(name) for name in columns
+        ]).astype(np.float64) if len(series) else np.zeros((0, len(columns)))
+
+        return _sorted(series.times, values)
+
+
+def _sorted(times, values):
+    """按时间排序（会话记录通常已有序，稳定排序代价很低）"""
+    order = np.argsort(times, kind='stable')
+    return times[order], values[order]
@@ -0,0 +1,117 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.metrics import metrics
+
+
+# 各模态默认并发上限（面部与语音在本进程内共用一个分析器实例，默认不并发调用；
+# 文本模型调用由 TextEmotionAnalyzer 的微批处理器合并与串行，并发上限不低于一批的条目数，
+# 否则同时到达批处理器的请求不足一批，跨请求合并失效）
+DEFAULT_LIMITS = {'face': 1, 'voice': 1, 'text': int(os.environ.get('JPA_TEXT_BATCH_SIZE', 16)), 'analysis': 2}
+
+
+class ExecutorSaturated(RuntimeError):
+    """模态等待队列已满"""
+
+
+class NativeExecutor:
+    """阻塞型原生推理调用的有界执行器
+
+    TensorFlow / torch / librosa 等调用在原生代码中阻塞且不让出 eventlet 事件循环，
+    直接在绿色线程中调用会使所有连接（包括 ping/pong）停顿。本执行器将调用交给真实
+    OS 线程执行：eventlet 模式下经 tpool 执行并以绿色信号量限制各模态并发，
+    绿色线程在等待期间让出；线程模式下使用每模态独立的线程池。
+    """
+
+    def __init__(self, green=False, limits=None, max_waiting=None, task_wrapper=None, thread_setup=None):
+        self.green = green
+        # 默认值 <- 调用方按部署给出的上限（如工作进程数） <- JPA_NATIVE_THREADS
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.limits.update(_parse_limits(os.environ.get('JPA_NATIVE_THREADS', '')))
+        self.max_waiting = max_waiting or int(os.environ.get('JPA_NATIVE_MAX_WAITING', 32))
+        self.task_wrapper = task_wrapper  # 在执行线程中包裹任务（如剖析器）
+        self.thread_setup = thread_setup  # 执行前按模态设置线程（如绑定核心）
+
+        self.waiting = {modality: 0 for modality in self.limits}
+        self.running = {modality: 0 for modality in self.limits}
+        self.rejected = {modality: 0 for modality in self.limits}
+        self._lock = threading.Lock()
+
+        if green:
+            from eventlet import tpool
+            from eventlet.semaphore import Semaphore
+
+            # tpool 线程数需在首次使用前设置，保证每个模态的并发都能拿到线程
+            tpool.set_num_threads(max(int(os.environ.get('EVENTLET_THREADPOOL_SIZE', 20)),
+                                      sum(self.limits.values())))
+            self._tpool = tpool
+            self._semaphores = {modality: Semaphore(limit) for modality, limit in self.limits.items()}
+        else:
+            self._executors = {
+                modality: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f'native-{modality}')
+                for modality, limit in self.limits.items()
+            }
+
+    def run(self, modality, fn, *args, **kwargs):
+        """在原生线程中执行 fn 并等待结果（调用方所在绿色线程/线程在等待期间让出）"""
+        with self._lock:
+            if self.waiting[modality] >= self.max_waiting:
+                self.rejected[modality] += 1
+                raise ExecutorSaturated(f'{modality} 推理队列已满')
+            self.waiting[modality] += 1
+
+        submitted = time.perf_counter()
+        context = contextvars.copy_context()  # 保留请求上下文（如剖析令牌）
+
+        if self.green:
+            with self._semaphores[modality]:
+                return self._tpool.execute(context.run, self._execute, modality, submitted, fn, args, kwargs)
+
+        future = self._executors[modality].submit(context.run, self._execute, modality, submitted, fn, args, kwargs)
+        return future.result()
+
+    def snapshot(self):
+        """各模态并发上限、运行中与排队数量"""
+        with self._lock:
+            return {
+                modality: {
+                    'limit': limit,
+                    'running': self.running[modality],
+                    'waiting': self.waiting[modality],
+                    'rejected': self.rejected[modality]
+                }
+                for modality, limit in self.limits.items()
+            }
+
+    def _execute(self, modality, submitted, fn, args, kwargs):
+        """在执行线程中运行任务，记录排队与执行耗时"""
+        started = time.perf_counter()
+        metrics.observe('queue', modality, started - submitted)
+        with self._lock:
+            self.waiting[modality] -= 1
+            self.running[modality] += 1
+
+        try:
+            if self.thread_setup is not None:
+                self.thread_setup(modality)
+            if self.task_wrapper is not None:
+                return self.task_wrapper(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running[modality] -= 1
+            metrics.observe('execute', modality, time.perf_counter() - started)
+
+
+def _parse_limits(spec):
+    """'face=2,voice=1' -> {'face': 2, 'voice': 1}"""
+    limits = {}
+    for part in spec.split(','):
+        if '=' in part:
+            modality, limit = part.split('=', 1)
+            limits[modality.strip()] = max(1, int(limit))
+    return limits
@@ -0,0 +1,305 @@
+import contextvars
+import cProfile
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+PROFILE_MODES = ['cprofile', 'sampling']
+
+# 当前请求/事件的剖析令牌（随上下文传递到执行器线程）
+_current_token = contextvars.ContextVar('profile_token', default=None)
+
+
+class ProfileCapture:
+    """一次剖析采集：匹配接口名/事件名和/或会话 ID，采集接下来 count 次调用"""
+
+    def __init__(self, capture_id, mode, count, target=None, session_id=None):
+        self.id = capture_id
+        self.mode = mode
+        self.target = target
+        self.session_id = session_id
+        self.count = count
+        self.remaining = count
+        self.in_flight = 0
+        self.status = 'active'
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.wall_time = 0.0
+
+        self.stats = None  # cprofile: 累积的 pstats.Stats
+        self.samples = Counter()  # sampling: 折叠栈 -> 采样次数
+
+    def matches(self, target, session_id):
+        if self.target is not None and self.target != target:
+            return False
+        if self.session_id is not None and self.session_id != session_id:
+            return False
+        return True
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'mode': self.mode,
+            'target': self.target,
+            'session_id': self.session_id,
+            'count': self.count,
+            'captured': self.count - self.remaining,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'wall_time_s': self.wall_time
+        }
+
+
+class ProfilerManager:
+    """按需剖析：仅在存在待采集任务时介入请求/事件，关闭时调用方只做一次字典判空
+
+    cprofile 模式输出 .prof（可用 snakeviz / flameprof 生成火焰图），
+    sampling 模式定时抓取工作线程调用栈，输出 Brendan Gregg 折叠栈格式 .folded
+    （可直接用于 flamegraph.pl / speedscope）。
+    """
+
+    def __init__(self, root=None, interval_ms=None):
+        self.root = root or os.environ.get('JPA_PROFILE_DIR', 'profiles')
+        self.interval = float(interval_ms or os.environ.get('JPA_PROFILE_INTERVAL_MS', 5)) / 1000.0
+        os.makedirs(self.root, exist_ok=True)
+
+        self.active = {}  # capture_id -> ProfileCapture，为空时剖析完全关闭
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+        # 采样模式：线程 ID -> 正在采集的 capture（eventlet 绿色线程共享同一线程 ID，按最先登记者归属）
+        self._sampled_threads = {}
+        self._sampler = None
+
+    def start(self, mode='cprofile', count=10, target=None, session_id=None):
+        """登记一次采集，返回采集信息"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'不支持的剖析模式: {mode}')
+        if target is None and session_id is None:
+            raise ValueError('需指定 target 或 session_id')
+
+        with self._lock:
+            capture_id = f"PROFILE_{datetime.now().strftime('%Y%m%d%H%M%S')}_{next(self._ids)}"
+            capture = ProfileCapture(capture_id, mode, max(1, int(count)), target, session_id)
+            self.active[capture_id] = capture
+            if mode == 'sampling':
+                self._ensure_sampler()
+            return capture.to_dict()
+
+    def stop(self, capture_id):
+        """提前结束采集并写出已有结果，返回采集信息"""
+        with self._lock:
+            capture = self.active.pop(capture_id, None)
+        if capture is None:
+            return None
+        self._finish(capture)
+        return capture.to_dict()
+
+    def begin(self, target, session_id=None):
+        """请求/事件开始时调用，返回令牌（无匹配采集时返回 None）"""
+        if not self.active:
+            return None
+
+        with self._lock:
+            capture = next((c for c in self.active.values()
+                            if c.remaining - c.in_flight > 0 and c.matches(target, session_id)), None)
+            if capture is None:
+                return None
+            capture.in_flight += 1
+
+        token = {'capture': capture, 'start': time.perf_counter(), 'profile': None,
+                 'thread': threading.get_ident(), 'context': None}
+
+        if capture.mode == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 同一时刻仅允许一个 cProfile 实例（并发请求时跳过本次）
+                with self._lock:
+                    capture.in_flight -= 1
+                return None
+            token['profile'] = profile
+        else:
+            with self._lock:
+                self._sampled_threads.setdefault(token['thread'], capture)
+
+        token['context'] = _current_token.set(token)
+        return token
+
+    def end(self, token):
+        """请求/事件结束时调用"""
+        if token is None:
+            return
+
+        capture = token['capture']
+        profile = token['profile']
+        if profile is not None:
+            profile.disable()
+
+        try:
+            _current_token.reset(token['context'])
+        except ValueError:
+            # 在其他上下文中结束时无需还原
+            pass
+
+        finished = False
+        with self._lock:
+            capture.in_flight -= 1
+            capture.remaining -= 1
+            capture.wall_time += time.perf_counter() - token['start']
+            if profile is not None:
+                if capture.stats is None:
+                    capture.stats = pstats.Stats(profile)
+                else:
+                    capture.stats.add(profile)
+            elif self._sampled_threads.get(token['thread']) is capture:
+                del self._sampled_threads[token['thread']]
+
+            if capture.remaining <= 0 and capture.id in self.active:
+                del self.active[capture.id]
+                finished = True
+
+        if finished:
+            self._finish(capture)
+
+    def run_attached(self, fn, *args, **kwargs):
+        """在执行器线程中运行属于当前剖析请求的任务，结果并入同一采集"""
+        token = _current_token.get()
+        if token is None:
+            return fn(*args, **kwargs)
+
+        capture = token['capture']
+        if capture.mode == 'sampling':
+            ident = threading.get_ident()
+            with self._lock:
+                self._sampled_threads.setdefault(ident, capture)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    if self._sampled_threads.get(ident) is capture:
+                        del self._sampled_threads[ident]
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                if capture.stats is None:
+                    capture.stats = pstats.Stats(profile)
+                else:
+                    capture.stats.add(profile)
+
+    def list_captures(self):
+        """列出进行中与已完成的采集（已完成的从磁盘读取，重启后仍可见）"""
+        with self._lock:
+            captures = [capture.to_dict() for capture in self.active.values()]
+
+        for name in sorted(os.listdir(self.root), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, name), encoding='utf-8') as f:
+                    captures.append(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Profile index error ({name}): {e}")
+
+        return captures
+
+    def capture_file(self, capture_id):
+        """已完成采集的结果文件路径，不存在时返回 None"""
+        capture_id = os.path.basename(capture_id)
+        for suffix in ('.prof', '.folded'):
+            path = os.path.join(self.root, capture_id + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _finish(self, capture):
+        """写出采集结果与元数据"""
+        capture.status = 'done'
+        capture.finished_at = datetime.now().isoformat()
+        base = os.path.join(self.root, capture.id)
+
+        try:
+            info = capture.to_dict()
+            if capture.mode == 'cprofile' and capture.stats is not None:
+                capture.stats.dump_stats(base + '.prof')
+                info['file'] = capture.id + '.prof'
+                info['top'] = _top_functions(capture.stats)
+            elif capture.mode == 'sampling':
+                with open(base + '.folded', 'w', encoding='utf-8') as f:
+                    for stack, count in capture.samples.most_common():
+                        f.write(f'{stack} {count}\n')
+                info['file'] = capture.id + '.folded'
+                info['samples'] = sum(capture.samples.values())
+
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            capture.status = 'failed'
+            print(f"Profile write error: {e}")
+
+    def _ensure_sampler(self):
+        """按需启动采样线程（无采样任务时自行退出）"""
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+        self._sampler.start()
+
+    def _sample_loop(self):
+        """定时抓取被采集线程的调用栈"""
+        sampler_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                if not any(c.mode == 'sampling' for c in self.active.values()):
+                    self._sampler = None
+                    return
+                threads = dict(self._sampled_threads)
+
+            if threads:
+                frames = sys._current_frames()
+                for ident, capture in threads.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != sampler_ident:
+                        capture.samples[_fold_stack(frame)] += 1
+
+            time.sleep(self.interval)
+
+
+def _fold_stack(frame):
+    """调用栈 -> 'outer;...;inner' 折叠格式"""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+def _top_functions(stats, limit=20):
+    """按累计耗时排序的前若干函数"""
+    rows = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{name} ({os.path.basename(filename)}:{line})',
+            'calls': calls,
+            'total_s': total,
+            'cumulative_s': cumulative
+        })
+    rows.sort(key=lambda row: row['cumulative_s'], reverse=True)
+    return rows[:limit]
@@ -2,6 +2,84 @@ import numpy as np
 from sklearn.preprocessing import MinMaxScaler
 
 
+class MultimodalBatch:
+    """多会话列式数据（每个情绪/行为特征一列）"""
+
+    def __init__(self, profile_keys, profile, profile_mask, overall_intensity,
+                 voice_pitch_intensity, voice_speed_intensity, consistency, complexity,
+                 emotional_valence, has_text, behavioral_indicators, profile_order=None):
+        self.profile_keys = profile_keys  # 情绪列名，如 face_fear
+        self.profile = profile  # (N, K) float64
+        self.profile_mask = profile_mask  # (N, K) bool，该会话是否有此情绪
+        # (N, K) int，各会话情绪字典的键顺序（列下标，不足处为 -1）；缺省按列顺序
+        if profile_order is None:
+            profile_order = np.sort(np.where(profile_mask, np.arange(len(profile_keys)), len(profile_keys)), axis=1)
+            profile_order[profile_order == len(profile_keys)] = -1
+        self.profile_order = profile_order
+        self._profile_groups = None
+        self.overall_intensity = overall_intensity  # (N,)
+        self.voice_pitch_intensity = voice_pitch_intensity  # (N,)
+        self.voice_speed_intensity = voice_speed_intensity  # (N,)
+        self.consistency = consistency  # (N,)
+        self.complexity = complexity  # (N,)
+        self.emotional_valence = emotional_valence  # (N,)
+        self.has_text = has_text  # (N,) bool
+        self.behavioral_indicators = behavioral_indicators  # 原始行为指标，供逐条输出使用
+
+    def __len__(self):
+        return len(self.overall_intensity)
+
+    def column(self, key):
+        """获取情绪列（缺失时为 0）"""
+        if key in self.profile_keys:
+            return self.profile[:, self.profile_keys.index(key)]
+        return np.zeros(len(self))
+
+    def emotional_profile(self, index):
+        """还原单个会话的情绪字典"""
+        return {
+            self.profile_keys[k]: self.profile[index, k]
+            for k in self.profile_order[index]
+            if k >= 0
+        }
+
+    def profile_groups(self):
+        """按情绪字典的键序列将会话分组，返回 [(行下标, 列下标)]
+
+        同组会话的键及其顺序相同，按列下标取出的连续矩阵逐行归约，
+        与逐条对字典值调用 np.mean / np.var 的求和顺序一致，结果逐位相同。
+        """
+        if self._profile_groups is None:
+            orders, inverse = np.unique(self.profile_order, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            self._profile_groups = [
+                (np.flatnonzero(inverse == g), order[order >= 0])
+                for g, order in enumerate(orders)
+            ]
+        return self._profile_groups
+
+    def profile_values(self, rows, cols):
+        """取出一组会话的情绪值（C 连续，列按键顺序排列）"""
+        return np.ascontiguousarray(self.profile[np.ix_(rows, cols)])
+
+    def to_integrated(self, index):
+        """还原单个会话的整合数据（与 integrate_multimodal_data 输出一致）"""
+        cognitive_patterns = {}
+        if self.has_text[index]:
+            cognitive_patterns = {
+                'consistency': self.consistency[index],
+                'complexity': int(self.complexity[index]),
+                'emotional_valence': self.emotional_valence[index]
+            }
+
+        return {
+            'overall_intensity': self.overall_intensity[index],
+            'emotional_profile': self.emotional_profile(index),
+            'behavioral_indicators': self.behavioral_indicators[index],
+            'cognitive_patterns': cognitive_patterns
+        }
+
+
 class PsychologicalEvaluator:
     def __init__(self):
         self.scaler = MinMaxScaler()
@@ -64,6 +142,143 @@ class PsychologicalEvaluator:
 
         return integrated
 
+    def integrate_multimodal_batch(self, sessions):
+        """将多个会话的 (face_data, voice_data, text_data) 打包为列式数组"""
+        n = len(sessions)
+
+        # 情绪列按首次出现顺序排列，与逐条字典的遍历顺序一致
+        profile_keys = []
+        key_index = {}
+        for face_data, _, _ in sessions:
+            if face_data:
+                for emotion in face_data.get('data', {}).get('emotions', {}):
+                    key = f'face_{emotion}'
+                    if key not in key_index:
+                        key_index[key] = len(profile_keys)
+                        profile_keys.append(key)
+
+        profile = np.zeros((n, len(profile_keys)))
+        profile_mask = np.zeros((n, len(profile_keys)), dtype=bool)
+        profile_order = np.full((n, len(profile_keys)), -1)
+        face_intensity = np.zeros(n)
+        voice_intensity = np.zeros(n)
+        pitch_intensity = np.zeros(n)
+        speed_intensity = np.zeros(n)
+        text_vectors = np.zeros((n, 5))
+        text_lengths = np.zeros(n, dtype=int)
+        consistency = np.zeros(n)
+        complexity = np.zeros(n, dtype=int)
+        has_text = np.zeros(n, dtype=bool)
+        behavioral_indicators = []
+
+        for i, (face_data, voice_data, text_data) in enumerate(sessions):
+            behaviors = {}
+
+            if face_data:
+                face_intensity[i] = face_data.get('intensity', 0)
+                for j, (emotion, value) in enumerate(face_data.get('data', {}).get('emotions', {}).items()):
+                    k = key_index[f'face_{emotion}']
+                    profile[i, k] = value
+                    profile_mask[i, k] = True
+                    profile_order[i, j] = k
+
+            if voice_data:
+                voice_intensity[i] = voice_data.get('intensity', 0)
+                voice_metrics = voice_data.get('data', {})
+                behaviors['voice_pitch'] = voice_metrics.get('pitch', {})
+                behaviors['voice_volume'] = voice_metrics.get('volume', {})
+                behaviors['voice_speed'] = voice_metrics.get('speed', {})
+                pitch_intensity[i] = behaviors['voice_pitch'].get('intensity', 0)
+                speed_intensity[i] = behaviors['voice_speed'].get('intensity', 0)
+
+            if text_data:
+                vector = text_data.get('data', {}).get('emotion_vector', [])
+                semantic_analysis = text_data.get('data', {}).get('semantic_analysis', {})
+                if len(vector) > text_vectors.shape[1]:
+                    text_vectors = np.pad(text_vectors, ((0, 0), (0, len(vector) - text_vectors.shape[1])))
+                text_vectors[i, :len(vector)] = vector
+                text_lengths[i] = len(vector)
+                consistency[i] = semantic_analysis.get('consistency', 0)
+                complexity[i] = len(semantic_analysis.get('sentences', []))
+                has_text[i] = True
+
+            behavioral_indicators.append(behaviors)
+
+        # 整体强度（缺失模态贡献为 0；文本向量按长度分组求均值，与逐条 np.mean 一致）
+        text_intensity = np.zeros(n)
+        for length in np.unique(text_lengths[has_text]):
+            rows = np.flatnonzero(has_text & (text_lengths == length))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                text_intensity[rows] = np.mean(np.abs(np.ascontiguousarray(text_vectors[rows, :length])), axis=1)
+        overall_intensity = face_intensity * 0.3 + voice_intensity * 0.3
+        overall_intensity = np.where(has_text, overall_intensity + text_intensity * 40, overall_intensity)
+
+        emotional_valence = np.where(text_lengths > 0, text_vectors[:, 0], 0)
+
+        return MultimodalBatch(
+            profile_keys, profile, profile_mask, overall_intensity,
+            pitch_intensity, speed_intensity, consistency, complexity,
+            emotional_valence, has_text, behavioral_indicators, profile_order
+        )
+
+    def build_psychological_radar_batch(self, batch):
+        """批量构建心理状态雷达图，返回 {维度: (N,) 数组}"""
+        radar = {}
+
+        # 情绪稳定性（按每个会话实际存在的情绪、按其键顺序计算方差）
+        variance = np.zeros(len(batch))
+        for rows, cols in batch.profile_groups():
+            if len(cols):
+                variance[rows] = np.var(batch.profile_values(rows, cols), axis=1)
+        radar['emotional_stability'] = 1 - np.minimum(1, variance)
+
+        # 压力水平
+        radar['stress_level'] = self._mean_rows([batch.voice_pitch_intensity, batch.voice_speed_intensity])
+
+        # 焦虑水平
+        anxiety_emotions = ['fear', 'fearful', 'nervous']
+        radar['anxiety_level'] = self._mean_columns(batch, anxiety_emotions)
+
+        # 抑郁风险
+        depression_emotions = ['sad', 'sadness']
+        radar['depression_risk'] = self._mean_columns(batch, depression_emotions)
+
+        # 认知清晰度（无文本数据时取 0.5）
+        radar['cognitive_clarity'] = np.where(batch.has_text, batch.consistency, 0.5)
+
+        # 社会适应性
+        positive_emotions = ['happy', 'calm', 'neutral']
+        radar['social_adaptability'] = self._mean_columns(batch, positive_emotions)
+
+        # 自我控制
+        radar['self_control'] = 1 - radar['stress_level']
+
+        # 心理韧性
+        radar['resilience'] = (
+                radar['emotional_stability'] * 0.4 +
+                radar['cognitive_clarity'] * 0.3 +
+                (1 - radar['depression_risk']) * 0.3
+        )
+
+        # 归一化到0-100
+        for key in radar:
+            radar[key] = np.minimum(100, np.maximum(0, radar[key] * 100))
+
+        return radar
+
+    def radar_records(self, radar):
+        """将列式雷达数据拆分为逐会话字典列表"""
+        n = len(next(iter(radar.values())))
+        return [{key: radar[key][i] for key in radar} for i in range(n)]
+
+    def _mean_columns(self, batch, emotions):
+        """多个情绪列的平均值（缺失列视为 0）"""
+        return self._mean_rows([batch.column(f'face_{emotion}') for emotion in emotions])
+
+    def _mean_rows(self, columns):
+        """逐行求若干列的平均值（拼为 C 连续矩阵后归约，与逐条 np.mean 一致）"""
+        return np.mean(np.stack(columns, axis=1), axis=1)
+
     def build_psychological_radar(self, integrated_data):
         """构建心理状态雷达图"""
         radar_data = {}
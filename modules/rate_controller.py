@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+from modules.metrics import metrics
+
+
+# 可选的采集最大边长（像素），从低到高
+DEFAULT_DIMENSIONS = [320, 480, 640, 960, 1280]
+
+
+class RateController:
+    """实时采集的闭环速率控制
+
+    按连接统计每帧处理延迟（含排队）的指数滑动平均与推理排队深度，与当前帧间隔的
+    预算比较后给出建议帧率与最大边长：过载时乘性降低帧率，降到下限后再降分辨率；
+    有余量时先恢复到初始分辨率，再逐步提高帧率，帧率到上限后再提高分辨率。每次调整后
+    等待新的观测再做下一次决定。
+    """
+
+    def __init__(self, min_fps=None, max_fps=None, initial_fps=None, dimensions=None, initial_dimension=None,
+                 interval=None, queue_limit=None, headroom=0.8, alpha=0.3, min_samples=3):
+        self.min_fps = min_fps or float(os.environ.get('JPA_RATE_MIN_FPS', 1))
+        self.max_fps = max_fps or float(os.environ.get('JPA_RATE_MAX_FPS', 15))
+        self.initial_fps = initial_fps or float(os.environ.get('JPA_RATE_INITIAL_FPS', 5))
+        self.dimensions = sorted(dimensions or _parse_dimensions(os.environ.get('JPA_RATE_DIMENSIONS', '')))
+        initial_dimension = initial_dimension or int(os.environ.get('JPA_RATE_INITIAL_DIMENSION', 640))
+        self.initial_index = min(range(len(self.dimensions)),
+                                 key=lambda i: abs(self.dimensions[i] - initial_dimension))
+        self.interval = interval or float(os.environ.get('JPA_RATE_INTERVAL', 1.0))  # 两次调整的最小间隔（秒）
+        self.queue_limit = queue_limit if queue_limit is not None else int(os.environ.get('JPA_RATE_QUEUE_LIMIT', 2))
+        self.headroom = headroom  # 处理延迟占帧间隔的目标比例
+        self.alpha = alpha
+        self.min_samples = min_samples
+
+        self.clients = {}  # client_id -> 控制状态
+        self._lock = threading.Lock()
+
+    def open(self, client_id):
+        """登记连接并返回初始控制参数"""
+        with self._lock:
+            state = {
+                'fps': self.initial_fps,
+                'dimension_index': self.initial_index,
+                'latency': None,
+                'samples': 0,
+                'queue': 0,
+                'overloaded': False,
+                'changed_at': time.time()
+            }
+            self.clients[client_id] = state
+            return self._control(state)
+
+    def close(self, client_id):
+        with self._lock:
+            self.clients.pop(client_id, None)
+
+    def observe(self, client_id, latency, queue_depth=0):
+        """记录一帧的处理耗时与当前排队深度，需要调整时返回新的控制参数"""
+        with self._lock:
+            state = self.clients.get(client_id)
+            if state is None:
+                return None
+            state['latency'] = latency if state['latency'] is None else \
+                self.alpha * latency + (1 - self.alpha) * state['latency']
+            state['samples'] += 1
+            state['queue'] = max(state['queue'], queue_depth)
+            return self._adjust(state)
+
+    def overload(self, client_id):
+        """帧因推理积压被丢弃时调用，尽快降低采集速率"""
+        with self._lock:
+            state = self.clients.get(client_id)
+            if state is None:
+                return None
+            state['overloaded'] = True
+            return self._adjust(state)
+
+    def snapshot(self):
+        """各连接当前的控制参数与观测"""
+        with self._lock:
+            return {
+                client_id: dict(self._control(state), latency_ms=(state['latency'] or 0) * 1000)
+                for client_id, state in self.clients.items()
+            }
+
+    def _adjust(self, state):
+        """按预算比较决定升降，未调整时返回 None"""
+        now = time.time()
+        if now - state['changed_at'] < self.interval:
+            return None
+        if not state['overloaded'] and state['samples'] < self.min_samples:
+            return None
+
+        budget = self.headroom / state['fps']
+        latency = state['latency'] or 0.0
+        if state['overloaded'] or latency > budget or state['queue'] > self.queue_limit:
+            changed = self._decrease(state)
+            direction = 'down'
+        elif latency < budget / 2 and state['queue'] == 0:
+            changed = self._increase(state)
+            direction = 'up'
+        else:
+            changed = False
+
+        # 开始新的观测窗口（调整后旧的延迟不再代表新的负载）
+        state['overloaded'] = False
+        state['queue'] = 0
+        if not changed:
+            return None
+
+        state['latency'] = None
+        state['samples'] = 0
+        state['changed_at'] = now
+        metrics.increment('rate_adjustments', direction=direction)
+        return self._control(state)
+
+    def _decrease(self, state):
+        """降级顺序：高于初始的分辨率 -> 帧率 -> 初始以下的分辨率"""
+        if state['dimension_index'] > self.initial_index:
+            state['dimension_index'] -= 1
+            return True
+        if state['fps'] > self.min_fps:
+            state['fps'] = max(self.min_fps, round(state['fps'] * 0.7, 1))
+            return True
+        if state['dimension_index'] > 0:
+            state['dimension_index'] -= 1
+            return True
+        return False
+
+    def _increase(self, state):
+        """升级顺序与降级相反：恢复到初始分辨率 -> 帧率 -> 更高分辨率"""
+        if state['dimension_index'] < self.initial_index:
+            state['dimension_index'] += 1
+            return True
+        if state['fps'] < self.max_fps:
+            state['fps'] = min(self.max_fps, state['fps'] + 1)
+            return True
+        if state['dimension_index'] < len(self.dimensions) - 1:
+            state['dimension_index'] += 1
+            return True
+        return False
+
+    def _control(self, state):
+        return {'fps': state['fps'], 'max_dimension': self.dimensions[state['dimension_index']]}
+
+
+def _parse_dimensions(spec):
+    """'320,640,1280' -> [320, 640, 1280]"""
+    dimensions = [int(part) for part in spec.split(',') if part.strip()]
+    return dimensions or list(DEFAULT_DIMENSIONS)
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+
+# 雷达图维度中文名
+RADAR_LABELS = {
+    'emotional_stability': '情绪稳定性',
+    'stress_level': '压力水平',
+    'anxiety_level': '焦虑水平',
+    'depression_risk': '抑郁风险',
+    'cognitive_clarity': '认知清晰度',
+    'social_adaptability': '社会适应性',
+    'self_control': '自我控制',
+    'resilience': '心理韧性'
+}
+
+# 参与内容哈希的评估字段（报告 ID 与时间戳印在摘要页上，同样计入）
+HASHED_FIELDS = ['report_id', 'timestamp', 'radar_chart', 'psychological_risks', 'communication_barriers',
+                 'interventions', 'emotion_intensity_index', 'timeline']
+
+
+class ReportManager:
+    """报告子系统：评估结果落盘，后台线程渲染图表与 PDF，按内容哈希缓存产物
+
+    已结束的任务、评估文件与缓存产物超过保留时间（JPA_REPORT_TTL）后删除。
+    """
+
+    def __init__(self, root=None, max_workers=2, ttl=None):
+        self.root = root or os.environ.get('JPA_REPORT_DIR', 'reports')
+        self.ttl = ttl or float(os.environ.get('JPA_REPORT_TTL', 7 * 24 * 3600))
+        self.evaluation_dir = os.path.join(self.root, 'evaluations')
+        self.cache_dir = os.path.join(self.root, 'cache')
+        os.makedirs(self.evaluation_dir, exist_ok=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report-render')
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+        # matplotlib 的字体缓存等全局状态不保证线程安全，渲染串行化
+        self._render_lock = threading.Lock()
+
+    def save_evaluation(self, report_id, evaluation):
+        """保存评估结果"""
+        self._cleanup_expired()
+
+        path = self._evaluation_path(report_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(evaluation, f, ensure_ascii=False, default=float)
+        os.replace(path + '.tmp', path)
+
+    def load_evaluation(self, report_id):
+        """读取评估结果，不存在时返回 None"""
+        path = self._evaluation_path(report_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def submit(self, report_id):
+        """提交渲染任务，返回任务状态；内容未变的报告直接命中缓存"""
+        evaluation = self.load_evaluation(report_id)
+        if evaluation is None:
+            return None
+
+        content_hash = self.content_hash(evaluation)
+        pdf_path = self._artifact_path(content_hash, 'report.pdf')
+
+        with self._lock:
+            job = self.jobs.get(report_id)
+            if job and job['hash'] == content_hash and job['status'] in ('queued', 'rendering'):
+                return dict(job)
+
+            if os.path.exists(pdf_path):
+                os.utime(os.path.dirname(pdf_path))  # 命中的缓存产物重新计算保留时间
+                job = {'status': 'done', 'hash': content_hash, 'cached': True,
+                       'finished_at': datetime.now().isoformat()}
+            else:
+                job = {'status': 'queued', 'hash': content_hash, 'cached': False}
+                self.executor.submit(self._render_job, report_id, evaluation, content_hash)
+
+            job['submitted_at'] = datetime.now().isoformat()
+            self.jobs[report_id] = job
+            return dict(job)
+
+    def status(self, report_id):
+        """查询任务状态"""
+        with self._lock:
+            job = self.jobs.get(report_id)
+            return dict(job) if job else None
+
+    def report_path(self, report_id):
+        """已渲染的 PDF 路径，未完成时返回 None"""
+        job = self.status(report_id)
+        if job is None:
+            # 重启后任务表为空，按内容哈希查找缓存
+            evaluation = self.load_evaluation(report_id)
+            if evaluation is None:
+                return None
+            path = self._artifact_path(self.content_hash(evaluation), 'report.pdf')
+            return path if os.path.exists(path) else None
+
+        if job['status'] != 'done':
+            return None
+        return self._artifact_path(job['hash'], 'report.pdf')
+
+    def content_hash(self, evaluation):
+        """评估输入的内容哈希"""
+        content = {key: evaluation.get(key) for key in HASHED_FIELDS}
+        encoded = json.dumps(content, ensure_ascii=False, sort_keys=True, default=float)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def _render_job(self, report_id, evaluation, content_hash):
+        """后台渲染任务"""
+        self._set_status(report_id, 'rendering')
+        try:
+            artifact_dir = os.path.join(self.cache_dir, content_hash)
+            os.makedirs(artifact_dir, exist_ok=True)
+
+            with self._render_lock:
+                figures = [
+                    self._render_summary(report_id, evaluation),
+                    self._render_radar(evaluation.get('radar_chart', {})),
+                ]
+                if evaluation.get('timeline'):
+                    figures.append(self._render_timeline(evaluation['timeline']))
+
+                # 图表单独缓存为 PNG，供网页复用
+                figures[1].savefig(os.path.join(artifact_dir, 'radar.png'), dpi=120)
+                if len(figures) > 2:
+                    figures[2].savefig(os.path.join(artifact_dir, 'timeline.png'), dpi=120)
+
+                self._write_pdf(figures, os.path.join(artifact_dir, 'report.pdf'))
+
+            self._set_status(report_id, 'done')
+        except Exception as e:
+            print(f"Report rendering error: {e}")
+            self._set_status(report_id, 'failed', str(e))
+
+    def _write_pdf(self, figures, pdf_path):
+        """组装 PDF（先写临时文件再原子替换，避免下载到半成品）"""
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        tmp_path = pdf_path + '.tmp'
+        with PdfPages(tmp_path) as pdf:
+            for figure in figures:
+                pdf.savefig(figure)
+        os.replace(tmp_path, pdf_path)
+
+    def _render_summary(self, report_id, evaluation):
+        """报告摘要页"""
+        figure = _new_figure((8.27, 11.69))
+
+        lines = [
+            ('司法心理评估报告', 18),
+            (f'报告编号: {report_id}', 11),
+            (f"生成时间: {evaluation.get('timestamp', '')}", 11),
+            (f"情绪强度指数: {float(evaluation.get('emotion_intensity_index', 0)):.1f}", 11),
+            ('', 11),
+            ('心理风险', 14)
+        ]
+        for risk in evaluation.get('psychological_risks', []):
+            lines.append((f"  · {risk['type']}  等级: {risk['level']}  分数: {float(risk['score']):.2f}", 10))
+
+        lines.append(('', 11))
+        lines.append(('沟通障碍', 14))
+        for barrier in evaluation.get('communication_barriers', []):
+            lines.append((f"  · {barrier['type']}  严重程度: {float(barrier.get('severity', 0)):.2f}", 10))
+
+        lines.append(('', 11))
+        lines.append(('干预建议', 14))
+        for category in ('immediate', 'short_term', 'long_term'):
+            for item in evaluation.get('interventions', {}).get(category, []):
+                lines.append((f"  · [{category}] {item['action']}", 10))
+
+        y = 0.95
+        for text, size in lines:
+            figure.text(0.08, y, text, fontsize=size, va='top')
+            y -= 0.02 + size / 1000
+
+        return figure
+
+    def _render_radar(self, radar_chart):
+        """心理状态雷达图"""
+        import numpy as np
+
+        figure = _new_figure((6, 6))
+        ax = figure.add_subplot(111, polar=True)
+
+        keys = [key for key in RADAR_LABELS if key in radar_chart]
+        if keys:
+            values = [float(radar_chart[key]) for key in keys]
+            angles = np.linspace(0, 2 * np.pi, len(keys), endpoint=False).tolist()
+            ax.plot(angles + angles[:1], values + values[:1], color='#667eea', linewidth=2)
+            ax.fill(angles + angles[:1], values + values[:1], color='#667eea', alpha=0.3)
+            ax.set_xticks(angles)
+            ax.set_xticklabels([RADAR_LABELS[key] for key in keys])
+        ax.set_ylim(0, 100)
+        ax.set_title('心理状态雷达图')
+
+        return figure
+
+    def _render_timeline(self, timeline):
+        """各维度随时间变化曲线"""
+        figure = _new_figure((10, 5))
+        ax = figure.add_subplot(111)
+
+        x = list(range(len(timeline)))
+        for key, label in RADAR_LABELS.items():
+            values = [float(window['radar_chart'].get(key, 0)) for window in timeline]
+            ax.plot(x, values, label=label, linewidth=1.5)
+
+        ax.set_xlabel('时间窗口')
+        ax.set_ylim(0, 100)
+        ax.legend(loc='upper right', fontsize=8, ncol=2)
+        ax.set_title('心理状态时间线')
+
+        return figure
+
+    def _set_status(self, report_id, status, error=None):
+        with self._lock:
+            job = self.jobs.setdefault(report_id, {})
+            job['status'] = status
+            if status in ('done', 'failed'):
+                job['finished_at'] = datetime.now().isoformat()
+            if error:
+                job['error'] = error
+
+    def _cleanup_expired(self):
+        """删除超过保留时间的已结束任务，以及不再被任务引用的过期评估文件与缓存产物"""
+        deadline = time.time() - self.ttl
+        finished_before = (datetime.now() - timedelta(seconds=self.ttl)).isoformat()
+        with self._lock:
+            for report_id, job in list(self.jobs.items()):
+                if job.get('finished_at', finished_before) < finished_before:
+                    del self.jobs[report_id]
+            evaluations = {f'{report_id}.json' for report_id in self.jobs}
+            hashes = {job.get('hash') for job in self.jobs.values()}
+
+        for directory, keep in ((self.evaluation_dir, evaluations), (self.cache_dir, hashes)):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    if name in keep or os.path.getmtime(path) >= deadline:
+                        continue
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _evaluation_path(self, report_id):
+        return os.path.join(self.evaluation_dir, f'{os.path.basename(report_id)}.json')
+
+    def _artifact_path(self, content_hash, name):
+        return os.path.join(self.cache_dir, content_hash, name)
+
+
+def _new_figure(size):
+    """创建不依赖 pyplot 全局状态的 Figure（可在后台线程使用）"""
+    from matplotlib.figure import Figure
+    from matplotlib import rcParams
+
+    rcParams['font.sans-serif'] = ['Noto Sans CJK SC', 'SimHei', 'WenQuanYi Micro Hei', 'DejaVu Sans']
+    rcParams['axes.unicode_minus'] = False
+
+    return Figure(figsize=size)
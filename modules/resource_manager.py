@@ -0,0 +1,198 @@
+import os
+import sys
+import threading
+
+
+# 各引擎按此顺序划分核心
+ENGINES = ['face', 'voice', 'text', 'analysis']
+
+# 未配置时的默认占比（face: TensorFlow + MediaPipe，voice: librosa，text: torch，analysis: NumPy/BLAS）
+DEFAULT_SHARES = {'face': 0.4, 'voice': 0.2, 'text': 0.3, 'analysis': 0.1}
+
+
+class ResourceManager:
+    """运行时核心预算：为各模态引擎划分 CPU 核心，并据此配置各框架线程池
+
+    同一进程内 TensorFlow 的 inter/intra-op 线程池、torch 的 OpenMP 线程、MediaPipe 与
+    BLAS 默认都按全部核心开线程，并发时严重超订。本类在启动时按 JPA_CORE_BUDGET
+    （如 face=4,voice=2,text=2,analysis=1）划分互不重叠的核心集合，可选按 JPA_PIN_AFFINITY
+    将执行线程或工作进程绑定到对应核心。
+    """
+
+    def __init__(self, budgets=None, pin=None, cpus=None):
+        self.cpus = sorted(cpus if cpus is not None else _available_cpus())
+        if budgets is None:
+            budgets = _parse_budgets(os.environ.get('JPA_CORE_BUDGET', ''))
+        self.budgets = self._normalize(budgets)
+        self.pin = pin if pin is not None else os.environ.get('JPA_PIN_AFFINITY', '0') == '1'
+        self.core_sets = self._partition()
+
+        self._thread_state = threading.local()
+
+    def configure_environment(self, engine=None, threads=None):
+        """设置线程数环境变量（须在导入 TensorFlow / torch / NumPy 之前调用）
+
+        指定 engine 时整个进程只服务该引擎（工作进程），直接覆盖从父进程继承的值；
+        否则按各引擎预算分别设置，保留运维显式设置的环境变量。
+        """
+        if engine is not None:
+            threads = threads or self.budgets[engine]
+            values = {engine: threads, 'analysis': threads}
+        else:
+            values = self.budgets
+
+        env = {
+            'OMP_NUM_THREADS': values.get('text', 1),
+            'MKL_NUM_THREADS': values.get('text', 1),
+            'OPENBLAS_NUM_THREADS': values.get('analysis', 1),
+            'NUMEXPR_NUM_THREADS': values.get('analysis', 1),
+            'TF_NUM_INTRAOP_THREADS': values.get('face', 1),
+            'TF_NUM_INTEROP_THREADS': 1,
+        }
+        for key, value in env.items():
+            if engine is not None:
+                os.environ[key] = str(value)
+            else:
+                os.environ.setdefault(key, str(value))
+
+    def configure_frameworks(self, engine=None, threads=None):
+        """按预算配置已导入框架的线程池，返回实际生效的配置"""
+        budgets = dict(self.budgets)
+        if engine is not None:
+            budgets = {name: threads or self.budgets[engine] for name in ENGINES}
+
+        if 'torch' in sys.modules:
+            torch = sys.modules['torch']
+            torch.set_num_threads(budgets['text'])
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError as e:
+                # inter-op 线程池已启动后不可修改
+                print(f"torch inter-op threads not applied: {e}")
+
+        if 'tensorflow' in sys.modules:
+            tf = sys.modules['tensorflow']
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(budgets['face'])
+                tf.config.threading.set_inter_op_parallelism_threads(1)
+            except RuntimeError as e:
+                # 运行时已初始化（模型已加载），只能依赖 TF_NUM_*_THREADS 环境变量
+                print(f"TensorFlow thread pools not applied, using TF_NUM_*_THREADS "
+                      f"({os.environ.get('TF_NUM_INTRAOP_THREADS')}/{os.environ.get('TF_NUM_INTEROP_THREADS')}): {e}")
+
+        if 'cv2' in sys.modules:
+            sys.modules['cv2'].setNumThreads(budgets['face'])
+
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(budgets['analysis'], user_api='blas')
+        except ImportError:
+            pass
+
+        return self.report()
+
+    def pin_current_thread(self, engine):
+        """将当前线程绑定到引擎的核心集合（同一线程重复调用时跳过）"""
+        if not self.pin or not hasattr(os, 'sched_setaffinity'):
+            return
+        if getattr(self._thread_state, 'engine', None) == engine:
+            return
+        try:
+            # Linux 上 pid 0 仅作用于调用线程，之后由该线程创建的线程继承
+            os.sched_setaffinity(0, self.core_sets[engine])
+            self._thread_state.engine = engine
+        except OSError as e:
+            print(f"CPU affinity error ({engine}): {e}")
+
+    def worker_slice(self, engine, index, workers):
+        """同一模态多个工作进程时，将该模态的核心平分给各进程"""
+        cores = self.core_sets[engine]
+        per_worker = max(1, len(cores) // workers)
+        start = (index * per_worker) % len(cores)
+        return cores[start:start + per_worker] or cores
+
+    def configure_worker(self, engine, index=0, workers=1):
+        """工作进程启动时调用：按分到的核心数设置线程池并可选绑定整个进程"""
+        cores = self.worker_slice(engine, index, workers)
+        self.configure_environment(engine, threads=len(cores))
+        if self.pin and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, cores)
+            except OSError as e:
+                print(f"CPU affinity error ({engine}-{index}): {e}")
+        return cores
+
+    def report(self):
+        """实际生效的核心划分与各框架线程数"""
+        effective = {}
+        if 'torch' in sys.modules:
+            torch = sys.modules['torch']
+            effective['torch'] = {'intra_op': torch.get_num_threads(), 'inter_op': torch.get_num_interop_threads()}
+        if 'tensorflow' in sys.modules:
+            tf = sys.modules['tensorflow']
+            effective['tensorflow'] = {
+                'intra_op': tf.config.threading.get_intra_op_parallelism_threads(),
+                'inter_op': tf.config.threading.get_inter_op_parallelism_threads()
+            }
+        if 'cv2' in sys.modules:
+            effective['opencv'] = sys.modules['cv2'].getNumThreads()
+        try:
+            from threadpoolctl import threadpool_info
+            effective['blas'] = [{'library': info['internal_api'], 'threads': info['num_threads']}
+                                 for info in threadpool_info()]
+        except ImportError:
+            pass
+
+        return {
+            'cpus': self.cpus,
+            'budgets': self.budgets,
+            'core_sets': {engine: list(cores) for engine, cores in self.core_sets.items()},
+            'pinned': self.pin,
+            'environment': {key: os.environ.get(key) for key in (
+                'OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS')},
+            'effective': effective
+        }
+
+    def _normalize(self, budgets):
+        """补全未配置的引擎；总预算超过核心数时按比例缩减（每个引擎至少 1 核）"""
+        total = len(self.cpus)
+        if not budgets:
+            budgets = {engine: max(1, int(total * share)) for engine, share in DEFAULT_SHARES.items()}
+        budgets = {engine: max(1, int(budgets.get(engine, 1))) for engine in ENGINES}
+
+        requested = sum(budgets.values())
+        if requested > total:
+            scale = total / requested
+            budgets = {engine: max(1, int(count * scale)) for engine, count in budgets.items()}
+        return budgets
+
+    def _partition(self):
+        """按引擎顺序划分连续核心；核心不足时循环复用"""
+        core_sets = {}
+        offset = 0
+        for engine in ENGINES:
+            count = self.budgets[engine]
+            core_sets[engine] = [self.cpus[(offset + i) % len(self.cpus)] for i in range(count)]
+            offset += count
+        return core_sets
+
+
+def _available_cpus():
+    """当前进程可用的 CPU 编号"""
+    if hasattr(os, 'sched_getaffinity'):
+        return os.sched_getaffinity(0)
+    return range(os.cpu_count() or 1)
+
+
+def _parse_budgets(spec):
+    """'face=4,text=2' -> {'face': 4, 'text': 2}"""
+    budgets = {}
+    for part in spec.split(','):
+        if '=' in part:
+            engine, count = part.split('=', 1)
+            engine = engine.strip()
+            if engine not in ENGINES:
+                raise ValueError(f'未知的引擎: {engine}')
+            budgets[engine] = int(count)
+    return budgets
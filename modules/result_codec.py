@@ -0,0 +1,58 @@
+import struct
+
+import numpy as np
+
+from modules.session_store import MODALITY_COLUMNS, frame_row
+
+
+ENCODINGS = ['json', 'binary']
+
+# 帧头：版本、模态编码、标志位、epoch 毫秒时间戳（小端，12 字节，之后的 float32 向量 4 字节对齐）
+HEADER = struct.Struct('<BBHd')
+VERSION = 1
+MODALITY_CODES = {'face': 1, 'voice': 2}
+MODALITY_NAMES = {code: modality for modality, code in MODALITY_CODES.items()}
+
+# 标志位
+FLAG_EMPTY = 0x1  # 本帧无结果（如未检测到人脸），不附带特征向量
+
+
+def layout():
+    """二进制格式说明，在协商时发给客户端（列顺序以此为准）"""
+    return {
+        'version': VERSION,
+        'header_bytes': HEADER.size,
+        'modalities': {
+            modality: {'code': code, 'columns': list(MODALITY_COLUMNS[modality])}
+            for modality, code in MODALITY_CODES.items()
+        },
+        'flags': {'empty': FLAG_EMPTY}
+    }
+
+
+def encode_result(modality, result, timestamp):
+    """单帧实时分析结果 -> 定长二进制帧（缺失值为 NaN）"""
+    code = MODALITY_CODES.get(modality)
+    if code is None:
+        raise ValueError(f'未知的模态: {modality}')
+
+    timestamp_ms = timestamp * 1000.0
+    if not result:
+        return HEADER.pack(VERSION, code, FLAG_EMPTY, timestamp_ms)
+
+    values = np.asarray(frame_row(modality, result), dtype='<f4')
+    return HEADER.pack(VERSION, code, 0, timestamp_ms) + values.tobytes()
+
+
+def decode_result(payload):
+    """二进制帧 -> (模态, 字段字典或 None, epoch 秒)，用于调试与基准测试"""
+    version, code, flags, timestamp_ms = HEADER.unpack_from(payload)
+    if version != VERSION:
+        raise ValueError(f'不支持的编码版本: {version}')
+
+    modality = MODALITY_NAMES[code]
+    if flags & FLAG_EMPTY:
+        return modality, None, timestamp_ms / 1000.0
+
+    values = np.frombuffer(payload, dtype='<f4', offset=HEADER.size)
+    return modality, dict(zip(MODALITY_COLUMNS[modality], values.tolist())), timestamp_ms / 1000.0
@@ -18,16 +18,27 @@ class RiskAssessor:
             'trauma': ['flashback', 'nightmare', 'avoidance', 'hypervigilance']
         }
 
+        # 自伤风险与信任问题使用的指标
+        self.despair_indicators = ['hopeless', 'worthless', 'empty']
+        self.suspicion_indicators = ['fearful', 'suspicious', 'anxious']
+
+        # 指标索引缓存：情绪字典的键序列 -> 预编译的指标位置
+        self._index_cache = {}
+        self._index_cache_size = 256
+
     def identify_psychological_risks(self, integrated_data):
         """识别心理风险"""
         risks = []
 
         # 分析情绪模式
         emotional_profile = integrated_data.get('emotional_profile', {})
+        keys = list(emotional_profile)
+        values = list(emotional_profile.values())
+        index = self._get_indicator_index(emotional_profile)
 
         # 检查各类心理风险
-        for risk_type, indicators in self.psychological_indicators.items():
-            risk_score = self._calculate_risk_score(emotional_profile, indicators)
+        for risk_type in self.psychological_indicators:
+            risk_score = self._calculate_risk_score(values, index[risk_type])
 
             if risk_score > self.risk_thresholds['low']:
                 risk_level = self._get_risk_level(risk_score)
@@ -36,7 +47,7 @@ class RiskAssessor:
                     'type': risk_type,
                     'score': risk_score,
                     'level': risk_level,
-                    'indicators': self._get_present_indicators(emotional_profile, indicators),
+                    'indicators': self._get_present_indicators(keys, values, index[risk_type]),
                     'timestamp': datetime.now().isoformat()
                 })
 
@@ -51,6 +62,100 @@ class RiskAssessor:
 
         return sorted(risks, key=lambda x: x['score'], reverse=True)
 
+    def identify_psychological_risks_batch(self, batch):
+        """批量识别心理风险（输入为 MultimodalBatch），返回逐会话风险列表与分数矩阵"""
+        now = datetime.now().isoformat()
+        n = len(batch)
+
+        # 按情绪字典的键序列分组：同组会话共用一份指标索引，每组一次矩阵运算
+        scores = {risk_type: np.zeros(n) for risk_type in self.psychological_indicators}
+        despair_scores = np.zeros(n)
+        instability = np.zeros(n)
+        groups = []
+        row_group = np.zeros(n, dtype=int)
+        row_offset = np.zeros(n, dtype=int)
+        for g, (rows, cols) in enumerate(batch.profile_groups()):
+            keys = [batch.profile_keys[k] for k in cols]
+            index = self._compile_indicator_index(tuple(keys))
+            values = batch.profile_values(rows, cols)
+            for risk_type in self.psychological_indicators:
+                scores[risk_type][rows] = self._calculate_risk_score_batch(values, index[risk_type])
+            despair_scores[rows] = self._calculate_risk_score_batch(values, index['despair'])
+            if len(cols):
+                instability[rows] = np.std(values, axis=1)
+            groups.append((keys, values, index))
+            row_group[rows] = g
+            row_offset[rows] = np.arange(len(rows))
+
+        # 综合风险
+        confusion = np.where(batch.has_text, 1 - batch.consistency, 0)
+        overall_scores = (
+                batch.overall_intensity * 0.4 +
+                instability * 0.3 +
+                confusion * 0.3
+        )
+
+        # 急性风险
+        crisis_mask = batch.overall_intensity > 85
+        despair_mask = despair_scores > 0.7
+
+        # 仅对触发阈值的会话组装输出字典
+        results = []
+        for i in range(n):
+            risks = []
+            keys, values, index = groups[row_group[i]]
+
+            for risk_type in self.psychological_indicators:
+                risk_score = scores[risk_type][i]
+                if risk_score > self.risk_thresholds['low']:
+                    risks.append({
+                        'type': risk_type,
+                        'score': risk_score,
+                        'level': self._get_risk_level(risk_score),
+                        'indicators': self._get_present_indicators(keys, values[row_offset[i]], index[risk_type]),
+                        'timestamp': now
+                    })
+
+            if overall_scores[i] > self.risk_thresholds['medium']:
+                risks.append({
+                    'type': 'overall_psychological_risk',
+                    'score': overall_scores[i],
+                    'level': self._get_risk_level(overall_scores[i]),
+                    'components': {
+                        'intensity': batch.overall_intensity[i],
+                        'instability': instability[i],
+                        'confusion': confusion[i]
+                    },
+                    'timestamp': now
+                })
+
+            if crisis_mask[i]:
+                risks.append({
+                    'type': 'emotional_crisis',
+                    'score': batch.overall_intensity[i] / 100,
+                    'level': 'high',
+                    'description': '情绪强度达到危险水平',
+                    'immediate_action_required': True,
+                    'timestamp': now
+                })
+
+            if despair_mask[i]:
+                risks.append({
+                    'type': 'self_harm_risk',
+                    'score': despair_scores[i],
+                    'level': 'critical',
+                    'description': '存在潜在自伤风险',
+                    'immediate_action_required': True,
+                    'timestamp': now
+                })
+
+            results.append(sorted(risks, key=lambda x: x['score'], reverse=True))
+
+        scores['overall_psychological_risk'] = overall_scores
+        scores['self_harm_risk'] = despair_scores
+
+        return {'risks': results, 'scores': scores}
+
     def assess_communication_barriers(self, integrated_data):
         """评估沟通障碍"""
         barriers = []
@@ -89,17 +194,57 @@ class RiskAssessor:
 
         return barriers
 
-    def _calculate_risk_score(self, emotional_profile, indicators):
+    def _get_indicator_index(self, emotional_profile):
+        """获取情绪字典对应的预编译指标索引（按键序列缓存）"""
+        return self._compile_indicator_index(tuple(emotional_profile))
+
+    def _compile_indicator_index(self, keys):
+        """将指标表编译为键位置索引
+
+        每组指标对应 (positions, names)：positions 为匹配到的键位置，
+        按“指标优先、键其次”的顺序排列，与逐项扫描的求和顺序一致。
+        """
+        index = self._index_cache.get(keys)
+        if index is not None:
+            return index
+
+        groups = dict(self.psychological_indicators)
+        groups['despair'] = self.despair_indicators
+        groups['suspicion'] = self.suspicion_indicators
+
+        lowered = [key.lower() for key in keys]
+        index = {}
+        for group, indicators in groups.items():
+            positions = []
+            names = []
+            for indicator in indicators:
+                for position, key in enumerate(lowered):
+                    if indicator in key:
+                        positions.append(position)
+                        names.append(indicator)
+            index[group] = (np.array(positions, dtype=int), names)
+
+        if len(self._index_cache) >= self._index_cache_size:
+            self._index_cache.clear()
+        self._index_cache[keys] = index
+
+        return index
+
+    def _calculate_risk_score(self, values, group_index):
         """计算风险分数"""
-        scores = []
+        positions, _ = group_index
+        if not len(positions):
+            return 0
+
+        return np.mean(np.asarray(values, dtype=float)[positions])
 
-        for indicator in indicators:
-            # 检查各种形式的指标
-            for key, value in emotional_profile.items():
-                if indicator in key.lower():
-                    scores.append(value)
+    def _calculate_risk_score_batch(self, values, group_index):
+        """批量计算风险分数（values 为同一键序列的 (N, K) 情绪矩阵）"""
+        positions, _ = group_index
+        if not len(positions):
+            return np.zeros(len(values))
 
-        return np.mean(scores) if scores else 0
+        return np.mean(np.ascontiguousarray(values[:, positions]), axis=1)
 
     def _get_risk_level(self, score):
         """获取风险等级"""
@@ -112,18 +257,19 @@ class RiskAssessor:
         else:
             return 'low'
 
-    def _get_present_indicators(self, emotional_profile, indicators):
+    def _get_present_indicators(self, keys, values, group_index):
         """获取存在的指标"""
+        positions, names = group_index
         present = []
 
-        for indicator in indicators:
-            for key, value in emotional_profile.items():
-                if indicator in key.lower() and value > 0.3:
-                    present.append({
-                        'indicator': indicator,
-                        'source': key,
-                        'value': value
-                    })
+        for position, indicator in zip(positions, names):
+            value = values[position]
+            if value > 0.3:
+                present.append({
+                    'indicator': indicator,
+                    'source': keys[position],
+                    'value': value
+                })
 
         return present
 
@@ -176,8 +322,8 @@ class RiskAssessor:
 
         # 检查自伤/自杀风险指标
         emotional_profile = integrated_data.get('emotional_profile', {})
-        despair_indicators = ['hopeless', 'worthless', 'empty']
-        despair_score = self._calculate_risk_score(emotional_profile, despair_indicators)
+        index = self._get_indicator_index(emotional_profile)
+        despair_score = self._calculate_risk_score(list(emotional_profile.values()), index['despair'])
 
         if despair_score > 0.7:
             acute_risks.append({
@@ -283,11 +429,10 @@ class RiskAssessor:
         emotional_profile = integrated_data.get('emotional_profile', {})
 
         # 怀疑和恐惧相关情绪
-        suspicion_emotions = ['fearful', 'suspicious', 'anxious']
-        for emotion in suspicion_emotions:
-            for key, value in emotional_profile.items():
-                if emotion in key.lower():
-                    trust_score -= value * 0.3
+        values = list(emotional_profile.values())
+        positions, _ = self._get_indicator_index(emotional_profile)['suspicion']
+        for position in positions:
+            trust_score -= values[position] * 0.3
 
         # 检查防御性指标
         cognitive_patterns = integrated_data.get('cognitive_patterns', {})
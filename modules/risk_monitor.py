@@ -0,0 +1,199 @@
+import numpy as np
+from datetime import datetime
+
+
+# 风险等级顺序（none 表示未达到 low 阈值）
+RISK_LEVELS = ['none', 'low', 'medium', 'high', 'critical']
+
+# 综合情绪强度中各模态的权重（与 integrate_multimodal_data 一致），按实际有数据的模态归一化
+INTENSITY_WEIGHTS = {'face_intensity': 0.3, 'voice_intensity': 0.3}
+
+
+class RollingStats:
+    """单个指标的滚动统计量：EWMA 与固定窗口均值/方差，每次更新 O(1)"""
+
+    def __init__(self, window=90, alpha=0.2):
+        self.window = window
+        self.alpha = alpha
+
+        self.buffer = np.zeros(window)
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.ewma = None
+
+    def update(self, value):
+        """加入一个新值"""
+        value = float(value)
+
+        # 窗口已满时移除最旧的值
+        if self.count == self.window:
+            old = self.buffer[self.position]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+
+        self.buffer[self.position] = value
+        self.position = (self.position + 1) % self.window
+        self.total += value
+        self.total_sq += value * value
+
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            self.ewma = self.alpha * value + (1 - self.alpha) * self.ewma
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def variance(self):
+        if not self.count:
+            return 0.0
+        mean = self.mean
+        return max(0.0, self.total_sq / self.count - mean * mean)
+
+    def to_dict(self):
+        return {
+            'ewma': self.ewma if self.ewma is not None else 0.0,
+            'mean': self.mean,
+            'variance': self.variance,
+            'count': self.count
+        }
+
+
+class StreamingRiskMonitor:
+    """会话级流式风险监测：逐帧更新滚动统计量，越过阈值时产生带滞回的告警"""
+
+    def __init__(self, risk_assessor, face_analyzer=None, window=90, alpha=0.2, hysteresis=0.05):
+        self.risk_assessor = risk_assessor
+        self.face_analyzer = face_analyzer
+        self.window = window
+        self.alpha = alpha
+        self.hysteresis = hysteresis
+        self.min_samples = max(2, window // 3)  # 窗口方差参与评估所需的最少样本数
+
+        # 指标名 -> 滚动统计量（face_* 情绪、voice_intensity、face_intensity）
+        self.indicators = {}
+
+        # 各风险类型当前等级
+        self.levels = {}
+
+    def update(self, frame_type, result):
+        """处理一帧分析结果，返回本次产生的告警列表"""
+        if not result:
+            return []
+
+        if frame_type == 'face':
+            emotions = result.get('emotions', {})
+            for emotion, value in emotions.items():
+                self._stats(f'face_{emotion}').update(value)
+            if self.face_analyzer is not None:
+                self._stats('face_intensity').update(self.face_analyzer.calculate_intensity(emotions))
+        elif frame_type == 'voice':
+            if 'intensity' in result:
+                self._stats('voice_intensity').update(result['intensity'])
+
+        return self.evaluate()
+
+    def evaluate(self):
+        """基于平滑后的指标评估风险等级，返回等级变化告警"""
+        alerts = []
+        scores = self.current_scores()
+
+        for risk_type, (score, thresholds) in scores.items():
+            alert = self._update_level(risk_type, score, thresholds)
+            if alert:
+                alerts.append(alert)
+
+        return alerts
+
+    def current_scores(self):
+        """当前各风险类型的分数及其等级阈值"""
+        profile = {
+            key: stats.ewma for key, stats in self.indicators.items()
+            if key.startswith('face_') and key != 'face_intensity'
+        }
+        keys = list(profile)
+        values = list(profile.values())
+        index = self.risk_assessor._compile_indicator_index(tuple(keys))
+        thresholds = self.risk_assessor.risk_thresholds
+
+        scores = {}
+        for risk_type in self.risk_assessor.psychological_indicators:
+            scores[risk_type] = (
+                self.risk_assessor._calculate_risk_score(values, index[risk_type]),
+                thresholds
+            )
+
+        # 急性风险：与 _identify_acute_risks 的阈值一致（综合强度为 0-100）
+        present = {key: weight for key, weight in INTENSITY_WEIGHTS.items() if key in self.indicators}
+        overall_intensity = (
+            sum(self._ewma(key) * weight for key, weight in present.items()) / sum(present.values())
+            if present else 0.0
+        )
+        scores['emotional_crisis'] = (overall_intensity / 100, {'high': 0.85})
+        scores['self_harm_risk'] = (
+            self.risk_assessor._calculate_risk_score(values, index['despair']),
+            {'critical': 0.7}
+        )
+
+        # 情绪波动：窗口内强度的标准差（0-100 指标的标准差最大为 50）
+        volatility = [
+            np.sqrt(self.indicators[key].variance) / 50 for key in INTENSITY_WEIGHTS
+            if key in self.indicators and self.indicators[key].count >= self.min_samples
+        ]
+        if volatility:
+            scores['emotional_volatility'] = (float(np.mean(volatility)), thresholds)
+
+        return scores
+
+    def snapshot(self):
+        """当前滚动统计量与风险等级"""
+        return {
+            'indicators': {key: stats.to_dict() for key, stats in self.indicators.items()},
+            'levels': dict(self.levels)
+        }
+
+    def _update_level(self, risk_type, score, thresholds):
+        """带滞回的等级更新：升级立即生效，降级需低于阈值一个滞回量"""
+        current = self.levels.get(risk_type, 'none')
+        candidate = self._level_for(score, thresholds, 0.0)
+
+        if RISK_LEVELS.index(candidate) > RISK_LEVELS.index(current):
+            new_level = candidate
+        else:
+            new_level = self._level_for(score, thresholds, self.hysteresis)
+            if RISK_LEVELS.index(new_level) >= RISK_LEVELS.index(current):
+                return None
+
+        self.levels[risk_type] = new_level
+
+        return {
+            'type': risk_type,
+            'score': float(score),
+            'level': new_level,
+            'previous_level': current,
+            'direction': 'up' if RISK_LEVELS.index(new_level) > RISK_LEVELS.index(current) else 'down',
+            'immediate_action_required': risk_type in ('emotional_crisis', 'self_harm_risk') and new_level != 'none',
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def _level_for(self, score, thresholds, margin):
+        """根据阈值（减去滞回量）确定等级"""
+        for level in reversed(RISK_LEVELS[1:]):
+            if level in thresholds and score >= thresholds[level] - margin:
+                return level
+        return 'none'
+
+    def _stats(self, key):
+        if key not in self.indicators:
+            self.indicators[key] = RollingStats(self.window, self.alpha)
+        return self.indicators[key]
+
+    def _ewma(self, key):
+        stats = self.indicators.get(key)
+        return stats.ewma if stats is not None and stats.ewma is not None else 0.0
@@ -0,0 +1,186 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    start_time TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS frames (
+    session_id TEXT NOT NULL,
+    modality TEXT NOT NULL,
+    t REAL NOT NULL,
+    row BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frames_session ON frames (session_id, modality, t);
+CREATE TABLE IF NOT EXISTS texts (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS texts_session ON texts (session_id, seq);
+"""
+
+
+class SessionPersistence:
+    """会话持久化：SQLite WAL 模式，后台线程批量组提交，实时路径只入队不等待落盘"""
+
+    def __init__(self, path=None, batch_size=512, flush_ms=50):
+        self.path = path or os.environ.get('JPA_SESSION_DB', 'data/sessions.db')
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+        self.queue = queue.Queue()
+        self.stats = {'commits': 0, 'rows': 0, 'errors': 0}
+        self._written = set()  # 本进程写入过的会话（读取前可能需要等待队列落盘）
+
+        self._thread = threading.Thread(target=self._run, name='session-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record_session(self, session_id, start_time):
+        """登记新会话"""
+        self._written.add(session_id)
+        self.queue.put(('session', (session_id, start_time)))
+
+    def record_frame(self, session_id, modality, timestamp, row):
+        """登记一帧（row 为 float32 数组）"""
+        self._written.add(session_id)
+        self.queue.put(('frame', (session_id, modality, float(timestamp),
+                                  np.asarray(row, dtype=np.float32).tobytes())))
+
+    def record_text(self, session_id, seq, record):
+        """登记一条文本分析结果"""
+        self._written.add(session_id)
+        self.queue.put(('text', (session_id, seq, json.dumps(record, ensure_ascii=False, default=float))))
+
+    def queue_depth(self):
+        """待写入数量"""
+        return self.queue.qsize()
+
+    def session_ids(self):
+        """已持久化的会话 ID，按开始时间排序"""
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute('SELECT id FROM sessions ORDER BY start_time')]
+
+    def load_session(self, session_id, columns):
+        """从磁盘读取会话，返回 {start_time, series: {modality: (times, values)}, text_data}"""
+        # 本进程写入过的会话先确保队列中的数据已落盘，其余会话（未知 ID、以前运行中的会话）直接读取
+        if session_id in self._written:
+            self.flush()
+
+        with self._connect() as conn:
+            row = conn.execute('SELECT start_time FROM sessions WHERE id = ?', (session_id,)).fetchone()
+            if row is None:
+                return None
+
+            series = {}
+            for modality, names in columns.items():
+                frames = conn.execute(
+                    'SELECT t, row FROM frames WHERE session_id = ? AND modality = ? ORDER BY t',
+                    (session_id, modality)
+                ).fetchall()
+                times = np.array([f[0] for f in frames], dtype=np.float64)
+                values = np.frombuffer(b''.join(f[1] for f in frames), dtype=np.float32)
+                series[modality] = (times, values.reshape(-1, len(names)))
+
+            text_data = [
+                json.loads(r[0]) for r in conn.execute(
+                    'SELECT record FROM texts WHERE session_id = ? ORDER BY seq', (session_id,)
+                )
+            ]
+
+        return {'start_time': row[0], 'series': series, 'text_data': text_data}
+
+    def flush(self, timeout=5.0):
+        """等待队列中已有数据全部提交"""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(('flush', done))
+        done.wait(timeout)
+
+    def close(self):
+        """提交剩余数据并停止写线程"""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=10)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _run(self):
+        """写线程：收集一批后在单个事务中提交"""
+        conn = self._connect()
+        stopping = False
+
+        while not stopping:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(conn, batch)
+
+        # 停止前写入剩余数据
+        remaining = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        self._commit(conn, remaining)
+        conn.close()
+
+    def _commit(self, conn, batch):
+        """组提交一批写入"""
+        sessions = [args for kind, args in batch if kind == 'session']
+        frames = [args for kind, args in batch if kind == 'frame']
+        texts = [args for kind, args in batch if kind == 'text']
+        waiters = [args for kind, args in batch if kind == 'flush']
+
+        try:
+            with conn:
+                if sessions:
+                    conn.executemany('INSERT OR IGNORE INTO sessions (id, start_time) VALUES (?, ?)', sessions)
+                if frames:
+                    conn.executemany('INSERT INTO frames (session_id, modality, t, row) VALUES (?, ?, ?, ?)',
+                                     frames)
+                if texts:
+                    conn.executemany('INSERT INTO texts (session_id, seq, record) VALUES (?, ?, ?)', texts)
+            self.stats['commits'] += 1
+            self.stats['rows'] += len(sessions) + len(frames) + len(texts)
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            print(f"Session persistence error: {e}")
+
+        for done in waiters:
+            done.set()
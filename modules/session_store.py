@@ -0,0 +1,428 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+
+# 各模态的列定义（与分析器输出字段对应）
+FACE_EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+MICRO_EXPRESSIONS = ['eye_movement', 'lip_tension', 'brow_furrow', 'nostril_flare']
+VOICE_EMOTIONS = ['calm', 'happy', 'sad', 'angry', 'fearful', 'disgust', 'surprised', 'neutral']
+
+MODALITY_COLUMNS = {
+    'face': [f'emotion_{e}' for e in FACE_EMOTIONS] + [f'micro_{m}' for m in MICRO_EXPRESSIONS],
+    'voice': ['intensity', 'pitch_intensity', 'volume_intensity', 'speed_intensity'] +
+             [f'emotion_{e}' for e in VOICE_EMOTIONS]
+}
+
+
+def frame_row(modality, result):
+    """单帧分析结果 -> 按 MODALITY_COLUMNS 顺序排列的特征值（缺失为 NaN）"""
+    if modality == 'face':
+        emotions = result.get('emotions') or {}
+        micro = result.get('micro_expressions') or {}
+        return [emotions.get(e, np.nan) for e in FACE_EMOTIONS] + \
+               [micro.get(m, np.nan) for m in MICRO_EXPRESSIONS]
+    if modality == 'voice':
+        emotions = result.get('emotion') or {}
+        return [
+            result.get('intensity', np.nan),
+            (result.get('pitch') or {}).get('intensity', np.nan),
+            (result.get('volume') or {}).get('intensity', np.nan),
+            (result.get('speed') or {}).get('intensity', np.nan)
+        ] + [emotions.get(e, np.nan) for e in VOICE_EMOTIONS]
+    raise ValueError(f'未知的模态: {modality}')
+
+
+class ColumnarSeries:
+    """单模态时间序列：float64 epoch 时间 + float32 特征矩阵，按块摊还增长"""
+
+    def __init__(self, columns, initial_capacity=256):
+        self.columns = list(columns)
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+        self.size = 0
+        self._times = np.empty(initial_capacity, dtype=np.float64)
+        self._values = np.full((initial_capacity, len(self.columns)), np.nan, dtype=np.float32)
+
+    def append(self, timestamp, row):
+        """追加一行（容量不足时加倍）"""
+        if self.size == len(self._times):
+            capacity = len(self._times) * 2
+            self._times = np.resize(self._times, capacity)
+            values = np.full((capacity, len(self.columns)), np.nan, dtype=np.float32)
+            values[:self.size] = self._values[:self.size]
+            self._values = values
+
+        self._times[self.size] = timestamp
+        self._values[self.size] = row
+        self.size += 1
+
+    @classmethod
+    def from_arrays(cls, columns, times, values):
+        """由已有数组构建序列"""
+        series = cls(columns, initial_capacity=max(256, len(times)))
+        series._times[:len(times)] = times
+        series._values[:len(times)] = values
+        series.size = len(times)
+        return series
+
+    @property
+    def times(self):
+        return self._times[:self.size]
+
+    @property
+    def values(self):
+        return self._values[:self.size]
+
+    def index_range(self, start=None, end=None):
+        """时间范围 [start, end) 对应的行下标范围（时间按追加顺序递增）"""
+        times = self.times
+        lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+        hi = len(times) if end is None else int(np.searchsorted(times, end, side='left'))
+        return lo, hi
+
+    def column(self, name):
+        """获取单列"""
+        return self.values[:, self.column_index[name]]
+
+    def nbytes(self):
+        """已分配内存（字节）"""
+        return self._times.nbytes + self._values.nbytes
+
+    def __len__(self):
+        return self.size
+
+
+class Session:
+    """分析会话：各模态列式存储，文本与事件保持原始结构"""
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.start_time = datetime.now().isoformat()
+        self.last_access = time.time()
+
+        self.face = ColumnarSeries(MODALITY_COLUMNS['face'])
+        self.voice = ColumnarSeries(MODALITY_COLUMNS['voice'])
+        self.text_data = []
+        self.events = []
+        self._text_bytes = 0
+
+        # 会话级状态，随会话一起淘汰
+        self.text_analyzer = None
+        self.text_lock = threading.Lock()  # 串行同一会话的增量文本分析（在原生线程中持有）
+        self.risk_monitor = None
+
+    def series(self, modality):
+        """获取模态时间序列"""
+        return self.face if modality == 'face' else self.voice
+
+    def append_frame(self, modality, result, timestamp=None):
+        """将一帧分析结果写入列式存储"""
+        timestamp = timestamp if timestamp is not None else time.time()
+        self.series(modality).append(timestamp, frame_row(modality, result))
+
+    def append_text(self, record):
+        """追加一条文本分析结果"""
+        self.text_data.append(record)
+        self._text_bytes += sys.getsizeof(record) + sys.getsizeof(record.get('data'))
+
+    def nbytes(self):
+        """会话占用内存估计（字节）"""
+        return (self.face.nbytes() + self.voice.nbytes() +
+                sys.getsizeof(self.text_data) + sys.getsizeof(self.events) + self._text_bytes)
+
+    def to_dict(self):
+        """还原为原有的 JSON 结构"""
+        return {
+            'id': self.id,
+            'start_time': self.start_time,
+            'face_data': [
+                {'timestamp': datetime.fromtimestamp(t).isoformat(), 'data': self._face_record(row)}
+                for t, row in zip(self.face.times.tolist(), self.face.values.tolist())
+            ],
+            'voice_data': [
+                {'timestamp': datetime.fromtimestamp(t).isoformat(), 'data': self._voice_record(row)}
+                for t, row in zip(self.voice.times.tolist(), self.voice.values.tolist())
+            ],
+            'text_data': self.text_data,
+            'events': self.events
+        }
+
+    def query(self, modality, start=None, end=None, cursor=0, limit=None,
+              points=None, method='lttb', downsamplers=None):
+        """按时间范围 / 游标分页 / 降采样查询单个模态，返回列式结果
+
+        游标为行下标（会话只追加不修改），next_cursor 可用于增量同步。
+        """
+        if modality == 'text':
+            hi = len(self.text_data) if limit is None else min(len(self.text_data), cursor + limit)
+            return {
+                'modality': 'text',
+                'records': self.text_data[cursor:hi],
+                'cursor': cursor,
+                'next_cursor': hi,
+                'total': len(self.text_data)
+            }
+
+        series = self.series(modality)
+        lo, hi = series.index_range(start, end)
+        lo = max(lo, cursor)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        hi = max(lo, hi)
+
+        times = series.times[lo:hi]
+        values = series.values[lo:hi]
+
+        result = {
+            'modality': modality,
+            'columns': series.columns,
+            'cursor': lo,
+            'next_cursor': hi,
+            'total': len(series),
+            'returned': hi - lo
+        }
+
+        if points and downsamplers and len(times) > points:
+            # 逐列降采样，每列保留自己的峰值点
+            downsample = downsamplers[method]
+            result['downsampled'] = method
+            result['series'] = {}
+            for k, name in enumerate(series.columns):
+                idx = downsample(times, values[:, k], points)
+                result['series'][name] = {
+                    'times': times[idx].tolist(),
+                    'values': _nan_to_none(values[idx, k])
+                }
+        else:
+            result['times'] = times.tolist()
+            result['values'] = {name: _nan_to_none(values[:, k]) for k, name in enumerate(series.columns)}
+
+        return result
+
+    def _face_record(self, row):
+        n = len(FACE_EMOTIONS)
+        return {
+            'emotions': {e: v for e, v in zip(FACE_EMOTIONS, row[:n]) if v == v},
+            'micro_expressions': {m: v for m, v in zip(MICRO_EXPRESSIONS, row[n:]) if v == v},
+            'face_detected': True
+        }
+
+    def _voice_record(self, row):
+        record = {'intensity': row[0] if row[0] == row[0] else None}
+        for name, value in zip(['pitch', 'volume', 'speed'], row[1:4]):
+            if value == value:
+                record[name] = {'intensity': value}
+        record['emotion'] = {e: v for e, v in zip(VOICE_EMOTIONS, row[4:]) if v == v}
+        return record
+
+
+def _nan_to_none(column):
+    """NaN 转为 None 以便 JSON 序列化"""
+    return [None if v != v else v for v in column.tolist()]
+
+
+class SessionStore:
+    """有界会话存储：空闲超时（TTL）与 LRU 淘汰，全局内存上限"""
+
+    def __init__(self, ttl=None, max_bytes=None, max_sessions=None, persistence=None):
+        self.ttl = ttl or float(os.environ.get('JPA_SESSION_TTL', 4 * 3600))
+        self.max_bytes = max_bytes or int(os.environ.get('JPA_SESSION_MEMORY_MB', 512)) * 1024 * 1024
+        self.max_sessions = max_sessions or int(os.environ.get('JPA_MAX_SESSIONS', 1000))
+
+        self._sessions = OrderedDict()  # 按最近访问排序
+        self._lock = threading.RLock()
+        self._total_bytes = 0
+        self.evictions = {'ttl': 0, 'lru': 0}
+
+        # 可选的磁盘持久化；内存中已淘汰的会话按需从磁盘恢复
+        self.persistence = persistence
+        self.restores = 0
+
+        # 磁盘上也不存在的会话 ID（避免每帧都查询磁盘），创建会话时清除
+        self._missing = OrderedDict()  # session_id -> 记录时间
+        self.missing_ttl = float(os.environ.get('JPA_SESSION_MISSING_TTL', 60))
+        self.max_missing = 1024
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, session_id):
+        """创建会话"""
+        with self._lock:
+            session = Session(session_id)
+            self._missing.pop(session_id, None)
+            self._sessions[session_id] = session
+            self._total_bytes += session.nbytes()
+            self._enforce_limits(keep=session_id)
+            if self.persistence is not None:
+                self.persistence.record_session(session_id, session.start_time)
+            return session
+
+    def get(self, session_id):
+        """获取会话并刷新访问时间，不存在时返回 None
+
+        内存中没有时从磁盘恢复；磁盘读取在锁外进行，不阻塞其他会话的请求。
+        """
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return self._touch(session_id, session)
+            if not session_id or self.persistence is None or self._known_missing(session_id):
+                return None
+
+        stored = self.persistence.load_session(session_id, MODALITY_COLUMNS)
+
+        with self._lock:
+            # 读取期间其他请求可能已恢复或创建了该会话
+            session = self._sessions.get(session_id)
+            if session is None:
+                if stored is None:
+                    self._remember_missing(session_id)
+                    return None
+                session = self._restore(session_id, stored)
+            return self._touch(session_id, session)
+
+    def append_frame(self, session_id, modality, result, timestamp=None):
+        """写入一帧结果，返回是否写入成功"""
+        session = self.get(session_id)
+        if session is None:
+            return False
+        with self._lock:
+            before = session.nbytes()
+            session.append_frame(modality, result, timestamp)
+            self._account(session_id, session, before)
+            if self.persistence is not None:
+                series = session.series(modality)
+                self.persistence.record_frame(session_id, modality, series.times[-1], series.values[-1])
+            return True
+
+    def append_text(self, session_id, record):
+        """写入一条文本分析结果，返回是否写入成功"""
+        session = self.get(session_id)
+        if session is None:
+            return False
+        with self._lock:
+            before = session.nbytes()
+            session.append_text(record)
+            self._account(session_id, session, before)
+            if self.persistence is not None:
+                self.persistence.record_text(session_id, len(session.text_data) - 1, record)
+            return True
+
+    def remove(self, session_id):
+        """删除会话"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._total_bytes -= session.nbytes()
+            return session
+
+    def memory_usage(self):
+        """内存使用情况"""
+        with self._lock:
+            per_session = {
+                session_id: {
+                    'bytes': session.nbytes(),
+                    'face_frames': len(session.face),
+                    'voice_frames': len(session.voice),
+                    'idle_seconds': time.time() - session.last_access
+                }
+                for session_id, session in self._sessions.items()
+            }
+            return {
+                'sessions': len(self._sessions),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'evictions': dict(self.evictions),
+                'restores': self.restores,
+                'persistence_queue': self.persistence.queue_depth() if self.persistence is not None else 0,
+                'per_session': per_session
+            }
+
+    def _touch(self, session_id, session):
+        session.last_access = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _account(self, session_id, session, before):
+        """写入后更新内存统计；获取后已被淘汰的会话不再计入（写入仍会持久化）"""
+        if self._sessions.get(session_id) is session:
+            self._total_bytes += session.nbytes() - before
+            self._enforce_limits(keep=session_id)
+
+    def _known_missing(self, session_id):
+        """近期确认过磁盘上也不存在"""
+        checked = self._missing.get(session_id)
+        if checked is None:
+            return False
+        if time.time() - checked > self.missing_ttl:
+            del self._missing[session_id]
+            return False
+        return True
+
+    def _remember_missing(self, session_id):
+        self._missing[session_id] = time.time()
+        self._missing.move_to_end(session_id)
+        while len(self._missing) > self.max_missing:
+            self._missing.popitem(last=False)
+
+    def _restore(self, session_id, stored):
+        """将从磁盘读取的会话放回内存"""
+        session = Session(session_id)
+        session.start_time = stored['start_time']
+        for modality, (times, values) in stored['series'].items():
+            setattr(session, modality, ColumnarSeries.from_arrays(MODALITY_COLUMNS[modality], times, values))
+        for record in stored['text_data']:
+            session.append_text(record)
+
+        self._sessions[session_id] = session
+        self._total_bytes += session.nbytes()
+        self.restores += 1
+        self._enforce_limits(keep=session_id)
+
+        return session
+
+    def _evict_expired(self):
+        """淘汰空闲超时的会话（从最久未访问处开始，遇到未超时即停止）"""
+        deadline = time.time() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_access >= deadline:
+                break
+            self._evict(session_id, 'ttl')
+
+    def _enforce_limits(self, keep=None):
+        """超出数量或内存上限时按 LRU 淘汰"""
+        self._evict_expired()
+
+        while len(self._sessions) > self.max_sessions:
+            if not self._evict_oldest(keep):
+                break
+
+        while self._total_bytes > self.max_bytes:
+            if not self._evict_oldest(keep):
+                break
+
+    def _evict_oldest(self, keep):
+        """淘汰最久未访问的会话，返回是否有会话被淘汰"""
+        for session_id in self._sessions:
+            if session_id != keep:
+                self._evict(session_id, 'lru')
+                return True
+        return False
+
+    def _evict(self, session_id, reason):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session.nbytes()
+            self.evictions[reason] += 1
@@ -0,0 +1,194 @@
+import os
+import numpy as np
+
+from modules.model_store import ModelStore, attach_mmap_weights
+
+
+# 基线模型（蒸馏等其他模型通过 JPA_TEXT_MODEL 指定已微调的检查点）
+DEFAULT_TEXT_MODEL = "uer/chinese_roberta_L-12_H-768"
+
+TEXT_BACKENDS = ['pytorch', 'quantized', 'onnx']
+
+
+def create_text_backend(backend=None, model_name=None):
+    """根据配置创建文本情感模型后端"""
+    backend = backend or os.environ.get('JPA_TEXT_BACKEND', 'pytorch')
+    model_name = model_name or os.environ.get('JPA_TEXT_MODEL') or DEFAULT_TEXT_MODEL
+
+    if backend == 'pytorch':
+        return PyTorchTextBackend(model_name)
+    elif backend == 'quantized':
+        return QuantizedTextBackend(model_name)
+    elif backend == 'onnx':
+        return OnnxTextBackend(model_name)
+
+    raise ValueError(f"未知的文本模型后端: {backend}，可选: {', '.join(TEXT_BACKENDS)}")
+
+
+def load_tokenizer(model_name):
+    """加载分词器"""
+    from transformers import AutoTokenizer
+
+    source, kwargs = _pretrained_source(model_name)
+    return AutoTokenizer.from_pretrained(source, **kwargs)
+
+
+def load_text_model(model_name):
+    """加载 PyTorch 序列分类模型
+
+    low_cpu_mem_usage 跳过随机初始化、逐个张量载入权重，峰值内存约为一份权重；
+    本地仓库中的 safetensors 权重随后替换为内存映射张量，多个工作进程共享同一物理页。
+    """
+    from transformers import AutoModelForSequenceClassification
+
+    source, kwargs = _pretrained_source(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(source, low_cpu_mem_usage=True, **kwargs)
+
+    weights_path = os.path.join(source, 'model.safetensors')
+    if kwargs and os.path.exists(weights_path):
+        attach_mmap_weights(model, weights_path)
+
+    model.eval()
+    return model
+
+
+def export_onnx(model, tokenizer, onnx_path):
+    """导出 ONNX 模型（动态 batch 与序列长度）"""
+    import torch
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+
+    sample = tokenizer(['示例'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+
+    torch.onnx.export(
+        model,
+        tuple(sample[name] for name in input_names),
+        onnx_path,
+        input_names=input_names,
+        output_names=['logits'],
+        dynamic_axes=dynamic_axes,
+        opset_version=14
+    )
+
+
+def _pretrained_source(model_name):
+    """本地仓库中有该模型时从仓库离线加载，否则从 Hugging Face 加载"""
+    store = ModelStore()
+    if store.has(model_name):
+        return store.path(model_name), {'local_files_only': True, 'use_safetensors': True}
+    return model_name, {}
+
+
+class TextBackend:
+    """文本情感模型后端基类：分词器与 logits -> 标签转换"""
+
+    def __init__(self, model_name, max_length=128):
+        self.model_name = model_name
+        self.max_length = max_length
+        self.tokenizer = load_tokenizer(model_name)
+
+    def _to_results(self, logits):
+        """将 logits 转换为 [{'label', 'score'}] 列表"""
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        indices = probs.argmax(axis=1)
+        return [
+            {'label': self.id2label[int(i)], 'score': float(probs[row, i])}
+            for row, i in enumerate(indices)
+        ]
+
+
+class PyTorchTextBackend(TextBackend):
+    """float32 PyTorch 推理后端（与 transformers pipeline 输出格式一致）"""
+
+    def __init__(self, model_name, max_length=128):
+        import torch
+
+        super().__init__(model_name, max_length)
+        self.torch = torch
+        self.model = load_text_model(model_name)
+        self.id2label = self.model.config.id2label
+
+    def __call__(self, texts):
+        """对单条或多条文本进行情感分类"""
+        if isinstance(texts, str):
+            texts = [texts]
+
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors='pt'
+        )
+
+        with self.torch.inference_mode():
+            logits = self.model(**inputs).logits.numpy()
+
+        return self._to_results(logits)
+
+
+class QuantizedTextBackend(PyTorchTextBackend):
+    """动态 int8 量化后端（量化所有 Linear 层）"""
+
+    def __init__(self, model_name, max_length=128):
+        super().__init__(model_name, max_length)
+
+        self.model = self.torch.quantization.quantize_dynamic(
+            self.model,
+            {self.torch.nn.Linear},
+            dtype=self.torch.qint8
+        )
+
+
+class OnnxTextBackend(TextBackend):
+    """ONNX Runtime 推理后端（没有导出文件时先导出模型）"""
+
+    def __init__(self, model_name, max_length=128, export_dir='models/onnx'):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("ONNX 后端需要安装 onnxruntime")
+        from transformers import AutoConfig
+
+        super().__init__(model_name, max_length)
+
+        source, kwargs = _pretrained_source(model_name)
+        self.id2label = AutoConfig.from_pretrained(source, **kwargs).id2label
+
+        # 仓库中已有导出文件时直接使用，仅在需要导出时加载 PyTorch 模型
+        store = ModelStore()
+        onnx_id = f'{model_name}:onnx'
+        if store.has(onnx_id):
+            onnx_path = os.path.join(store.path(onnx_id), 'model.onnx')
+        else:
+            onnx_path = os.path.join(export_dir, model_name.replace('/', '__') + '.onnx')
+        if not os.path.exists(onnx_path):
+            export_onnx(load_text_model(model_name), self.tokenizer, onnx_path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, texts):
+        """对单条或多条文本进行情感分类"""
+        if isinstance(texts, str):
+            texts = [texts]
+
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors='np'
+        )
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+
+        logits = self.session.run(None, feed)[0]
+        return self._to_results(logits)
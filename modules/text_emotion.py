@@ -1,15 +1,27 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import numpy as np
 import jieba
 from collections import Counter
+import os
+import re
+
+from modules.text_backends import create_text_backend
+from modules.micro_batcher import MicroBatcher
+from modules.metrics import metrics
 
 
 class TextEmotionAnalyzer:
-    def __init__(self):
-        # 初始化情感分析模型
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="uer/chinese_roberta_L-12_H-768"
+    def __init__(self, backend=None, model_name=None):
+        # 情感分析模型在首次分类时加载（后端由参数或 JPA_TEXT_BACKEND / JPA_TEXT_MODEL 配置），
+        # 只做分词与词典分析的实例（如推理交给工作进程的 Web 进程）不加载模型
+        self._backend = (backend, model_name)
+        self._sentiment_analyzer = None
+
+        # 跨请求微批处理：并发请求合并为一次前向计算
+        self.batcher = MicroBatcher(
+            self._classify_batch,
+            max_batch_size=int(os.environ.get('JPA_TEXT_BATCH_SIZE', 16)),
+            max_wait_ms=float(os.environ.get('JPA_TEXT_BATCH_WAIT_MS', 5)),
+            name='text-batcher'
         )
 
         # 加载中文分词
@@ -23,16 +35,29 @@ class TextEmotionAnalyzer:
         # 分句
         sentences = self._split_sentences(text)
 
-        # 逐句分析
+        # 逐句分析（经微批处理调度）
+        sentences = [s for s in sentences if s.strip()]
+        return self._build_semantics(text, sentences, self.classify(sentences))
+
+    def analyze_semantics_batch(self, texts):
+        """批量深度语义分析：所有文本的句子合并后一起分类，批次由微批处理调度器填满"""
+        sentence_lists = [[s for s in self._split_sentences(text) if s.strip()] for text in texts]
+        emotions = iter(self.classify([s for sentences in sentence_lists for s in sentences]))
+
+        return [
+            self._build_semantics(text, sentences, [next(emotions) for _ in sentences])
+            for text, sentences in zip(texts, sentence_lists)
+        ]
+
+    def _build_semantics(self, text, sentences, emotions):
+        """由逐句分类结果构建语义分析结果"""
         sentence_emotions = []
-        for sentence in sentences:
-            if sentence.strip():
-                emotion = self.sentiment_analyzer(sentence)[0]
-                sentence_emotions.append({
-                    'text': sentence,
-                    'label': emotion['label'],
-                    'score': emotion['score']
-                })
+        for sentence, emotion in zip(sentences, emotions):
+            sentence_emotions.append({
+                'text': sentence,
+                'label': emotion['label'],
+                'score': emotion['score']
+            })
 
         # 整体情感分析
         overall_emotion = self._analyze_overall_emotion(sentence_emotions)
@@ -47,6 +72,23 @@ class TextEmotionAnalyzer:
             'semantic_structure': self._analyze_semantic_structure(text)
         }
 
+    @property
+    def sentiment_analyzer(self):
+        """情感分类后端（首次使用时加载，仅由微批处理线程调用）"""
+        if self._sentiment_analyzer is None:
+            self._sentiment_analyzer = create_text_backend(*self._backend)
+        return self._sentiment_analyzer
+
+    def classify(self, texts):
+        """对多条文本进行情感分类，返回 [{'label', 'score'}]"""
+        return self.batcher.map(texts)
+
+    def _classify_batch(self, texts):
+        """一次批量前向计算（记录模型调用与耗时）"""
+        metrics.increment('model_calls', model='transformer')
+        with metrics.timer('classify', 'text'):
+            return self.sentiment_analyzer(texts)
+
     def extract_keyword_emotions(self, text):
         """提取关键词情感极性"""
         # 分词
@@ -178,7 +220,7 @@ class TextEmotionAnalyzer:
             return self.emotion_lexicon[word]
         else:
             # 使用模型预测
-            result = self.sentiment_analyzer(word)[0]
+            result = self.classify([word])[0]
             return {
                 'polarity': 'positive' if result['label'] == 'POSITIVE' else 'negative',
                 'intensity': result['score']
@@ -224,3 +266,128 @@ class TextEmotionAnalyzer:
         """计算期待性"""
         # 基于未来时态和期望词汇
         return 0.5  # 示例值
+
+
+class IncrementalTextAnalyzer:
+    """会话级增量文本分析（仅对新增句子打分）"""
+
+    def __init__(self, text_analyzer, classify=None, history=None):
+        self.text_analyzer = text_analyzer
+        self.classify = classify or text_analyzer.classify  # 句子分类（可交给推理工作进程）
+
+        # 尚未以句末标点结束的文本片段
+        self.pending = ''
+
+        # 已分析的句子
+        self.sentence_emotions = []
+
+        # 运行统计量
+        self.label_counts = Counter()
+        self.score_sum = 0.0
+        self.score_sq_sum = 0.0
+
+        # 会话从磁盘恢复时按已保存的文本记录重建统计量，整体情感与一致性仍覆盖全部句子
+        for record in history or []:
+            self._accumulate(record.get('data', []))
+
+    def append(self, text, final=False):
+        """追加文本，返回新增句子的分析结果与更新后的情感向量"""
+        self.pending += text
+
+        # 只有以句末标点结束的部分才视为完整句子
+        sentences = self.text_analyzer._split_sentences(self.pending)
+        if final or re.search('[。！？；]\\s*$', self.pending):
+            self.pending = ''
+        elif sentences:
+            self.pending = sentences.pop()
+
+        new_emotions = self._score_sentences(sentences)
+
+        return {
+            'new_sentences': new_emotions,
+            'overall': self._analyze_overall_emotion(),
+            'consistency': self._analyze_consistency(),
+            'sentence_count': len(self.sentence_emotions),
+            'emotion_vector': self.build_emotion_vector()
+        }
+
+    def flush(self):
+        """将剩余片段作为最后一句处理"""
+        return self.append('', final=True)
+
+    def build_emotion_vector(self):
+        """基于运行统计量构建情感向量"""
+        overall = self._analyze_overall_emotion()
+        n = len(self.sentence_emotions)
+
+        valence = overall['score'] if overall['label'] == 'POSITIVE' else -overall['score']
+        arousal = self.score_sum / n if n else 0.5
+
+        return np.array([
+            valence,
+            arousal,
+            self.text_analyzer._calculate_dominance(None),
+            self._analyze_consistency(),
+            self.text_analyzer._calculate_expectancy(None)
+        ])
+
+    def _score_sentences(self, sentences):
+        """批量分析新增句子并更新统计量"""
+        sentences = [s for s in sentences if s.strip()]
+        if not sentences:
+            return []
+
+        results = self.classify(sentences)
+
+        new_emotions = [
+            {
+                'text': sentence,
+                'label': emotion['label'],
+                'score': emotion['score']
+            }
+            for sentence, emotion in zip(sentences, results)
+        ]
+        self._accumulate(new_emotions)
+        return new_emotions
+
+    def _accumulate(self, emotions):
+        """将已分析的句子计入运行统计量"""
+        for item in emotions:
+            self.label_counts[item['label']] += 1
+            self.score_sum += item['score']
+            self.score_sq_sum += item['score'] ** 2
+
+        self.sentence_emotions.extend(emotions)
+
+    def _analyze_overall_emotion(self):
+        """分析整体情感（与 TextEmotionAnalyzer 规则一致）"""
+        n = len(self.sentence_emotions)
+        if not n:
+            return {'label': 'NEUTRAL', 'score': 0.5}
+
+        positive_count = self.label_counts['POSITIVE']
+        negative_count = self.label_counts['NEGATIVE']
+        avg_score = self.score_sum / n
+
+        if positive_count > negative_count:
+            return {'label': 'POSITIVE', 'score': avg_score}
+        elif negative_count > positive_count:
+            return {'label': 'NEGATIVE', 'score': avg_score}
+        else:
+            return {'label': 'NEUTRAL', 'score': 0.5}
+
+    def _analyze_consistency(self):
+        """分析情感一致性（与 TextEmotionAnalyzer 规则一致）"""
+        n = len(self.sentence_emotions)
+        if n < 2:
+            return 1.0
+
+        most_common_ratio = self.label_counts.most_common(1)[0][1] / n
+
+        # 由一阶、二阶矩计算标准差
+        mean = self.score_sum / n
+        score_std = np.sqrt(max(0.0, self.score_sq_sum / n - mean ** 2))
+
+        consistency = most_common_ratio * (1 - score_std)
+
+        return min(1.0, max(0.0, consistency))
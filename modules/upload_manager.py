@@ -0,0 +1,327 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+from modules.av_analyzer import summarize_face_frames
+
+
+UPLOAD_KINDS = ['video', 'audio']
+
+# 流式写盘的读取块大小
+COPY_BUFFER = 1024 * 1024
+
+
+class UploadManager:
+    """分块可续传上传：init / append / finalize
+
+    分块直接追加写入磁盘（内存占用恒定），已接收字节数以文件大小为准，网络中断后
+    客户端查询状态即可从断点续传。视频在连续数据累计到一定量后即在后台解码已到达的
+    前段并逐帧分析，结果在上传完成前就可查询。
+    """
+
+    def __init__(self, root=None, chunk_size=None, analyze_every=None, ttl=None, max_workers=2):
+        self.root = root or os.environ.get('JPA_UPLOAD_DIR', os.path.join('uploads', 'chunked'))
+        self.chunk_size = chunk_size or int(os.environ.get('JPA_UPLOAD_CHUNK_MB', 8)) * 1024 * 1024
+        self.analyze_every = analyze_every or int(os.environ.get('JPA_UPLOAD_ANALYZE_MB', 4)) * 1024 * 1024
+        self.ttl = ttl or float(os.environ.get('JPA_UPLOAD_TTL', 24 * 3600))
+        os.makedirs(self.root, exist_ok=True)
+
+        self.uploads = {}  # upload_id -> 状态（元数据落盘，重启后按需恢复）
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-analysis')
+
+        self.analyze_frame = None  # 单帧分析函数，由应用注入
+        self.frame_step = 5  # 与 FaceEmotionAnalyzer.analyze_video 相同的抽帧间隔
+
+    def init(self, filename, size, kind):
+        """创建上传，返回状态"""
+        if kind not in UPLOAD_KINDS:
+            raise ValueError(f'不支持的上传类型: {kind}')
+
+        self._cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        meta = {
+            'upload_id': upload_id,
+            'filename': secure_filename(filename or 'upload') or 'upload',
+            'size': int(size),
+            'kind': kind,
+            'created_at': datetime.now().isoformat(),
+            'finalized': False
+        }
+        state = self._new_state(meta)
+        open(self._data_path(upload_id), 'wb').close()
+        self._save_meta(meta)
+
+        with self._lock:
+            self.uploads[upload_id] = state
+        return self.status(upload_id)
+
+    def get(self, upload_id):
+        """获取上传状态对象，不存在时返回 None"""
+        upload_id = os.path.basename(upload_id)
+        with self._lock:
+            state = self.uploads.get(upload_id)
+            if state is None:
+                meta = self._load_meta(upload_id)
+                if meta is None:
+                    return None
+                state = self._new_state(meta)
+                self.uploads[upload_id] = state
+            return state
+
+    def status(self, upload_id):
+        """上传与分析进度"""
+        state = self.get(upload_id)
+        if state is None:
+            return None
+        meta = state['meta']
+        return {
+            'upload_id': meta['upload_id'],
+            'kind': meta['kind'],
+            'size': meta['size'],
+            'received': self.received(upload_id),
+            'chunk_size': self.chunk_size,
+            'finalized': meta['finalized'],
+            'analysis': {
+                'frames_analyzed': len(state['frames']),
+                'next_frame': state['next_frame'],
+                'running': state['running'],
+                'early': state['early_analysis']
+            }
+        }
+
+    def received(self, upload_id):
+        """已连续接收的字节数"""
+        try:
+            return os.path.getsize(self._data_path(upload_id))
+        except OSError:
+            return 0
+
+    def append(self, upload_id, offset, stream):
+        """从 offset 处追加一个分块，返回已接收字节数
+
+        offset 必须等于当前已接收字节数（否则抛出 UploadOffsetError，携带服务端进度供客户端续传）。
+        """
+        state = self.get(upload_id)
+        if state is None:
+            raise KeyError(upload_id)
+
+        with state['lock']:
+            if state['meta']['finalized']:
+                raise ValueError('上传已完成')
+
+            received = self.received(upload_id)
+            if offset != received:
+                raise UploadOffsetError(received)
+
+            limit = state['meta']['size'] - received
+            with open(self._data_path(upload_id), 'ab') as f:
+                while limit > 0:
+                    chunk = stream.read(min(COPY_BUFFER, limit))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    limit -= len(chunk)
+
+            received = self.received(upload_id)
+
+        # 新到达的数据足够多时，后台分析已到达的前段
+        if state['meta']['kind'] == 'video' and state['early_analysis'] \
+                and received - state['analyzed_bytes'] >= self.analyze_every:
+            self._schedule_analysis(upload_id)
+
+        return received
+
+    def finalize(self, upload_id):
+        """完成上传：校验大小后分析剩余部分，返回完整分析结果（在调用线程中执行）"""
+        state = self.get(upload_id)
+        if state is None:
+            raise KeyError(upload_id)
+
+        received = self.received(upload_id)
+        if received != state['meta']['size']:
+            raise UploadOffsetError(received)
+
+        with state['lock']:
+            state['meta']['finalized'] = True
+            self._save_meta(state['meta'])
+
+        if state['meta']['kind'] == 'video':
+            self._analyze_available(upload_id, final=True)
+            return self._summarize_video(state)
+        return None
+
+    def results(self, upload_id, cursor=0, limit=None):
+        """已分析的帧结果（游标分页）"""
+        state = self.get(upload_id)
+        if state is None:
+            return None
+        frames = state['frames']
+        end = len(frames) if limit is None else min(len(frames), cursor + limit)
+        return {
+            'frames': frames[cursor:end],
+            'next_cursor': end,
+            'has_more': end < len(frames),
+            'running': state['running']
+        }
+
+    def data_path(self, upload_id):
+        return self._data_path(os.path.basename(upload_id))
+
+    def remove_data(self, upload_id):
+        """删除上传数据文件（保留元数据）"""
+        try:
+            os.remove(self.data_path(upload_id))
+        except OSError:
+            pass
+
+    def _schedule_analysis(self, upload_id):
+        """合并触发：同一上传同时最多一个分析任务"""
+        state = self.get(upload_id)
+        with state['lock']:
+            if state['running'] or self.analyze_frame is None:
+                return
+            state['running'] = True
+        self.executor.submit(self._run_analysis, upload_id)
+
+    def _run_analysis(self, upload_id):
+        try:
+            self._analyze_available(upload_id, final=False)
+        except Exception as e:
+            print(f"Upload analysis error: {e}")
+        finally:
+            state = self.get(upload_id)
+            with state['lock']:
+                state['running'] = False
+
+    def _analyze_available(self, upload_id, final):
+        """解码已到达部分中尚未分析的帧
+
+        未完成时保留最后一帧不分析（可能只到达了一部分数据）；MP4 等索引在文件尾的
+        容器无法提前解码，首次尝试失败后即停止该上传的提前分析，在 finalize 时一次完成。
+        """
+        import cv2
+
+        state = self.get(upload_id)
+        with state['analysis_lock']:
+            received = self.received(upload_id)
+            cap = cv2.VideoCapture(self._data_path(upload_id))
+            if not cap.isOpened():
+                cap.release()
+                if not final:
+                    self._stop_early_analysis(state, received)
+                return
+
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            frame_index = state['next_frame']
+            if frame_index:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+            pending = None  # 最近读到、尚未确认完整的帧
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if pending is not None:
+                    self._analyze_frame(state, *pending, fps)
+                pending = (frame_index, frame)
+                frame_index += 1
+
+            if pending is not None:
+                if final:
+                    self._analyze_frame(state, *pending, fps)
+                    frame_index = pending[0] + 1
+                else:
+                    frame_index = pending[0]
+            cap.release()
+
+            if not final and pending is None and not state['next_frame']:
+                # 容器可打开但尚无可解码的帧（同样是索引未到达）
+                self._stop_early_analysis(state, received)
+                return
+
+            state['next_frame'] = frame_index
+            state['total_frames'] = frame_index
+            state['analyzed_bytes'] = received
+
+    def _stop_early_analysis(self, state, received):
+        """记录提前解码失败，之后的分块不再触发分析（避免每个分块都重新探测整个文件）"""
+        state['early_analysis'] = False
+        state['analyzed_bytes'] = received
+        print(f"Upload {state['meta']['upload_id']}: container not decodable before completion, "
+              f"analyzing at finalize")
+
+    def _analyze_frame(self, state, frame_index, frame, fps):
+        if frame_index % self.frame_step != 0 or self.analyze_frame is None:
+            return
+        result = self.analyze_frame(frame, state['meta']['upload_id'])
+        if result:
+            state['frames'].append({
+                'frame': frame_index,
+                'timestamp': frame_index / fps,
+                'data': result
+            })
+
+    def _summarize_video(self, state):
+        """汇总为与 analyze_video 相同的结构"""
+        return summarize_face_frames(state['frames'], state['total_frames'])
+
+    def _new_state(self, meta):
+        return {
+            'meta': meta,
+            'lock': threading.Lock(),
+            'analysis_lock': threading.Lock(),
+            'frames': [],
+            'next_frame': 0,
+            'total_frames': 0,
+            'analyzed_bytes': 0,
+            'early_analysis': True,  # 已到达部分可否提前解码，首次失败后置为 False
+            'running': False
+        }
+
+    def _cleanup_expired(self):
+        """删除超过保留时间的上传"""
+        deadline = time.time() - self.ttl
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    with self._lock:
+                        self.uploads.pop(name.split('.')[0], None)
+            except OSError:
+                pass
+
+    def _save_meta(self, meta):
+        path = self._meta_path(meta['upload_id'])
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def _load_meta(self, upload_id):
+        try:
+            with open(self._meta_path(upload_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.root, f'{upload_id}.json')
+
+
+class UploadOffsetError(Exception):
+    """分块偏移与服务端已接收字节数不一致"""
+
+    def __init__(self, received):
+        super().__init__(f'偏移不匹配，服务端已接收 {received} 字节')
+        self.received = received
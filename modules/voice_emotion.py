@@ -3,6 +3,8 @@ import numpy as np
 from scipy import signal
 import io
 
+from modules.metrics import metrics
+
 
 class VoiceEmotionAnalyzer:
     def __init__(self):
@@ -21,24 +23,30 @@ class VoiceEmotionAnalyzer:
     def extract_features(self, audio_file):
         """提取语音特征"""
         # 读取音频
-        audio_data = audio_file.read()
-        y, sr = librosa.load(io.BytesIO(audio_data), sr=self.sample_rate)
+        with metrics.timer('decode', 'voice'):
+            audio_data = audio_file.read()
+            y, sr = librosa.load(io.BytesIO(audio_data), sr=self.sample_rate)
+
+        return self.extract_features_from_samples(y, sr)
 
-        # 提取MFCC特征
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    def extract_features_from_samples(self, y, sr):
+        """从已解码的单声道浮点采样提取语音特征"""
+        with metrics.timer('features', 'voice'):
+            # 提取MFCC特征
+            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
 
-        # 提取音调特征
-        pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+            # 提取音调特征
+            pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
 
-        # 提取节奏特征
-        tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
+            # 提取节奏特征
+            tempo, beats = librosa.beat.beat_track(y=y, sr=sr)
 
-        # 提取能量特征
-        energy = np.sum(y ** 2) / len(y)
+            # 提取能量特征
+            energy = np.sum(y ** 2) / len(y)
 
-        # 提取频谱特征
-        spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
+            # 提取频谱特征
+            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)
+            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
 
         return {
             'mfccs': mfccs,
@@ -61,7 +69,8 @@ class VoiceEmotionAnalyzer:
         speed_analysis = self._analyze_speed(features['tempo'])
 
         # 综合判断情绪
-        emotion = self._predict_emotion(features)
+        with metrics.timer('classify', 'voice'):
+            emotion = self._predict_emotion(features)
 
         return {
             'pitch': pitch_analysis,
@@ -84,6 +93,22 @@ class VoiceEmotionAnalyzer:
 
         return min(100, max(0, intensity * 100))
 
+    def analyze_samples(self, samples):
+        """分析一段单声道 float32 采样（音画联合分析的语音窗口；经共享内存传入时为字节）"""
+        if isinstance(samples, (bytes, bytearray)):
+            samples = np.frombuffer(samples, dtype=np.float32)
+
+        features = self.extract_features_from_samples(np.asarray(samples, dtype=np.float32), self.sample_rate)
+        emotion_metrics = self.analyze_emotions(features)
+
+        return {
+            'pitch': emotion_metrics['pitch'],
+            'volume': emotion_metrics['volume'],
+            'speed': emotion_metrics['speed'],
+            'emotion': emotion_metrics['emotion'],
+            'intensity': self.calculate_intensity(emotion_metrics)
+        }
+
     def _extract_pitch_features(self, pitches, magnitudes):
         """提取音调特征"""
         pitch_values = []
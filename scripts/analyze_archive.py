@@ -0,0 +1,451 @@
+"""录像/录音档案离线批量分析
+
+遍历目录或清单中的视频与音频文件，在多个工作进程中并行分析（视频：逐帧面部情绪与微表情；
+音频：语音情感），每个文件完成后立即记录到检查点，中断后重新运行会跳过已完成的文件。
+逐帧结果按文件写入 frames/ 下的列式分片（可作为一个数据集读取），逐文件汇总写入 files 表。
+
+用法:
+    python scripts/analyze_archive.py /data/recordings --output results/archive --workers 8
+    python scripts/analyze_archive.py /data/recordings --output results/archive --worker-memory-mb 2500
+    python scripts/analyze_archive.py --manifest files.txt --output results/archive --format arrow
+    python scripts/analyze_archive.py /data/recordings --output results/archive --retry-failed
+需要 pyarrow（pip install pyarrow）。
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv', '.wmv'}
+AUDIO_EXTENSIONS = {'.wav', '.mp3', '.flac', '.m4a', '.ogg', '.aac'}
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+
+# 每个工作进程加载各类分析器后的常驻内存估计（MB），用于按可用内存确定默认进程数
+WORKER_MEMORY_MB = {'video': 1500, 'audio': 400}
+
+# 工作进程内的分析器（首次处理对应类型的文件时创建，每个进程只加载一次模型）
+_worker = {}
+
+
+def discover(inputs, manifest=None):
+    """收集待分析文件：目录递归遍历，清单每行一个路径（# 开头为注释）"""
+    paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for root, dirs, files in os.walk(entry):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files))
+        else:
+            paths.append(entry)
+
+    if manifest:
+        with open(manifest, encoding='utf-8') as f:
+            paths.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+
+    tasks = []
+    seen = set()
+    for path in paths:
+        path = os.path.abspath(path)
+        kind = media_kind(path)
+        if kind is None or path in seen or not os.path.isfile(path):
+            continue
+        seen.add(path)
+        stat = os.stat(path)
+        tasks.append({'path': path, 'kind': kind, 'size': stat.st_size, 'key': file_key(path, stat)})
+    return tasks
+
+
+def media_kind(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in VIDEO_EXTENSIONS:
+        return 'video'
+    if extension in AUDIO_EXTENSIONS:
+        return 'audio'
+    return None
+
+
+def file_key(path, stat):
+    """路径 + 大小 + 修改时间的摘要：文件被替换后会重新分析"""
+    identity = f'{path}|{stat.st_size}|{int(stat.st_mtime)}'
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+
+
+def load_checkpoint(output):
+    """读取检查点，返回 key -> 最后一条记录（末尾不完整的行忽略）"""
+    records = {}
+    path = os.path.join(output, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['key']] = record
+    return records
+
+
+def write_table(columns, path, fmt):
+    """写出列式表（先写临时文件再替换，中断时不会留下损坏的分片）"""
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    tmp_path = path + '.tmp'
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_path, compression='zstd')
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def available_memory_mb():
+    """系统可用内存（MB），无法读取时返回 None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def default_workers(tasks, worker_memory_mb=None):
+    """默认进程数：不超过核心数，且各进程加载模型后的内存总和不超过可用内存"""
+    cpus = os.cpu_count() or 1
+    if worker_memory_mb is None:
+        worker_memory_mb = sum(WORKER_MEMORY_MB[kind] for kind in {task['kind'] for task in tasks})
+    available = available_memory_mb()
+    if available is None or not worker_memory_mb:
+        return cpus
+    return max(1, min(cpus, int(available // worker_memory_mb)))
+
+
+def _init_worker(threads, frame_step, output, fmt):
+    """工作进程初始化：按分到的核心数限制框架线程池（模型在首次用到时加载）"""
+    from modules.resource_manager import ResourceManager
+
+    resources = ResourceManager()
+    resources.configure_environment('face', threads)
+
+    _worker.update({
+        'resources': resources,
+        'threads': threads,
+        'frame_step': frame_step,
+        'output': output,
+        'format': fmt
+    })
+
+
+def _analyzer(name):
+    """获取工作进程内的分析器，只处理音频的进程不加载面部模型，反之亦然"""
+    if name not in _worker:
+        if name == 'evaluator':
+            from modules.psychological_evaluator import PsychologicalEvaluator
+            _worker['evaluator'] = PsychologicalEvaluator()
+            return _worker['evaluator']
+
+        if name == 'face':
+            from modules.face_emotion import FaceEmotionAnalyzer
+            _worker['face'] = FaceEmotionAnalyzer()
+        else:
+            from modules.voice_emotion import VoiceEmotionAnalyzer
+            _worker['voice'] = VoiceEmotionAnalyzer()
+        _worker['resources'].configure_frameworks('face', _worker['threads'])
+    return _worker[name]
+
+
+def _task_record(task):
+    return {'key': task['key'], 'path': task['path'], 'kind': task['kind'], 'size': task['size']}
+
+
+def _process_file(task):
+    """分析单个文件，返回检查点记录（异常记录为 failed，不中断整个任务）"""
+    started = time.perf_counter()
+    record = _task_record(task)
+    try:
+        if task['kind'] == 'video':
+            record.update(_analyze_video(task))
+        else:
+            record.update(_analyze_audio(task))
+        record['status'] = 'done'
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = str(e)
+    record['processing_s'] = time.perf_counter() - started
+    return record
+
+
+def _analyze_video(task):
+    """逐帧分析视频，逐帧结果写入分片，返回文件级汇总"""
+    import cv2
+
+    from modules.session_store import FACE_EMOTIONS, MODALITY_COLUMNS, frame_row
+
+    analyzer = _analyzer('face')
+    step = _worker['frame_step']
+
+    # 同一进程依次处理多个文件，微表情与峰值检测的历史不能跨文件
+    analyzer.micro_expression_buffer.clear()
+    analyzer.emotion_history.clear()
+
+    cap = cv2.VideoCapture(task['path'])
+    if not cap.isOpened():
+        raise ValueError('无法打开视频')
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+
+    frames, timestamps, rows, intensities = [], [], [], []
+    frame_count = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % step == 0:
+            result = analyzer.analyze_realtime(frame)
+            if result:
+                frames.append(frame_count)
+                timestamps.append(frame_count / fps)
+                rows.append(frame_row('face', result))
+                intensities.append(analyzer.calculate_intensity(result['emotions']))
+        frame_count += 1
+    cap.release()
+
+    summary = {'duration_s': frame_count / fps, 'frames_total': frame_count, 'frames_analyzed': len(rows)}
+    if not rows:
+        return summary
+
+    values = np.asarray(rows, dtype=np.float32)
+    columns = {
+        'key': [task['key']] * len(rows),
+        'frame': np.asarray(frames, dtype=np.int32),
+        'timestamp': np.asarray(timestamps, dtype=np.float64),
+        **{name: values[:, i] for i, name in enumerate(MODALITY_COLUMNS['face'])},
+        'intensity': np.asarray(intensities, dtype=np.float32)
+    }
+    frames_file = os.path.join('frames', task['key'] + FORMATS[_worker['format']])
+    write_table(columns, os.path.join(_worker['output'], frames_file), _worker['format'])
+
+    # 文件级汇总：平均情绪、强情绪时刻数与评估雷达
+    average = {emotion: float(np.nanmean(values[:, i])) for i, emotion in enumerate(FACE_EMOTIONS)}
+    face_data = {'intensity': float(np.mean(intensities)), 'data': {'emotions': average}}
+    emotion_values = values[:, :len(FACE_EMOTIONS)]
+    non_neutral = [i for i, emotion in enumerate(FACE_EMOTIONS) if emotion != 'neutral']
+
+    summary.update({
+        'frames_file': frames_file,
+        'face_intensity_mean': face_data['intensity'],
+        'face_intensity_max': float(np.max(intensities)),
+        'key_moments': int(np.sum(np.nan_to_num(emotion_values[:, non_neutral]) > 0.7)),
+        **{f'face_{emotion}': value for emotion, value in average.items()},
+        **_radar(face_data, None)
+    })
+    return summary
+
+
+def _analyze_audio(task):
+    """整段音频的语音情感，返回文件级汇总"""
+    from modules.session_store import MODALITY_COLUMNS, frame_row
+
+    analyzer = _analyzer('voice')
+    with open(task['path'], 'rb') as f:
+        features = analyzer.extract_features(f)
+    emotion_metrics = analyzer.analyze_emotions(features)
+    intensity = analyzer.calculate_intensity(emotion_metrics)
+
+    # 与会话存储的语音列一致：强度、语调/音量/语速强度与各情绪概率
+    voice_data = dict(emotion_metrics, intensity=intensity)
+    row = frame_row('voice', voice_data)
+    return {
+        **{f'voice_{name}': float(value) for name, value in zip(MODALITY_COLUMNS['voice'], row)},
+        **_radar(None, {'intensity': intensity, 'data': emotion_metrics})
+    }
+
+
+def _radar(face_data, voice_data):
+    """评估器雷达图各维度（radar_ 前缀）"""
+    evaluator = _analyzer('evaluator')
+    radar = evaluator.build_psychological_radar(evaluator.integrate_multimodal_data(face_data, voice_data, None))
+    return {f'radar_{dimension}': float(value) for dimension, value in radar.items()}
+
+
+def analyze_files(tasks, workers, initargs):
+    """在进程池中分析文件，按完成顺序产出检查点记录
+
+    同时在途的文件不超过进程数：工作进程异常退出（内存不足被杀、原生库崩溃）时进程池整体失效，
+    只将在途的文件记为 failed，随后新建进程池继续处理其余文件。
+    """
+    context = multiprocessing.get_context('spawn')
+    remaining = iter(tasks)
+    while True:
+        first = next(remaining, None)
+        if first is None:
+            return
+        remaining = itertools.chain([first], remaining)
+
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            running = {}
+            broken = False
+            while True:
+                # 补足在途文件；提交时才发现进程池失效的文件放回队首，由新进程池处理
+                while not broken and len(running) < workers:
+                    task = next(remaining, None)
+                    if task is None:
+                        break
+                    try:
+                        running[executor.submit(_process_file, task)] = task
+                    except BrokenProcessPool:
+                        broken = True
+                        remaining = itertools.chain([task], remaining)
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool as e:
+                        broken = True
+                        record = dict(_task_record(task), status='failed', error=f'工作进程异常退出: {e}')
+                    yield record
+
+
+def remove_superseded_frames(tasks, records, output):
+    """删除被替换文件的旧逐帧分片：同一路径的当前 key 已变化时，旧 key 的分片不再属于任何文件"""
+    current = {task['path']: task['key'] for task in tasks}
+    removed = 0
+    for key, record in records.items():
+        if current.get(record['path'], key) == key or not record.get('frames_file'):
+            continue
+        try:
+            os.remove(os.path.join(output, record['frames_file']))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def write_files_table(records, output, fmt):
+    """由检查点记录生成逐文件汇总表（各记录字段取并集，缺失为空）"""
+    rows = sorted(records.values(), key=lambda record: record['path'])
+    names = []
+    for record in rows:
+        names.extend(name for name in record if name not in names)
+    columns = {name: [record.get(name) for record in rows] for name in names}
+    path = os.path.join(output, 'files' + FORMATS[fmt])
+    write_table(columns, path, fmt)
+    return path
+
+
+class Progress:
+    """进度与吞吐：文件数、已分析帧数与相对实时的处理倍速"""
+
+    def __init__(self, total, interval=2.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.frames = 0
+        self.media_seconds = 0.0
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+
+    def update(self, record):
+        self.done += 1
+        self.failed += record['status'] == 'failed'
+        self.frames += record.get('frames_analyzed') or 0
+        self.media_seconds += record.get('duration_s') or 0
+        if record['status'] == 'failed':
+            print(f"Failed: {record['path']}: {record.get('error')}")
+
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval or self.done == self.total:
+            self._last_report = now
+            print(self.line())
+
+    def line(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate else 0
+        return (f"[{self.done}/{self.total}] {rate:.2f} files/s, {self.frames / elapsed:.1f} frames/s, "
+                f"{self.media_seconds / elapsed:.1f}x realtime, failed {self.failed}, "
+                f"elapsed {elapsed:.0f}s, ETA {eta:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='录像/录音档案离线批量分析')
+    parser.add_argument('inputs', nargs='*', help='目录或文件')
+    parser.add_argument('--manifest', help='文件清单（每行一个路径）')
+    parser.add_argument('--output', required=True, help='输出目录（含检查点，重复运行时续跑）')
+    parser.add_argument('--format', choices=list(FORMATS), default='parquet', help='列式输出格式')
+    parser.add_argument('--workers', type=int, help='工作进程数（默认按核心数与可用内存确定）')
+    parser.add_argument('--worker-memory-mb', type=int,
+                        help='每个工作进程的内存估计，用于默认进程数（默认按待分析文件类型估计）')
+    parser.add_argument('--frame-step', type=int, default=5, help='视频每隔多少帧分析一次')
+    parser.add_argument('--retry-failed', action='store_true', help='重新分析检查点中失败的文件')
+    args = parser.parse_args()
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print('需要安装 pyarrow: pip install pyarrow')
+        sys.exit(1)
+
+    if not args.inputs and not args.manifest:
+        parser.error('需指定目录/文件或 --manifest')
+
+    os.makedirs(os.path.join(args.output, 'frames'), exist_ok=True)
+
+    tasks = discover(args.inputs, args.manifest)
+    records = load_checkpoint(args.output)
+    skip = {'done', 'failed'} if not args.retry_failed else {'done'}
+    pending = [task for task in tasks if records.get(task['key'], {}).get('status') not in skip]
+    print(f"Found {len(tasks)} files, {len(tasks) - len(pending)} already in checkpoint, {len(pending)} to analyze")
+
+    if pending:
+        # 大文件优先，避免最后只剩一个长任务拖慢整体
+        pending.sort(key=lambda task: task['size'], reverse=True)
+        workers = args.workers or default_workers(pending, args.worker_memory_mb)
+        workers = max(1, min(workers, len(pending)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+
+        progress = Progress(len(pending))
+        with open(os.path.join(args.output, CHECKPOINT_FILE), 'a', encoding='utf-8') as checkpoint:
+            for record in analyze_files(pending, workers, (threads, args.frame_step, args.output, args.format)):
+                checkpoint.write(json.dumps(record, ensure_ascii=False) + '\n')
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                records[record['key']] = record
+                progress.update(record)
+
+    removed = remove_superseded_frames(tasks, records, args.output)
+    if removed:
+        print(f"Removed {removed} frame shards of replaced files")
+
+    # 只汇总本次仍存在的文件
+    current = {task['key'] for task in tasks}
+    records = {key: record for key, record in records.items() if key in current}
+    if records:
+        path = write_files_table(records, args.output, args.format)
+        print(f"Wrote {len(records)} file summaries to {path}, frames under {os.path.join(args.output, 'frames')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""分析器性能基准测试
+
+使用固定随机种子生成的合成输入（人脸图像帧、视频、音调+噪声音频、中文文本），
+对各分析器的公开方法进行预热与重复计时，结果写入 JSON，可与历史结果对比检测性能回退。
+
+用法:
+    python scripts/benchmark.py --output bench/current.json
+    python scripts/benchmark.py --suites face voice --baseline bench/main.json --threshold 0.15
+与基线对比时，任一用例中位耗时变慢超过阈值，或基线中的用例本次缺失、出错（所选套件与过滤范围内）
+则以非零状态退出。
+"""
+import argparse
+import atexit
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SUITES = ['face', 'voice', 'text', 'evaluator', 'assessor']
+
+FACE_SIZES = {'240p': (320, 240), '480p': (640, 480), '720p': (1280, 720)}
+AUDIO_SECONDS = [1, 5, 30]
+TEXT_CHARS = [50, 500, 2000]
+
+TEXT_PHRASES = [
+    '我当时非常害怕', '我不记得具体时间了', '他一直在威胁我', '我感到很愤怒',
+    '那天晚上我在家里', '我承认我做错了', '我没有说谎', '我觉得很委屈',
+    '请相信我', '我很担心我的家人', '事情不是这样的', '我希望能够得到公正的处理',
+    '我一直很紧张', '我很后悔', '他们没有给我解释的机会', '我现在心情很平静'
+]
+
+
+def synthetic_face_frame(size, seed=0):
+    """绘制一张合成人脸图像（BGR uint8）：肤色椭圆、眼睛、眉毛与嘴部，叠加固定噪声"""
+    width, height = size
+    rng = np.random.RandomState(seed)
+
+    frame = np.full((height, width, 3), (200, 190, 180), dtype=np.uint8)
+    yy, xx = np.mgrid[0:height, 0:width]
+    cx, cy = width / 2, height / 2
+    rx, ry = width * 0.18, height * 0.32
+
+    def ellipse(x0, y0, ax, ay):
+        return ((xx - x0) / ax) ** 2 + ((yy - y0) / ay) ** 2 <= 1
+
+    frame[ellipse(cx, cy, rx, ry)] = (140, 170, 220)  # 脸部
+    for side in (-1, 1):
+        frame[ellipse(cx + side * rx * 0.4, cy - ry * 0.2, rx * 0.15, ry * 0.06)] = (255, 255, 255)
+        frame[ellipse(cx + side * rx * 0.4, cy - ry * 0.2, rx * 0.06, ry * 0.05)] = (40, 30, 20)
+        frame[ellipse(cx + side * rx * 0.4, cy - ry * 0.38, rx * 0.2, ry * 0.025)] = (50, 40, 30)
+    frame[ellipse(cx, cy + ry * 0.45, rx * 0.35, ry * 0.07)] = (80, 80, 170)  # 嘴部
+
+    noise = rng.randint(-8, 9, size=frame.shape)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_video(path, seconds, fps=30, size=(640, 480), seed=0):
+    """写入合成视频（人脸帧逐帧轻微平移），返回路径"""
+    import cv2
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    base = synthetic_face_frame(size, seed)
+    for i in range(int(seconds * fps)):
+        writer.write(np.roll(base, int(4 * np.sin(i / 5)), axis=1))
+    writer.release()
+    return path
+
+
+def synthetic_audio(seconds, sample_rate=16000, seed=0):
+    """生成音调+噪声的 16-bit PCM WAV 字节：基频带颤音，音量按音节起伏"""
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.5 * t)  # 基频缓慢变化
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2  # 约每秒 4 个音节
+    signal = 0.3 * voiced * envelope + 0.02 * rng.randn(len(t))
+
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def synthetic_text(n_chars, seed=0):
+    """由固定短语随机拼接出约 n_chars 字的中文文本"""
+    rng = np.random.RandomState(seed)
+    punctuation = ['。', '！', '？', '，']
+    parts = []
+    length = 0
+    while length < n_chars:
+        phrase = TEXT_PHRASES[rng.randint(len(TEXT_PHRASES))] + punctuation[rng.randint(len(punctuation))]
+        parts.append(phrase)
+        length += len(phrase)
+    return ''.join(parts)[:n_chars]
+
+
+def synthetic_modalities(seed=0):
+    """生成一组合成的 (face_data, voice_data, text_data) 接口结果"""
+    rng = np.random.RandomState(seed)
+    emotions = rng.dirichlet(np.ones(7))
+    labels = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+    face_data = {
+        'intensity': float(rng.uniform(0, 100)),
+        'data': {'emotions': dict(zip(labels, emotions.tolist()))}
+    }
+    voice_data = {
+        'intensity': float(rng.uniform(0, 100)),
+        'data': {
+            'pitch': {'type': 'normal', 'intensity': float(rng.uniform(0.3, 0.9))},
+            'volume': {'level': 'normal', 'intensity': float(rng.uniform(0.3, 0.9))},
+            'speed': {'type': 'normal', 'intensity': float(rng.uniform(0.3, 0.9))}
+        }
+    }
+    text_data = {
+        'data': {
+            'emotion_vector': rng.uniform(-1, 1, 5).tolist(),
+            'semantic_analysis': {
+                'consistency': float(rng.uniform(0, 1)),
+                'sentences': [{}] * int(rng.randint(1, 20)),
+                'overall': {'label': 'NEGATIVE', 'score': float(rng.uniform(0.5, 1))}
+            }
+        }
+    }
+    return face_data, voice_data, text_data
+
+
+def face_cases():
+    """面部分析用例"""
+    from modules.face_emotion import FaceEmotionAnalyzer
+
+    analyzer = FaceEmotionAnalyzer()
+    cases = {}
+    for name, size in FACE_SIZES.items():
+        frame = synthetic_face_frame(size)
+        cases[f'face.analyze[{name}]'] = lambda frame=frame: analyzer.analyze(frame)
+        cases[f'face.analyze_realtime[{name}]'] = lambda frame=frame: analyzer.analyze_realtime(frame)
+
+    video_dir = tempfile.mkdtemp(prefix='jpa-bench-')
+    atexit.register(shutil.rmtree, video_dir, ignore_errors=True)
+    video_path = synthetic_video(os.path.join(video_dir, 'synthetic.avi'), seconds=5)
+    cases['face.analyze_video[480p,5s]'] = lambda: analyzer.analyze_video(video_path)
+    return cases
+
+
+def voice_cases():
+    """语音分析用例"""
+    from modules.voice_emotion import VoiceEmotionAnalyzer
+
+    analyzer = VoiceEmotionAnalyzer()
+    cases = {}
+    for seconds in AUDIO_SECONDS:
+        audio = synthetic_audio(seconds)
+        cases[f'voice.extract_features[{seconds}s]'] = \
+            lambda audio=audio: analyzer.extract_features(io.BytesIO(audio))
+
+    features = analyzer.extract_features(io.BytesIO(synthetic_audio(5)))
+    cases['voice.analyze_emotions[5s]'] = lambda: analyzer.analyze_emotions(features)
+    return cases
+
+
+def text_cases():
+    """文本分析用例"""
+    from modules.model_store import ModelStore, configure_offline
+    configure_offline(ModelStore())
+    from modules.text_emotion import TextEmotionAnalyzer
+
+    analyzer = TextEmotionAnalyzer()
+    cases = {}
+    for n_chars in TEXT_CHARS:
+        text = synthetic_text(n_chars)
+        cases[f'text.analyze_semantics[{n_chars}]'] = lambda text=text: analyzer.analyze_semantics(text)
+        cases[f'text.extract_keyword_emotions[{n_chars}]'] = \
+            lambda text=text: analyzer.extract_keyword_emotions(text)
+    return cases
+
+
+def evaluator_cases():
+    """心理评估用例"""
+    from modules.psychological_evaluator import PsychologicalEvaluator
+
+    evaluator = PsychologicalEvaluator()
+    sample = synthetic_modalities()
+    sessions = [synthetic_modalities(seed) for seed in range(1000)]
+
+    def single():
+        integrated = evaluator.integrate_multimodal_data(*sample)
+        return evaluator.build_psychological_radar(integrated)
+
+    def batch():
+        batch = evaluator.integrate_multimodal_batch(sessions)
+        return evaluator.build_psychological_radar_batch(batch)
+
+    return {
+        'evaluator.integrate_and_radar': single,
+        'evaluator.integrate_and_radar_batch[1000]': batch
+    }
+
+
+def assessor_cases():
+    """风险评估用例"""
+    from modules.psychological_evaluator import PsychologicalEvaluator
+    from modules.risk_assessor import RiskAssessor
+
+    evaluator = PsychologicalEvaluator()
+    assessor = RiskAssessor()
+    integrated = evaluator.integrate_multimodal_data(*synthetic_modalities())
+    batch = evaluator.integrate_multimodal_batch([synthetic_modalities(seed) for seed in range(1000)])
+
+    return {
+        'assessor.identify_psychological_risks': lambda: assessor.identify_psychological_risks(integrated),
+        'assessor.assess_communication_barriers': lambda: assessor.assess_communication_barriers(integrated),
+        'assessor.identify_psychological_risks_batch[1000]': lambda: assessor.identify_psychological_risks_batch(batch)
+    }
+
+
+SUITE_CASES = {
+    'face': face_cases,
+    'voice': voice_cases,
+    'text': text_cases,
+    'evaluator': evaluator_cases,
+    'assessor': assessor_cases
+}
+
+
+def time_case(fn, warmup, repeat):
+    """预热后重复计时，返回耗时统计（毫秒）"""
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    timings_ms = np.array(timings) * 1000
+    return {
+        'median_ms': float(np.median(timings_ms)),
+        'mean_ms': float(timings_ms.mean()),
+        'p95_ms': float(np.percentile(timings_ms, 95)),
+        'min_ms': float(timings_ms.min()),
+        'repeat': repeat
+    }
+
+
+def run(suites, warmup=2, repeat=10, filter_text=None):
+    """运行所选套件；某套件依赖缺失时记录原因并跳过"""
+    results = {}
+    for suite in suites:
+        try:
+            cases = SUITE_CASES[suite]()
+        except Exception as e:
+            print(f"Skipping suite {suite}: {e}")
+            results[f'{suite}.*'] = {'skipped': str(e)}
+            continue
+
+        for name, fn in cases.items():
+            if filter_text and filter_text not in name:
+                continue
+            try:
+                results[name] = time_case(fn, warmup, repeat)
+            except Exception as e:
+                print(f"Case {name} failed: {e}")
+                results[name] = {'error': str(e)}
+                continue
+            print(f"{name:<52}{results[name]['median_ms']:>12.3f} ms")
+
+    return results
+
+
+def environment():
+    """运行环境与主要依赖版本"""
+    versions = {}
+    for package in ['numpy', 'cv2', 'deepface', 'mediapipe', 'librosa', 'torch', 'transformers', 'tensorflow']:
+        try:
+            module = __import__(package)
+            versions[package] = getattr(module, '__version__', 'unknown')
+        except Exception:
+            versions[package] = None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': versions
+    }
+
+
+def compare(current, baseline, threshold, suites=SUITES, filter_text=None):
+    """与基线对比中位耗时，返回 (回退用例列表, 本次缺失或出错的基线用例列表)"""
+    missing = []
+    for name, before in baseline.items():
+        if 'median_ms' not in before or name.split('.')[0] not in suites:
+            continue
+        if filter_text and filter_text not in name:
+            continue
+        result = current.get(name) or current.get(f"{name.split('.')[0]}.*") or {}
+        if 'median_ms' not in result:
+            reason = result.get('error') or result.get('skipped') or 'not run'
+            print(f"Baseline case {name} missing: {reason}")
+            missing.append({'case': name, 'reason': reason})
+
+    regressions = []
+    print(f"\n{'case':<52}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current.items():
+        before = baseline.get(name)
+        if not before or 'median_ms' not in before or 'median_ms' not in result:
+            continue
+
+        change = result['median_ms'] / before['median_ms'] - 1 if before['median_ms'] > 0 else 0.0
+        flag = ' !' if change > threshold else ''
+        print(f"{name:<52}{before['median_ms']:>12.3f}{result['median_ms']:>12.3f}{change:>+10.1%}{flag}")
+        if change > threshold:
+            regressions.append({'case': name, 'baseline_ms': before['median_ms'],
+                                'current_ms': result['median_ms'], 'change': change})
+    return regressions, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析器性能基准测试')
+    parser.add_argument('--suites', nargs='+', default=SUITES, choices=SUITES)
+    parser.add_argument('--filter', help='仅运行名称包含该字符串的用例')
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='结果 JSON 输出路径')
+    parser.add_argument('--baseline', help='用于对比的历史结果 JSON')
+    parser.add_argument('--threshold', type=float, default=0.15, help='允许的中位耗时增幅（默认 15%%）')
+    args = parser.parse_args()
+
+    results = run(args.suites, args.warmup, args.repeat, args.filter)
+    report = {'environment': environment(), 'warmup': args.warmup, 'results': results}
+
+    regressions, missing = [], []
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions, missing = compare(results, baseline['results'], args.threshold, args.suites, args.filter)
+        report['baseline'] = {'path': args.baseline, 'commit': baseline['environment'].get('commit'),
+                              'threshold': args.threshold, 'regressions': regressions, 'missing': missing}
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+    if missing:
+        print(f"\n{len(missing)} baseline case(s) missing or failed")
+    if regressions or missing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""CPU 核心划分基准测试
+
+对每种核心划分（JPA_CORE_BUDGET）在独立子进程中同时运行面部、语音、文本与分析负载，
+测量固定时长内各引擎的吞吐与延迟，用于比较不同划分及未划分（各框架默认占满全部核心）时的表现。
+
+用法:
+    python scripts/benchmark_cores.py --splits none face=4,voice=2,text=2,analysis=0 face=2,voice=2,text=4,analysis=0
+    python scripts/benchmark_cores.py --splits face=3,voice=1,text=3,analysis=1 --pin --duration 30 --output cores.json
+划分 none 表示不做任何线程配置。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 各引擎的代表性负载（来自 scripts/benchmark.py 的用例）
+ENGINE_CASES = {
+    'face': ('face', 'face.analyze[480p]'),
+    'voice': ('voice', 'voice.extract_features[5s]'),
+    'text': ('text', 'text.analyze_semantics[500]'),
+    'analysis': ('evaluator', 'evaluator.integrate_and_radar_batch[1000]')
+}
+
+
+def run_child(split, duration, concurrency, pin):
+    """子进程：按划分配置线程池后并发运行各引擎负载，输出一行 JSON 结果"""
+    import numpy as np
+
+    from modules.resource_manager import ResourceManager
+
+    resources = None
+    if split != 'none':
+        os.environ['JPA_CORE_BUDGET'] = split
+        resources = ResourceManager(pin=pin)
+        resources.configure_environment()
+
+    from modules.native_executor import NativeExecutor
+    from scripts.benchmark import SUITE_CASES
+
+    cases = {}
+    skipped = {}
+    for engine, (suite, name) in ENGINE_CASES.items():
+        try:
+            cases[engine] = SUITE_CASES[suite]()[name]
+            cases[engine]()  # 预热（加载模型）
+        except Exception as e:
+            skipped[engine] = str(e)
+
+    if resources is not None:
+        resources.configure_frameworks()
+
+    executor = NativeExecutor(
+        green=False,
+        limits={engine: concurrency for engine in cases},
+        thread_setup=resources.pin_current_thread if resources is not None else None
+    )
+
+    latencies = {engine: [] for engine in cases}
+    deadline = time.perf_counter() + duration
+
+    def loop(engine):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            executor.run(engine, cases[engine])
+            latencies[engine].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=loop, args=(engine,))
+               for engine in cases for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    engines = {}
+    for engine, values in latencies.items():
+        values_ms = np.array(values) * 1000 if values else np.zeros(1)
+        engines[engine] = {
+            'ops': len(values),
+            'ops_per_s': len(values) / elapsed,
+            'p50_ms': float(np.percentile(values_ms, 50)),
+            'p95_ms': float(np.percentile(values_ms, 95))
+        }
+
+    print(json.dumps({
+        'split': split,
+        'allocation': resources.report() if resources is not None else None,
+        'engines': engines,
+        'skipped': skipped,
+        'elapsed_s': elapsed
+    }, ensure_ascii=False))
+
+
+def run_split(split, duration, concurrency, pin):
+    """在全新子进程中运行一种划分（线程池只能在框架导入前配置）"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', split,
+               '--duration', str(duration), '--concurrency', str(concurrency)]
+    if pin:
+        command.append('--pin')
+
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                          'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS', 'JPA_CORE_BUDGET')}
+    output = subprocess.run(command, capture_output=True, text=True, env=env)
+    if output.returncode != 0:
+        raise RuntimeError(output.stderr.strip().splitlines()[-1] if output.stderr.strip() else 'child failed')
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CPU 核心划分基准测试')
+    parser.add_argument('--splits', nargs='+', default=['none'], help='核心划分列表，none 表示不配置')
+    parser.add_argument('--duration', type=float, default=20.0, help='每种划分的运行时长（秒）')
+    parser.add_argument('--concurrency', type=int, default=2, help='每个引擎的并发调用数')
+    parser.add_argument('--pin', action='store_true', help='将执行线程绑定到各引擎的核心')
+    parser.add_argument('--output', help='结果 JSON 输出路径')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.duration, args.concurrency, args.pin)
+        return
+
+    results = []
+    for split in args.splits:
+        print(f"Running split {split} for {args.duration:.0f}s ...")
+        try:
+            results.append(run_split(split, args.duration, args.concurrency, args.pin))
+        except Exception as e:
+            print(f"Split {split} failed: {e}")
+
+    engines = list(ENGINE_CASES)
+    print(f"\n{'split':<36}" + ''.join(f'{engine + " op/s":>16}' for engine in engines) + f"{'total':>10}")
+    for result in results:
+        row = result['engines']
+        total = sum(stats['ops_per_s'] for stats in row.values())
+        cells = ''.join(f"{row[engine]['ops_per_s']:>16.2f}" if engine in row else f"{'-':>16}" for engine in engines)
+        print(f"{result['split']:<36}{cells}{total:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
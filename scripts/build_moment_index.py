@@ -0,0 +1,73 @@
+"""从会话数据库回填情绪时刻索引
+
+读取 SQLite 会话库中的会话，提取面部与语音各通道的情绪时刻加入索引；已索引的会话默认跳过。
+可选的案件清单为 CSV（每行 session_id,case_id），用于按案件查询。
+
+用法:
+    python scripts/build_moment_index.py --db data/sessions.db --index data/moments
+    python scripts/build_moment_index.py --cases cases.csv --reindex
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INDEXED_MODALITIES = ['face', 'voice']
+
+
+def load_cases(path):
+    """session_id,case_id 清单 -> 字典"""
+    if not path:
+        return {}
+    with open(path, encoding='utf-8', newline='') as f:
+        return {row[0].strip(): row[1].strip() for row in csv.reader(f) if len(row) >= 2 and row[0].strip()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回填情绪时刻索引')
+    parser.add_argument('--db', help='会话数据库路径（默认 JPA_SESSION_DB）')
+    parser.add_argument('--index', help='索引目录（默认 JPA_MOMENT_INDEX_DIR）')
+    parser.add_argument('--cases', help='session_id,case_id 清单')
+    parser.add_argument('--reindex', action='store_true', help='重新索引已索引过的会话')
+    parser.add_argument('--flush-every', type=int, default=200, help='每处理多少个会话写一次段文件')
+    args = parser.parse_args()
+
+    from modules.moment_index import MomentIndex
+    from modules.session_persistence import SessionPersistence
+    from modules.session_store import MODALITY_COLUMNS
+
+    persistence = SessionPersistence(path=args.db)
+    index = MomentIndex(root=args.index)
+    cases = load_cases(args.cases)
+    columns = {modality: MODALITY_COLUMNS[modality] for modality in INDEXED_MODALITIES}
+
+    session_ids = persistence.session_ids()
+
+    started = time.perf_counter()
+    indexed = moments = 0
+    for i, session_id in enumerate(session_ids, 1):
+        if not args.reindex and session_id in index.session_codes:
+            continue
+
+        stored = persistence.load_session(session_id, columns)
+        if stored is None:
+            continue
+        moments += index.add_session(session_id, stored['series'], case_id=cases.get(session_id), flush=False)
+        indexed += 1
+
+        if indexed % args.flush_every == 0:
+            index.flush()
+            print(f"[{i}/{len(session_ids)}] {indexed} sessions, {moments} moments, "
+                  f"{time.perf_counter() - started:.1f}s")
+
+    index.flush()
+    persistence.close()
+    print(f"Indexed {indexed} sessions ({moments} moments) in {time.perf_counter() - started:.1f}s")
+    print(index.stats())
+
+
+if __name__ == '__main__':
+    main()
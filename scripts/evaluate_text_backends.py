@@ -0,0 +1,126 @@
+"""文本情感模型后端评估脚本
+
+对比各后端与基线模型在留出集上的延迟、吞吐、内存与标签一致率。
+
+用法:
+    python scripts/evaluate_text_backends.py heldout.txt --backends pytorch quantized onnx
+    python scripts/evaluate_text_backends.py heldout.txt --backends pytorch --model <已微调的蒸馏检查点>
+留出集为每行一条文本的 UTF-8 文件；--model 只作用于基线以外的后端。
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.text_backends import create_text_backend, TEXT_BACKENDS
+
+
+def _rss_mb():
+    """当前进程常驻内存（MB）"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _run_backend(backend, model_name, texts, batch_size, warmup, queue):
+    """在独立进程中运行单个后端，保证内存测量互不干扰"""
+    rss_before = _rss_mb()
+    load_start = time.perf_counter()
+    model = create_text_backend(backend, model_name)
+    load_time = time.perf_counter() - load_start
+
+    for text in texts[:warmup]:
+        model(text)
+
+    # 单条延迟
+    latencies = []
+    labels = []
+    for text in texts:
+        start = time.perf_counter()
+        labels.append(model(text)[0]['label'])
+        latencies.append(time.perf_counter() - start)
+
+    # 批量吞吐
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        model(texts[i:i + batch_size])
+    batch_time = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    queue.put({
+        'backend': backend,
+        'load_time_s': load_time,
+        'latency_ms': {
+            'mean': float(latencies_ms.mean()),
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p95': float(np.percentile(latencies_ms, 95)),
+            'p99': float(np.percentile(latencies_ms, 99))
+        },
+        'throughput_per_s': len(texts) / batch_time,
+        'rss_mb': _rss_mb() - rss_before,
+        'labels': labels
+    })
+
+
+def evaluate(texts, backends, baseline='pytorch', batch_size=16, warmup=5, model_name=None):
+    """评估所有后端，返回结果列表"""
+    ctx = mp.get_context('spawn')
+    results = []
+
+    # 指定 model_name 时基线仍用默认模型，其余后端（可与基线同名）使用该模型
+    runs = [(baseline, None)] + [(b, model_name) for b in backends if b != baseline or model_name]
+    for backend, run_model in runs:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_backend, args=(backend, run_model, texts, batch_size, warmup, queue))
+        proc.start()
+        result = queue.get()
+        if run_model:
+            result['backend'] = f'{backend}:{run_model}'
+        results.append(result)
+        proc.join()
+
+    baseline_labels = results[0]['labels']
+    for result in results:
+        agree = sum(a == b for a, b in zip(result['labels'], baseline_labels))
+        result['label_agreement'] = agree / len(baseline_labels) if baseline_labels else 1.0
+        del result['labels']
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本情感模型后端评估')
+    parser.add_argument('heldout', help='留出集文件（每行一条文本）')
+    parser.add_argument('--backends', nargs='+', default=TEXT_BACKENDS, choices=TEXT_BACKENDS)
+    parser.add_argument('--baseline', default='pytorch', choices=TEXT_BACKENDS)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--model', help='基线以外的后端使用的模型（如已微调的蒸馏检查点）')
+    parser.add_argument('--output', help='结果 JSON 输出路径')
+    args = parser.parse_args()
+
+    with open(args.heldout, encoding='utf-8') as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    results = evaluate(texts, args.backends, args.baseline, args.batch_size, args.warmup, args.model)
+
+    print(f"{'backend':<12}{'p50 ms':>10}{'p95 ms':>10}{'items/s':>10}{'RSS MB':>10}{'agree':>8}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['latency_ms']['p50']:>10.2f}{r['latency_ms']['p95']:>10.2f}"
+              f"{r['throughput_per_s']:>10.1f}{r['rss_mb']:>10.1f}{r['label_agreement']:>8.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""本地模型仓库管理工具
+
+在有网络的机器上预先填充仓库，然后将仓库目录复制到离线生产主机。
+
+用法:
+    python scripts/model_store.py pull uer/chinese_roberta_L-12_H-768
+    python scripts/model_store.py export-onnx uer/chinese_roberta_L-12_H-768
+    python scripts/model_store.py deepface
+    python scripts/model_store.py list
+    python scripts/model_store.py verify --full
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.model_store import ModelStore
+from modules.text_backends import DEFAULT_TEXT_MODEL
+
+
+def cmd_pull(store, args):
+    """拉取 Hugging Face 模型"""
+    for model_id in args.models or [DEFAULT_TEXT_MODEL]:
+        entry = store.pull_hf_model(model_id, args.revision)
+        print(f"{model_id}: {len(entry['files'])} 个文件已登记")
+
+
+def cmd_export_onnx(store, args):
+    """导出 ONNX 模型并登记到仓库"""
+    from modules.text_backends import export_onnx, load_text_model, load_tokenizer
+
+    for model_id in args.models or [DEFAULT_TEXT_MODEL]:
+        onnx_id = f'{model_id}:onnx'
+        export_onnx(load_text_model(model_id), load_tokenizer(model_id),
+                    os.path.join(store.path(onnx_id), 'model.onnx'))
+        store.register(onnx_id, store.entry(model_id)['version'] if store.has(model_id) else 'main', 'onnx')
+        print(f"{onnx_id}: 已导出")
+
+
+def cmd_deepface(store, args):
+    """预下载 DeepFace 权重"""
+    entry = store.pull_deepface_weights(args.model)
+    print(f"deepface/{args.model}: {len(entry['files'])} 个文件已登记")
+
+
+def cmd_list(store, args):
+    """列出仓库内容"""
+    for item in store.list_models():
+        print(f"{item['id']:<45}{item['version']:<12}{item['format']:<14}{item['files']} files")
+
+
+def cmd_verify(store, args):
+    """校验仓库文件"""
+    failed = False
+    for item in store.list_models():
+        result = store.verify(item['id'], full=args.full)
+        print(f"{item['id']:<45}{'OK' if result['ok'] else 'FAILED'}")
+        for error in result['errors']:
+            print(f"    {error}")
+        failed = failed or not result['ok']
+
+    sys.exit(1 if failed else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模型仓库管理')
+    parser.add_argument('--root', help='仓库目录（默认 JPA_MODEL_STORE 或 models/store）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pull = subparsers.add_parser('pull', help='拉取 Hugging Face 模型')
+    pull.add_argument('models', nargs='*')
+    pull.add_argument('--revision', default='main')
+    pull.set_defaults(func=cmd_pull)
+
+    export = subparsers.add_parser('export-onnx', help='导出 ONNX 模型')
+    export.add_argument('models', nargs='*')
+    export.set_defaults(func=cmd_export_onnx)
+
+    deepface = subparsers.add_parser('deepface', help='预下载 DeepFace 权重')
+    deepface.add_argument('--model', default='Emotion')
+    deepface.set_defaults(func=cmd_deepface)
+
+    subparsers.add_parser('list', help='列出仓库内容').set_defaults(func=cmd_list)
+
+    verify = subparsers.add_parser('verify', help='校验仓库文件')
+    verify.add_argument('--full', action='store_true', help='计算完整 SHA-256')
+    verify.set_defaults(func=cmd_verify)
+
+    args = parser.parse_args()
+    if args.root:
+        os.environ['JPA_MODEL_STORE'] = args.root
+    args.func(ModelStore(), args)
+
+
+if __name__ == '__main__':
+    main()
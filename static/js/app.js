@@ -68,7 +68,16 @@ createApp({
             mediaRecorder: null,
             audioChunks: [],
             audioData: null,
-            recordingTimer: null
+            recordingTimer: null,
+
+            // 实时分析（Socket.IO）
+            socket: null,
+            realtimeEncoding: 'binary',
+            realtimeLayout: null,
+            realtimeTimer: null,
+            captureInterval: 200,
+            captureMaxDimension: 640,
+            captureCanvas: null
         };
     },
 
@@ -291,6 +300,7 @@ createApp({
                 const video = this.$refs.videoElement;
                 video.srcObject = stream;
                 this.cameraActive = true;
+                this.startRealtime();
             } catch (error) {
                 console.error('Camera error:', error);
                 alert('无法访问摄像头');
@@ -298,6 +308,7 @@ createApp({
         },
 
         stopCamera() {
+            this.stopRealtime();
             const video = this.$refs.videoElement;
             if (video.srcObject) {
                 video.srcObject.getTracks().forEach(track => track.stop());
@@ -306,6 +317,124 @@ createApp({
             this.cameraActive = false;
         },
 
+        // 实时分析：协商结果编码后按固定间隔发送摄像头画面
+        startRealtime() {
+            if (typeof io === 'undefined') return;
+
+            if (!this.socket) {
+                this.socket = io();
+                this.socket.on('realtime_started', (data) => {
+                    this.realtimeEncoding = data.encoding;
+                    this.realtimeLayout = data.layout;
+                });
+                this.socket.on('capture_control', (data) => this.applyCaptureControl(data));
+                this.socket.on('analysis_result', (data) => this.handleAnalysisResult(data));
+                this.socket.on('analysis_error', (data) => console.error('Realtime analysis error:', data.error));
+            }
+
+            this.socket.emit('start_realtime_analysis', { type: 'face', encoding: 'binary' });
+            this.restartCaptureTimer();
+        },
+
+        restartCaptureTimer() {
+            if (this.realtimeTimer) {
+                clearInterval(this.realtimeTimer);
+            }
+            this.realtimeTimer = setInterval(() => this.sendRealtimeFrame(), this.captureInterval);
+        },
+
+        // 服务端按处理延迟与排队下发的建议帧率与最大边长
+        applyCaptureControl(control) {
+            this.captureMaxDimension = control.max_dimension;
+            const interval = Math.round(1000 / control.fps);
+            if (interval !== this.captureInterval) {
+                this.captureInterval = interval;
+                if (this.realtimeTimer) {
+                    this.restartCaptureTimer();
+                }
+            }
+        },
+
+        stopRealtime() {
+            if (this.realtimeTimer) {
+                clearInterval(this.realtimeTimer);
+                this.realtimeTimer = null;
+            }
+            if (this.socket) {
+                this.socket.emit('stop_realtime_analysis', { type: 'face' });
+            }
+        },
+
+        sendRealtimeFrame() {
+            const video = this.$refs.videoElement;
+            if (!this.socket || !video || !video.videoWidth) return;
+
+            if (!this.captureCanvas) {
+                this.captureCanvas = document.createElement('canvas');
+            }
+            // 按建议的最大边长等比缩小
+            const scale = Math.min(1, this.captureMaxDimension / Math.max(video.videoWidth, video.videoHeight));
+            const canvas = this.captureCanvas;
+            canvas.width = Math.round(video.videoWidth * scale);
+            canvas.height = Math.round(video.videoHeight * scale);
+            canvas.getContext('2d').drawImage(video, 0, 0, canvas.width, canvas.height);
+
+            this.socket.emit('realtime_frame', {
+                type: 'face',
+                data: canvas.toDataURL('image/jpeg', 0.8)
+            });
+        },
+
+        handleAnalysisResult(data) {
+            // 二进制帧为 ArrayBuffer，JSON 模式为对象
+            const message = data instanceof ArrayBuffer ? this.decodeAnalysisResult(data) : data;
+            if (message.type === 'face' && message.result) {
+                this.faceEmotions = message.result;
+            } else if (message.type === 'voice' && message.result) {
+                this.voiceAnalysis = message.result;
+            }
+        },
+
+        // 按协商时下发的布局解码：12 字节帧头（版本、模态、标志位、epoch 毫秒）+ float32 特征向量
+        decodeAnalysisResult(buffer) {
+            const layout = this.realtimeLayout;
+            const view = new DataView(buffer);
+            const version = view.getUint8(0);
+            if (!layout || version !== layout.version) {
+                throw new Error('不支持的分析结果编码版本: ' + version);
+            }
+
+            const code = view.getUint8(1);
+            const flags = view.getUint16(2, true);
+            const timestamp = new Date(view.getFloat64(4, true));
+            const type = Object.keys(layout.modalities).find(name => layout.modalities[name].code === code);
+            if (flags & layout.flags.empty) {
+                return { type, result: null, timestamp };
+            }
+
+            // 还原为与 JSON 模式相同的结构（NaN 表示缺失，跳过）
+            const emotionKey = type === 'face' ? 'emotions' : 'emotion';
+            const result = type === 'face' ? { face_detected: true } : {};
+            layout.modalities[type].columns.forEach((column, i) => {
+                const value = view.getFloat32(layout.header_bytes + i * 4, true);
+                if (Number.isNaN(value)) return;
+
+                if (column.startsWith('emotion_')) {
+                    result[emotionKey] = result[emotionKey] || {};
+                    result[emotionKey][column.slice(8)] = value;
+                } else if (column.startsWith('micro_')) {
+                    result.micro_expressions = result.micro_expressions || {};
+                    result.micro_expressions[column.slice(6)] = value;
+                } else if (column.endsWith('_intensity')) {
+                    result[column.slice(0, -10)] = { intensity: value };
+                } else {
+                    result[column] = value;
+                }
+            });
+
+            return { type, result, timestamp };
+        },
+
         captureFrame() {
             // 模拟捕获结果
             this.faceEmotions = {
@@ -0,0 +1,84 @@
+"""批量评估与逐条评估的一致性：雷达图与风险列表须逐位相同"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.psychological_evaluator import PsychologicalEvaluator
+from modules.risk_assessor import RiskAssessor
+
+EMOTIONS = ['angry', 'disgust', 'fear', 'fearful', 'happy', 'sad', 'sadness', 'surprise', 'neutral',
+            'calm', 'nervous', 'hopeless', 'worthless', 'empty', 'suspicious', 'frustrated']
+
+
+def random_session(rng):
+    """随机生成一条 (face_data, voice_data, text_data)，情绪键的子集与顺序各不相同"""
+    face_data = voice_data = text_data = None
+
+    if rng.random() < 0.9:
+        emotions = rng.sample(EMOTIONS, rng.randint(0, len(EMOTIONS)))
+        face_data = {
+            'intensity': rng.uniform(0, 100),
+            'data': {'emotions': {emotion: rng.random() for emotion in emotions}}
+        }
+
+    if rng.random() < 0.7:
+        voice_data = {
+            'intensity': rng.uniform(0, 100),
+            'data': {
+                'pitch': {'intensity': rng.random()},
+                'volume': {'level': 'normal'},
+                'speed': {'intensity': rng.random()}
+            }
+        }
+
+    if rng.random() < 0.6:
+        text_data = {
+            'data': {
+                'emotion_vector': [rng.uniform(-1, 1) for _ in range(rng.randint(1, 5))],
+                'semantic_analysis': {
+                    'consistency': rng.random(),
+                    'sentences': ['.'] * rng.randint(0, 6)
+                }
+            }
+        }
+
+    return face_data, voice_data, text_data
+
+
+def without_timestamps(risks):
+    return [{key: value for key, value in risk.items() if key != 'timestamp'} for risk in risks]
+
+
+def test_batch_matches_per_item():
+    rng = random.Random(0)
+    sessions = [random_session(rng) for _ in range(3000)]
+
+    evaluator = PsychologicalEvaluator()
+    assessor = RiskAssessor()
+
+    batch = evaluator.integrate_multimodal_batch(sessions)
+    radar = evaluator.radar_records(evaluator.build_psychological_radar_batch(batch))
+    risks = assessor.identify_psychological_risks_batch(batch)['risks']
+
+    for i, session in enumerate(sessions):
+        integrated = evaluator.integrate_multimodal_data(*session)
+        assert batch.to_integrated(i) == integrated
+        assert radar[i] == evaluator.build_psychological_radar(integrated)
+        assert without_timestamps(risks[i]) == without_timestamps(assessor.identify_psychological_risks(integrated))
+
+
+def test_batch_without_emotions():
+    evaluator = PsychologicalEvaluator()
+    assessor = RiskAssessor()
+    sessions = [(None, None, None), ({'intensity': 10, 'data': {'emotions': {}}}, None, None)]
+
+    batch = evaluator.integrate_multimodal_batch(sessions)
+    radar = evaluator.radar_records(evaluator.build_psychological_radar_batch(batch))
+    risks = assessor.identify_psychological_risks_batch(batch)['risks']
+
+    for i, session in enumerate(sessions):
+        integrated = evaluator.integrate_multimodal_data(*session)
+        assert radar[i] == evaluator.build_psychological_radar(integrated)
+        assert without_timestamps(risks[i]) == without_timestamps(assessor.identify_psychological_risks(integrated))